@@ -0,0 +1,81 @@
+# -*- coding: utf-8 -*-
+"""Niezależność animacji pingwina od częstotliwości odświeżania ekranu.
+
+Dla kilku częstotliwości podajemy czas trwania animacji ruchu (od
+polecenia do zatrzymania pingwina), największy skok sylwetki pomiędzy
+kolejnymi klatkami ruchu, odsetek czasu migotania, przez który pingwina
+widać, liczbę obrazków utworzonych podczas animacji (powinna wynosić 0)
+oraz czas aktualizacji animacji jednego pingwina. Czas podajemy sztucznie, klatka po klatce.
+
+Ekran tworzony jest bez okna (sterownik SDL "dummy").
+"""
+
+import os
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import common
+
+from display import ClientDisplay, PenguinSprite
+from penguin import Penguin
+
+def frames(fps, duration):
+    """Zwróć chwile kolejnych klatek w ciągu `duration` sekund.
+    """
+    return [ index / float(fps) for index in range(int(duration * fps) + 1) ]
+
+def measure(fps):
+    penguin = Penguin(1, 5, 5)
+    penguin.number = 1
+    penguin.color  = "red"
+    sprite = PenguinSprite(penguin)
+    known_images = set([ id(image) for images in sprite.images.values()
+                         for image in images ] + [ id(sprite.empty_image) ])
+    created = 0
+
+    # Ruch: pingwin rusza w chwili 0.
+    penguin.moving = True
+    sprite.animate_move("Right", 0.0)
+    move_time, largest_step = None, 0
+    sprite.update(0.0)
+    position = sprite.screen_position()
+    for now in frames(fps, 1.0)[1:]:
+        sprite.update(now)
+        if id(sprite.image) not in known_images:
+            created += 1
+        largest_step = max(largest_step, abs(sprite.screen_position()[0] - position[0]))
+        position = sprite.screen_position()
+        if move_time is None and not penguin.moving:
+            move_time = now
+
+    # Migotanie przez dwie sekundy.
+    sprite.animate_blink(10.0, 2)
+    visible = 0
+    blink_frames = [ 10.0 + now for now in frames(fps, 2.0)[:-1] ]
+    for now in blink_frames:
+        sprite.update(now)
+        if id(sprite.image) not in known_images:
+            created += 1
+        if sprite.image is not sprite.empty_image:
+            visible += 1
+
+    start = time.time()
+    for now in blink_frames:
+        sprite.update(now)
+    update_time = (time.time() - start) / len(blink_frames)
+
+    print "%6d %10.0f %12d %10.1f %10d %10.2f" % (fps, 1000 * move_time,
+        largest_step, 100.0 * visible / len(blink_frames), created,
+        1e6 * update_time)
+
+def run():
+    ClientDisplay()
+
+    print "%6s %10s %12s %10s %10s %10s" % ("fps", "move ms", "max step px",
+        "visible %", "created", "update us")
+    for fps in [15, 30, 60, 120, 240]:
+        measure(fps)
+
+if __name__ == '__main__':
+    run()
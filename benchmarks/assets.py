@@ -0,0 +1,62 @@
+# -*- coding: utf-8 -*-
+"""Czas uruchomienia klienta (utworzenie ekranu) i rozpoczęcia rozgrywki
+(wyświetlenie planszy, rybek i pingwinów w pierwszej klatce), dla pierwszej
+i kolejnych rozgrywek w tym samym procesie.
+
+Każdy pomiar wykonywany jest w osobnym procesie, bez okna (sterownik
+SDL "dummy").
+"""
+
+import os
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import common
+
+from board import Board
+from display import ClientDisplay
+from fish import Fish
+from penguin import Penguin
+
+COLORS = ["red", "blue", "green", "yellow", "purple", "darkgray", "brown", "navyblue"]
+
+def start_match(display, players):
+    board = Board('default')
+    penguins = []
+    for number in range(1, players + 1):
+        penguin = Penguin(number, number, 1)
+        penguin.number = number
+        penguin.color  = COLORS[(number - 1) % len(COLORS)]
+        penguins.append(penguin)
+    fishes = [ Fish(x % 4, x, 2) for x in range(7) ]
+
+    start = time.time()
+    display.set_board(board, 1)
+    display.set_fishes(fishes)
+    display.set_penguins(penguins)
+    display.refresh()
+    return time.time() - start
+
+def measure(players):
+    start = time.time()
+    display = ClientDisplay()
+    startup = time.time() - start
+
+    first = start_match(display, players)
+    following = min([ start_match(display, players) for i in range(5) ])
+
+    print "%8d %12.1f %12.1f %12.1f" % (players, 1000 * startup, 1000 * first,
+                                        1000 * following)
+
+def run():
+    print "%8s %12s %12s %12s" % ("players", "startup ms", "1st match ms",
+                                  "next match ms")
+    for players in [2, 8]:
+        if os.fork() == 0:
+            measure(players)
+            os._exit(0)
+        os.wait()
+
+if __name__ == '__main__':
+    run()
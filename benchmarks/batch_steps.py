@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Liczba kroków rozgrywek na sekundę: kolejne rozgrywki na zwykłych
+planszach (batch.step_board()) w porównaniu z krokami wykonywanymi na
+wszystkich rozgrywkach naraz (batch.BatchBoard).
+"""
+
+import time
+
+import numpy
+
+import common
+
+from batch import BatchBoard, step_board
+
+PLAYERS = 4
+FISHES  = 7
+STEPS   = 200
+
+def scalar(level_name, matches):
+    batch = BatchBoard(level_name, matches, PLAYERS, FISHES, seed=0)
+    boards = [ batch.board(match) for match in range(matches) ]
+    directions = numpy.random.RandomState(0).randint(-1, 4, size=(STEPS, matches, PLAYERS))
+
+    start = time.time()
+    for step in range(STEPS):
+        for match, board in enumerate(boards):
+            step_board(board, directions[step, match].tolist())
+    return matches * STEPS / (time.time() - start)
+
+def vectorized(level_name, matches):
+    batch = BatchBoard(level_name, matches, PLAYERS, FISHES, seed=0)
+    directions = numpy.random.RandomState(0).randint(-1, 4, size=(STEPS, matches, PLAYERS))
+
+    start = time.time()
+    for step in range(STEPS):
+        batch.step(directions[step])
+    return matches * STEPS / (time.time() - start)
+
+def run():
+    print "%-10s %8s %14s %14s" % ("level", "matches", "scalar", "batch")
+    for level_name in ['default', 'arena']:
+        for matches in [1, 100, 1000, 10000]:
+            if matches <= 1000:
+                scalar_rate = "%14.0f" % scalar(level_name, matches)
+            else:
+                scalar_rate = "%14s" % "-"
+            print "%-10s %8d %s %14.0f" % (level_name, matches, scalar_rate,
+                                            vectorized(level_name, matches))
+    print "(match-steps per second)"
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,57 @@
+# -*- coding: utf-8 -*-
+"""Koszt rozesłania komunikatu ScoreUpdateMessage do wielu klientów:
+serializacja dla każdego odbiorcy osobno i jednokrotna serializacja
+w Match.send_to_all().
+"""
+
+import sys
+
+import common
+
+from match import Match
+from messages import send
+from messages import ScoreUpdateMessage
+
+class FakeTransport(object):
+    def __init__(self, player_id):
+        self.player_id = player_id
+        self.outbound  = self
+
+    def write(self, data):
+        pass
+
+class NullOutput(object):
+    def write(self, data):
+        pass
+
+def send_to_each(match, message):
+    """Rozsyłanie w dawnym stylu: osobny log i serializacja dla każdego
+    odbiorcy.
+    """
+    for transport in match.connected_clients.values():
+        match.log("Sending %s." % type(message).__name__)
+        send(transport, message)
+
+def run(number=2000):
+    message = ScoreUpdateMessage(1, 12)
+
+    print "%-12s %16s %16s" % ("recipients", "per-client/s", "encode-once/s")
+    for recipients in [2, 8, 64, 512]:
+        transports = [ FakeTransport(index + 1) for index in range(recipients) ]
+        match = Match(1, 'default', recipients, 7, 1, 60)
+        match.connected_clients = dict([ (t.player_id, t) for t in transports ])
+
+        # Logi serwera nie są tu istotne, ale ich koszt jest wliczony w pomiar.
+        stdout, sys.stdout = sys.stdout, NullOutput()
+        try:
+            repeat = max(number / recipients, 10)
+            old = common.ops_per_second(lambda: send_to_each(match, message), repeat)
+            new = common.ops_per_second(lambda: match.send_to_all(message), repeat)
+        finally:
+            sys.stdout = stdout
+
+        print "%-12d %16.1f %16.1f" % (recipients, old, new)
+    print "(broadcasts per second)"
+
+if __name__ == '__main__':
+    run()
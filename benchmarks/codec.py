@@ -0,0 +1,52 @@
+# -*- coding: utf-8 -*-
+"""Porównanie binarnego kodeka komunikatów z serializacją przez pickle.
+"""
+
+import pickle
+
+import common
+
+from fish import Fish
+from penguin import Penguin
+from messages import serialize, deserialize
+from messages import *
+
+PLAYER_ID = 1
+TOKEN     = 'f' * 32
+
+def sample_messages():
+    penguins = [ Penguin(PLAYER_ID, x, 1) for x in range(4) ]
+    fishes   = [ Fish(x % 4, x, 2) for x in range(7) ]
+
+    return [WelcomeMessage(PLAYER_ID, TOKEN, 'default'),
+            StartGameMessage(penguins, fishes, 60),
+            EndGameMessage(),
+            MoveMeToMessage("Up"),
+            MoveOtherToMessage(PLAYER_ID, "Up"),
+            ScoreUpdateMessage(PLAYER_ID, 12),
+            NewFishMessage(Fish(1, 3, 4)),
+            RiseGameDurationMessage(10),
+            PositionUpdateMessage(PLAYER_ID, 5, 6),
+            TurnMeToMessage("Left"),
+            TurnOtherToMessage(PLAYER_ID, "Left")]
+
+def run(number=20000):
+    print "%-24s %14s %14s %14s" % ("message", "bytes", "encode/s", "decode/s")
+
+    for message in sample_messages():
+        name = type(message).__name__
+
+        pickled = pickle.dumps(message)
+        encoded = serialize(message)
+
+        print "%-24s %6d/%-7d %6d/%-7d %6d/%-7d" % (name,
+            len(pickled), len(encoded),
+            common.ops_per_second(lambda: pickle.dumps(message), number/10),
+            common.ops_per_second(lambda: serialize(message), number),
+            common.ops_per_second(lambda: pickle.loads(pickled), number/10),
+            common.ops_per_second(lambda: deserialize(encoded), number))
+
+    print "(values: pickle/binary)"
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Czas zimnego startu klienta: utworzenie ekranu (razem z obrazkiem
+nagłówka) i wczytanie pozostałych obrazków potrzebnych do rozgrywki ośmiu
+graczy (najlepszy i średni czas), przy obrazkach wczytywanych
+z pojedynczych plików i z paczki obrazków (patrz bundle.py).
+
+Każdy pomiar wykonywany jest w osobnym procesie, bez okna (sterownik
+SDL "dummy"). Paczka obrazków jest budowana przed pomiarami w katalogu
+tymczasowym, usuwanym po zakończeniu.
+"""
+
+import os
+import shutil
+import tempfile
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import common
+
+import bundle
+from assets import assets
+from display import ClientDisplay
+
+COLORS = ["red", "blue", "green", "yellow", "purple", "darkgray", "brown", "navyblue"]
+RUNS = 5
+
+def cold_start(use_bundle, path, pipe):
+    bundle.enabled = use_bundle
+
+    start = time.time()
+    # Paczka otwierana jest raz na proces, więc wskazujemy ją z góry.
+    bundle.open_bundle(path)
+    ClientDisplay()
+    display_ready = time.time()
+    assets.ground_tiles()
+    assets.fish_images()
+    for number, color in enumerate(COLORS):
+        assets.penguin_frames(number + 1, color)
+    end = time.time()
+
+    os.write(pipe, "%f %f %d" % (display_ready - start, end - display_ready,
+                                 assets.loads))
+
+def measure(use_bundle, path):
+    display_times, image_times = [], []
+    for run in range(RUNS):
+        read_end, write_end = os.pipe()
+        if os.fork() == 0:
+            os.close(read_end)
+            cold_start(use_bundle, path, write_end)
+            os._exit(0)
+        os.close(write_end)
+        os.wait()
+        display_time, image_time, loads = os.read(read_end, 100).split()
+        os.close(read_end)
+        display_times.append(float(display_time))
+        image_times.append(float(image_time))
+
+    print "%-8s %8s %12.1f %12.1f %12.1f" % (use_bundle and "bundle" or "loose",
+        loads, 1000 * min(display_times), 1000 * min(image_times),
+        1000 * sum(image_times) / RUNS)
+
+def run():
+    directory = tempfile.mkdtemp()
+    path = os.path.join(directory, 'images.bundle')
+
+    try:
+        bundle.build_bundle(path=path)
+
+        print "%-8s %8s %12s %12s %12s" % ("images", "loaded", "display ms",
+                                           "images ms", "mean ms")
+        for use_bundle in [False, True]:
+            measure(use_bundle, path)
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    run()
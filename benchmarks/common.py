@@ -0,0 +1,28 @@
+# -*- coding: utf-8 -*-
+"""Wspólne funkcje skryptów mierzących wydajność.
+
+Skrypty uruchamiamy z głównego katalogu projektu, np.:
+  python benchmarks/codec.py
+"""
+
+import os
+import sys
+import time
+
+# Moduły gry importujemy tak samo, jak robią to skrypty w katalogu pingwin.
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)),
+                                '..', 'pingwin'))
+
+def ops_per_second(function, number):
+    """Wywołaj funkcję podaną liczbę razy i zwróć liczbę wywołań na sekundę.
+    """
+    start = time.time()
+    for i in xrange(number):
+        function()
+    return number / (time.time() - start)
+
+def rss():
+    """Zwróć bieżący rozmiar pamięci rezydentnej procesu w MB (Linux).
+    """
+    with open('/proc/self/statm') as fd:
+        return int(fd.read().split()[1]) * os.sysconf('SC_PAGE_SIZE') / 2.0**20
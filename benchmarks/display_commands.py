@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+"""Czas, przez jaki obsługa komunikatu z sieci lub klawisza zajmuje się
+ekranem: dawne wykonywanie zmian od razu, pod blokadą ekranu,
+w porównaniu z dodaniem polecenia do kolejki ClientDisplay.commands.
+Podajemy też czas wykonania zebranych poleceń na początku klatki.
+
+Ekran tworzony jest bez okna (sterownik SDL "dummy").
+"""
+
+import os
+import random
+import time
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import common
+
+from board import Board
+from concurrency import create_lock
+from display import ClientDisplay
+from fish import Fish
+from penguin import Penguin
+
+COMMANDS = 20000
+
+class CommandClock(object):
+    """Zegar animacji ekranu podający chwile zapisane w poleceniach.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+def commands(number):
+    """Zwróć listę losowych poleceń przekręcenia i ruchu czterech pingwinów:
+    czwórek (nazwa, id pingwina, kierunek, chwila wydania).
+    """
+    random.seed(0)
+    return [ (random.choice(['turn_penguin', 'move_penguin']),
+              random.randint(1, 4), random.choice(["Up", "Down", "Right", "Left"]),
+              index / 1000.0)
+             for index in xrange(number) ]
+
+def prepare(clock):
+    display = ClientDisplay(clock=clock)
+    board = Board('default')
+    penguins = []
+    for number in range(1, 5):
+        penguin = Penguin(number, number, 1)
+        penguin.number = number
+        penguin.color  = "red"
+        penguins.append(penguin)
+    display.set_board(board, 1)
+    display.set_fishes([ Fish(0, 1, 2) ])
+    display.set_penguins(penguins)
+    display.refresh()
+    return display
+
+def measure_locked(display, batch):
+    """Dawne metody ekranu: blokada i zmiana stanu przy każdym wywołaniu.
+    """
+    lock = create_lock()
+    start = time.time()
+    for name, penguin_id, direction, started in batch:
+        lock.acquire()
+        try:
+            if name == 'move_penguin':
+                display._do_move_penguin(penguin_id, direction, started)
+            else:
+                getattr(display, '_do_' + name)(penguin_id, direction)
+        finally:
+            lock.release()
+    return time.time() - start
+
+def measure_queued(display, clock, batch):
+    start = time.time()
+    for name, penguin_id, direction, started in batch:
+        # Ekran zapisuje w poleceniu ruchu chwilę podaną przez swój zegar.
+        clock.now = started
+        getattr(display, name)(penguin_id, direction)
+    handlers = time.time() - start
+
+    start = time.time()
+    display._apply_commands()
+    return handlers, time.time() - start
+
+def run():
+    clock = CommandClock()
+    display = prepare(clock)
+    batch = commands(COMMANDS)
+
+    print "%-10s %14s %14s" % ("display", "handler us", "frame us")
+    print "%-10s %14.2f %14s" % ("locked",
+        1e6 * measure_locked(display, batch) / COMMANDS, "-")
+    handlers, frame = measure_queued(display, clock, batch)
+    print "%-10s %14.2f %14.2f" % ("queued", 1e6 * handlers / COMMANDS,
+                                   1e6 * frame / COMMANDS)
+
+if __name__ == '__main__':
+    run()
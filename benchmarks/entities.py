@@ -0,0 +1,63 @@
+# -*- coding: utf-8 -*-
+"""Pamięć zajmowana przez pojedynczego pingwina i rybkę: dawne obiekty
+z pełnym słownikiem atrybutów w porównaniu z widokami na kolumny
+(patrz entities.EntityStore).
+
+Dla każdego rodzaju obiektów tworzymy ich dużą liczbę w osobnym procesie
+i dzielimy przyrost pamięci rezydentnej procesu przez liczbę obiektów.
+"""
+
+import os
+
+import common
+
+from fish import Fish
+from penguin import Penguin
+
+NUMBER = 200000
+
+class OldPenguin(object):
+    """Dawna implementacja pingwina, ograniczona do atrybutów.
+    """
+    def __init__(self, id, x, y):
+        self.id = id
+        self.x = x
+        self.y = y
+
+        self.fish_count = 0
+        self.moving = False
+        self.color = "white"
+        self.number = 0
+        self.leaderboard = None
+
+class OldFish(object):
+    """Dawna implementacja rybki.
+    """
+    def __init__(self, type, x, y):
+        self.type = type
+        self.x = x
+        self.y = y
+
+def measure(make):
+    base = common.rss()
+    objects = [ make(number) for number in xrange(NUMBER) ]
+    return (common.rss() - base) * 2**20 / NUMBER
+
+def report(name, make):
+    # Pamięci zwolnionej przez Pythona nie odzyskamy, więc każdy pomiar
+    # wykonujemy w osobnym procesie.
+    if os.fork() == 0:
+        print "%-12s %10.0f" % (name, measure(make))
+        os._exit(0)
+    os.wait()
+
+def run():
+    print "%-12s %10s" % ("entity", "bytes")
+    report('old penguin', lambda number: OldPenguin(number, number % 1000, number % 700))
+    report('penguin', lambda number: Penguin(number, number % 1000, number % 700))
+    report('old fish', lambda number: OldFish(number % 4, number % 1000, number % 700))
+    report('fish', lambda number: Fish(number % 4, number % 1000, number % 700))
+    print "(bytes per entity, including the list holding it)"
+
+if __name__ == '__main__':
+    run()
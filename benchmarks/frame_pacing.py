@@ -0,0 +1,79 @@
+# -*- coding: utf-8 -*-
+"""Regularność odstępów między klatkami przy 30 klatkach na sekundę:
+dawne odświeżanie przez helpers.run_each() w porównaniu z pętlą
+renderloop.RenderLoop.
+
+Rysowanie klatki udaje ekran, który zajmuje losowo od 0 do 15 ms, a co
+sekundę proces zatrzymuje się na 150 ms. Podajemy osiągniętą liczbę
+klatek na sekundę, średnie i maksymalne odchylenie odstępu od 1/30 s
+oraz liczbę klatek pominiętych przez RenderLoop.
+"""
+
+import os
+import random
+import time
+
+import common
+
+from twisted.internet import reactor
+
+from helpers import monotonic, run_each
+from renderloop import RenderLoop
+
+FPS = 30
+DURATION = 4.0
+
+class Display(object):
+    def __init__(self):
+        self.frames = []
+
+    def refresh(self):
+        now = monotonic()
+        self.frames.append(now)
+        busy = random.uniform(0, 0.015)
+        if len(self.frames) % FPS == 0:
+            busy += 0.15
+        time.sleep(busy)
+
+def measure(name):
+    random.seed(0)
+    display = Display()
+
+    if name == 'run_each':
+        run_each(1.0 / FPS, display.refresh, lambda: False)
+        dropped = '-'
+    else:
+        loop = RenderLoop(display, FPS)
+        loop.start()
+
+    reactor.callLater(DURATION, reactor.stop)
+    reactor.run()
+
+    if name != 'run_each':
+        dropped = loop.stats.dropped
+
+    intervals = [ b - a for a, b in zip(display.frames, display.frames[1:]) ]
+    # Odchylenie od terminu klatki liczone od pierwszej klatki.
+    start = display.frames[0]
+    drift = [ abs((frame - start) - round((frame - start) * FPS) / FPS)
+              for frame in display.frames ]
+
+    print "%-12s %8.1f %12.2f %12.2f %12.2f %8s" % (name,
+        len(intervals) / (display.frames[-1] - start),
+        1000 * sum(intervals) / len(intervals),
+        1000 * sum(drift) / len(drift), 1000 * max(drift), dropped)
+
+def run():
+    print "%-12s %8s %12s %12s %12s %8s" % ("loop", "fps", "interval ms",
+        "drift ms", "max drift ms", "dropped")
+
+    # Reaktor Twisted nie może być uruchomiony ponownie, więc każdy pomiar
+    # wykonujemy w osobnym procesie.
+    for name in ['run_each', 'RenderLoop']:
+        if os.fork() == 0:
+            measure(name)
+            os._exit(0)
+        os.wait()
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,97 @@
+# -*- coding: utf-8 -*-
+"""Zajętość pamięci (RSS) i czas wczytania planszy w zależności od
+rozmiaru poziomu.
+
+Dla każdego rozmiaru generowany jest losowy poziom w katalogu
+tymczasowym, a pomiary wykonywane w osobnych procesach. Mierzymy czas
+kompilacji poziomu, a następnie kolejno: planszę klienta (Board) przed
+i po wczytaniu całej siatki terenu, drugą planszę na tym samym,
+współdzielonym poziomie oraz planszę serwera (ServerBoard) z indeksem
+niezajętych pól.
+"""
+
+import os
+import random
+import shutil
+import tempfile
+import time
+
+import common
+
+import helpers
+import level
+from board import Board, ServerBoard
+
+SIZES = [(16, 10), (256, 256), (1024, 1024), (4096, 4096)]
+
+def write_level(directory, width, height):
+    """Zapisz losowy poziom o podanych wymiarach i zwróć jego nazwę.
+    """
+    name = 'bench-%dx%d' % (width, height)
+    row_choices = ' ' * 12 + '#=~-'
+    with open(os.path.join(directory, 'level', name), 'wb') as fd:
+        for y in xrange(height):
+            fd.write(''.join([ random.choice(row_choices) for x in xrange(min(width, 256)) ])
+                     * (width // min(width, 256)) + '\n')
+    return name
+
+def compile_time(name):
+    start = time.time()
+    level.load_level(name)
+    return time.time() - start
+
+def measure(name, size, compile_time):
+    base = common.rss()
+
+    start = time.time()
+    board = Board(name)
+    load_time = time.time() - start
+    lazy = common.rss() - base
+
+    for number in xrange(len(board.terrain.chunks)):
+        board.terrain.chunk(number)
+    loaded = common.rss() - base
+
+    another_board = Board(name)
+    another = common.rss() - base - loaded
+
+    start = time.time()
+    server_board = ServerBoard(name)
+    server_time = time.time() - start
+    server = common.rss() - base - loaded - another
+
+    print "%-12s %10.3f %10.3f %10.1f %10.1f %10.1f %10.3f %10.1f" % ("%dx%d" % size,
+        compile_time, load_time, lazy, loaded, another, server_time, server)
+
+def run():
+    directory = tempfile.mkdtemp()
+    os.mkdir(os.path.join(directory, 'level'))
+    helpers.DATA_DIR = directory
+
+    print "%-12s %10s %10s %10s %10s %10s %10s %10s" % ("level", "compile s",
+        "load s", "lazy MB", "loaded MB", "+board MB", "server s", "server MB")
+
+    try:
+        for size in SIZES:
+            name = write_level(directory, *size)
+            # Pamięci zwolnionej przez Pythona nie odzyskamy, więc każdy
+            # pomiar wykonujemy w osobnym procesie. Czas kompilacji
+            # odbieramy od procesu potomnego przez potok.
+            read_fd, write_fd = os.pipe()
+            if os.fork() == 0:
+                os.write(write_fd, repr(compile_time(name)))
+                os._exit(0)
+            os.wait()
+            os.close(write_fd)
+            seconds = float(os.read(read_fd, 64))
+            os.close(read_fd)
+
+            if os.fork() == 0:
+                measure(name, size, seconds)
+                os._exit(0)
+            os.wait()
+    finally:
+        shutil.rmtree(directory)
+
+if __name__ == '__main__':
+    run()
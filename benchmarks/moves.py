@@ -0,0 +1,86 @@
+# -*- coding: utf-8 -*-
+"""Liczba ruchów pingwina na sekundę: dawna implementacja
+Board.move_penguin() (łańcuch warunków i przeszukiwanie listy
+zablokowanych pól) w porównaniu z tablicą ruchów skompilowanego poziomu.
+"""
+
+import random
+
+import common
+
+from board import Board, is_wall
+from penguin import Penguin
+
+class OldBoard(object):
+    """Dawna implementacja planszy, ograniczona do ruchów pingwina.
+    """
+    def __init__(self, board):
+        self.x_count  = board.x_count
+        self.y_count  = board.y_count
+        self.penguins = board.penguins
+
+        self.blocked_tiles = []
+        for y in range(self.y_count):
+            for x in range(self.x_count):
+                if is_wall(board.level.tile(x, y)):
+                    self.blocked_tiles.append((x, y))
+
+    def is_free_tile(self, x, y):
+        return (x, y) not in self.blocked_tiles
+
+    def move_penguin(self, penguin_id, direction, unconditionally=False):
+        assert direction in ["Up", "Down", "Right", "Left"]
+
+        penguin = self.penguins[penguin_id]
+
+        if penguin.moving and not unconditionally:
+            return False
+
+        next_location_x = penguin.x
+        next_location_y = penguin.y
+
+        if direction == "Up":
+            next_location_y -= 1
+        elif direction == "Down":
+            next_location_y += 1
+        elif direction == "Right":
+            next_location_x += 1
+        elif direction == "Left":
+            next_location_x -= 1
+
+        if self.is_free_tile(next_location_x, next_location_y) \
+                and 0 <= next_location_x < self.x_count \
+                and 0 <= next_location_y < self.y_count:
+            penguin.x = next_location_x
+            penguin.y = next_location_y
+            penguin.moving = True
+            return True
+
+        return False
+
+def measure(name, level_name, make_board, number):
+    board = Board(level_name)
+    x, y = random.choice([ (x, y) for x in range(board.x_count)
+                                  for y in range(board.y_count)
+                                  if board.is_free_tile(x, y) ])
+    board.set_penguins([Penguin('p', x, y)])
+    board = make_board(board)
+
+    directions = [ random.choice(["Up", "Down", "Right", "Left"])
+                   for i in xrange(1024) ]
+    position = [0]
+
+    def move():
+        position[0] = (position[0] + 1) & 1023
+        board.move_penguin('p', directions[position[0]], unconditionally=True)
+
+    print "%-10s %-10s %12.0f" % (name, level_name, common.ops_per_second(move, number))
+
+def run():
+    print "%-10s %-10s %12s" % ("moves", "level", "moves/s")
+    for level_name in ['default', 'arena']:
+        measure('old', level_name, OldBoard, 100000)
+        measure('table', level_name, lambda board: board, 100000)
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,102 @@
+# -*- coding: utf-8 -*-
+"""Średnia liczba pikseli wysyłanych na ekran w jednej klatce i czas
+rysowania klatki: przerysowywanie całego ekranu w porównaniu
+z przerysowywaniem tylko zmienionych prostokątów.
+
+W każdej klatce jeden z pingwinów rusza się z podanym
+prawdopodobieństwem, a co drugą sekundę gry na planszy pojawia się
+nowa rybka. Zegar animacji przesuwany jest o 1/30 sekundy na klatkę,
+niezależnie od czasu jej rysowania. Ekran tworzony jest bez okna
+(sterownik SDL "dummy").
+"""
+
+import os
+import random
+
+os.environ.setdefault('SDL_VIDEODRIVER', 'dummy')
+
+import common
+
+import helpers
+from board import Board
+from display import ClientDisplay
+from fish import Fish
+from penguin import Penguin
+
+FRAMES = 600
+FPS = 30
+
+class FrameClock(object):
+    """Zegar animacji przesuwany ręcznie o jedną klatkę.
+    """
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+    def tick(self):
+        self.now += 1.0 / FPS
+
+def play(display, clock, level_name, move_probability):
+    board = Board(level_name)
+    free = [ (x, y) for x in range(board.x_count) for y in range(board.y_count)
+             if board.is_unoccupied_tile(x, y) ]
+    positions = random.sample(free, 11)
+
+    penguins = []
+    for number, (x, y) in enumerate(positions[:4]):
+        penguin = Penguin(number + 1, x, y)
+        penguin.number = number + 1
+        penguin.color  = ["red", "blue", "green", "yellow"][number]
+        penguins.append(penguin)
+    fishes = [ Fish(index % 4, x, y) for index, (x, y) in enumerate(positions[4:]) ]
+
+    display.set_board(board, 1)
+    board.set_fishes(fishes)
+    display.set_fishes(fishes)
+    board.set_penguins(penguins)
+    display.set_penguins(penguins)
+    display.set_timer(60)
+
+    display.frames, display.pixels_pushed, display.frame_time = 0, 0, 0.0
+    helpers.text_cache.hits, helpers.text_cache.misses = 0, 0
+    for frame in range(FRAMES):
+        if random.random() < move_probability:
+            penguin = random.choice(penguins)
+            direction = random.choice(["Up", "Down", "Right", "Left"])
+            display.turn_penguin(penguin.id, direction)
+            if board.move_penguin(penguin.id, direction):
+                fish = board.penguin_ate_fish(penguin.id)
+                if fish:
+                    display.remove_fish(fish)
+                display.move_penguin(penguin.id, direction)
+        if frame % 60 == 59:
+            x, y = random.choice(free)
+            if board.is_unoccupied_tile(x, y):
+                fish = Fish(frame % 4, x, y)
+                board.add_fish(fish)
+                display.add_fish(fish)
+        clock.tick()
+        display.refresh()
+
+    cache = helpers.text_cache
+    print "%-10s %-6s %8.2f %14.0f %12.2f %10.1f" % (level_name,
+        display.dirty_rects and "dirty" or "full", move_probability,
+        display.pixels_per_frame(), 1000 * display.mean_frame_time(),
+        100.0 * cache.hits / max(cache.hits + cache.misses, 1))
+
+def run():
+    print "%-10s %-6s %8s %14s %12s %10s" % ("level", "mode", "moves", "pixels/frame",
+                                             "frame ms", "text hit %")
+    clock = FrameClock()
+    display = ClientDisplay(clock=clock)
+    for level_name in ['default', 'arena']:
+        for move_probability in [0.0, 0.2, 1.0]:
+            for dirty_rects in [False, True]:
+                random.seed(0)
+                display.dirty_rects = dirty_rects
+                play(display, clock, level_name, move_probability)
+
+if __name__ == '__main__':
+    run()
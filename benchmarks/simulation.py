@@ -0,0 +1,50 @@
+# -*- coding: utf-8 -*-
+"""Liczba rozegranych partii i kroków na sekundę silnika rozgrywki bez
+serwera: boty w każdym kroku wysyłają losowy ruch albo obrót pingwina.
+"""
+
+import random
+import time
+
+import common
+
+from messages import MoveMeToMessage, TurnMeToMessage, DIRECTIONS
+from simulation import Simulation
+
+def play(level_name, number_of_players, game_duration, seed):
+    """Rozegraj jedną partię botów i zwróć liczbę wykonanych kroków.
+    """
+    player_ids = range(1, number_of_players + 1)
+    simulation = Simulation(level_name, player_ids, game_duration=game_duration,
+                            seed=seed)
+    simulation.start()
+
+    bot = random.Random(seed)
+    while not simulation.finished:
+        inputs = []
+        for player_id in player_ids:
+            if bot.random() < 0.2:
+                inputs.append((player_id, TurnMeToMessage(bot.choice(DIRECTIONS))))
+            inputs.append((player_id, MoveMeToMessage(bot.choice(DIRECTIONS))))
+        simulation.step(inputs)
+    return simulation.step_number
+
+def measure(level_name, number_of_players, game_duration, matches):
+    start = time.time()
+    steps = 0
+    for seed in range(matches):
+        steps += play(level_name, number_of_players, game_duration, seed)
+    elapsed = time.time() - start
+
+    print "%-10s %8d %10d %12.1f %12.0f" % (level_name, number_of_players,
+        game_duration, matches / elapsed, steps / elapsed)
+
+def run():
+    print "%-10s %8s %10s %12s %12s" % ("level", "players", "duration",
+                                        "matches/s", "steps/s")
+    for level_name in ['default', 'arena']:
+        for number_of_players in [2, 8]:
+            measure(level_name, number_of_players, 10, 20)
+
+if __name__ == '__main__':
+    run()
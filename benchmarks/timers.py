@@ -0,0 +1,72 @@
+# -*- coding: utf-8 -*-
+"""Dokładność i koszt procesora planisty wywołań przy 10 tysiącach
+oczekujących wywołań, w porównaniu z dawnym usypianiem wątków puli
+Twisted (mierzonym dla stu wywołań, bo pula ma tylko 10 wątków).
+"""
+
+import os
+import random
+import time
+
+import common
+
+from twisted.internet import reactor, threads
+
+from scheduler import Scheduler
+
+def thread_sleep_after(duration, function):
+    """Dawna implementacja helpers.run_after().
+    """
+    defered = threads.deferToThread(lambda: time.sleep(duration))
+    defered.addCallback(lambda x: function())
+
+def measure(name, call_later, number, spread):
+    """Zaplanuj `number` wywołań rozłożonych losowo w przedziale `spread`
+    sekund i zmierz ich spóźnienie.
+    """
+    delays = []
+    remaining = [number]
+
+    def make_call(deadline):
+        def call():
+            delays.append(time.time() - deadline)
+            remaining[0] -= 1
+            if not remaining[0]:
+                reactor.stop()
+        return call
+
+    cpu_start = sum(os.times()[:2])
+    for index in xrange(number):
+        # Pierwsze terminy wypadają dopiero po zaplanowaniu wszystkich wywołań.
+        delay = 0.5 + random.uniform(0, spread)
+        call_later(delay, make_call(time.time() + delay))
+
+    reactor.run()
+    cpu_time = sum(os.times()[:2]) - cpu_start
+
+    delays.sort()
+    print "%-20s %7d %10.2f %10.2f %10.2f %10.3f" % (name, number,
+        1000 * sum(delays) / len(delays),
+        1000 * delays[int(len(delays) * 0.99)],
+        1000 * delays[-1],
+        cpu_time)
+
+def run():
+    print "%-20s %7s %10s %10s %10s %10s" % ("timers", "number",
+        "mean ms", "p99 ms", "max ms", "cpu s")
+
+    # Reaktor Twisted nie może być uruchomiony ponownie, więc każdy pomiar
+    # wykonujemy w osobnym procesie.
+    for name in ['scheduler', 'callLater', 'thread-sleep']:
+        if os.fork() == 0:
+            if name == 'scheduler':
+                measure(name, Scheduler().call_later, 10000, 2.0)
+            elif name == 'callLater':
+                measure(name, reactor.callLater, 10000, 2.0)
+            else:
+                measure(name, thread_sleep_after, 100, 2.0)
+            os._exit(0)
+        os.wait()
+
+if __name__ == '__main__':
+    run()
@@ -0,0 +1,163 @@
+# -*- coding: utf-8 -*-
+"""Obrazki gry, wczytywane z dysku raz na cały proces.
+
+Obrazki jednego rodzaju (klatki pingwina, kafelki podłoża, rybki)
+układane są obok siebie na jednej powierzchni (patrz Atlas), a sprite'y
+rysują z jej podpowierzchni. Klatki pingwina z naniesionym numerem gracza
+tworzone są raz dla każdej pary (kolor, numer).
+
+Z obrazków korzystamy przez obiekt `assets` - moduł trzeba używać po
+ustawieniu trybu ekranu (patrz ClientDisplay), bo obrazki są
+konwertowane do jego formatu.
+"""
+
+import pygame
+from pygame.color import Color
+
+from helpers import load_image, add_name_to_penguin
+
+# Nazwy plików kafelek podłoża według znaków mapki poziomu.
+GROUND_IMAGES = {
+    ' ': 'ground/snow.gif',
+    '~': 'ground/water.gif',
+    '#': 'ground/wall.gif',
+
+    '[': 'ground/wall-horizontal-left.gif',
+    '=': 'ground/wall-horizontal-middle.gif',
+    ']': 'ground/wall-horizontal-right.gif',
+
+    '?': 'ground/wall-vertical-top.gif',
+    '|': 'ground/wall-vertical-middle.gif',
+    '.': 'ground/wall-vertical-bottom.gif',
+
+    '<': 'ground/ice-horizontal-left.gif',
+    '-': 'ground/ice-horizontal-middle.gif',
+    '>': 'ground/ice-horizontal-right.gif',
+
+    '^': 'ground/ice-vertical-top.gif',
+    '/': 'ground/ice-vertical-middle.gif',
+    ',': 'ground/ice-vertical-bottom.gif'}
+
+FISH_IMAGES = [ 'fish/fish-%d.gif' % number for number in range(1, 5) ]
+
+# Kierunki ruchu pingwina i nazwy odpowiadających im plików klatek.
+PENGUIN_DIRECTIONS = [('Up', 'back'), ('Down', 'front'), ('Right', 'right'),
+                      ('Left', 'left')]
+PENGUIN_FRAMES = 6
+
+def penguin_image(direction, frame):
+    """Zwróć nazwę pliku klatki pingwina (klatki numerowane są od 0).
+    """
+    return 'penguin/penguin-1-%s-%d.gif' % (direction, frame + 1)
+
+
+class Atlas(object):
+    """Obrazki ułożone w jednym rzędzie na wspólnej powierzchni.
+
+    Atrybuty obiektu:
+      surface  powierzchnia ze wszystkimi obrazkami
+      rects    słownik prostokątów obrazków według ich kluczy
+      images   słownik podpowierzchni obrazków według ich kluczy
+    """
+    def __init__(self, surface, rects):
+        self.surface = surface
+        self.rects   = rects
+        self.images  = dict([ (key, surface.subsurface(rect))
+                              for key, rect in rects.items() ])
+
+    @classmethod
+    def pack(cls, images):
+        """Utwórz atlas z listy par (klucz, obrazek).
+
+        Piksele obrazków kopiowane są bez zmian, a atlas dostaje kolor
+        przezroczysty obrazków (patrz helpers.load_image()).
+        """
+        width  = sum([ image.get_width() for key, image in images ])
+        height = max([ image.get_height() for key, image in images ])
+        surface = pygame.Surface((width, height), pygame.SRCALPHA, 32).convert_alpha()
+        surface.fill((0, 0, 0, 0))
+
+        rects = {}
+        x = 0
+        for key, image in images:
+            # Przy kopiowaniu wyłączamy kolor przezroczysty, żeby
+            # przeniosły się także piksele w tym kolorze.
+            colorkey = image.get_colorkey()
+            image.set_colorkey(None)
+            rects[key] = surface.blit(image, (x, 0), special_flags=pygame.BLEND_RGBA_MAX)
+            image.set_colorkey(colorkey)
+            x += image.get_width()
+
+        surface.set_colorkey(Color("white"))
+        return cls(surface, rects)
+
+    def copy(self):
+        """Zwróć atlas z kopią powierzchni, na której można rysować.
+        """
+        surface = self.surface.copy()
+        surface.set_colorkey(self.surface.get_colorkey())
+        return Atlas(surface, self.rects)
+
+class AssetManager(object):
+    """Wspólna dla procesu pamięć podręczna obrazków.
+
+    Atrybuty obiektu:
+      images   obrazki wczytane z dysku według nazw plików
+      atlases  atlasy według nazw (patrz atlas())
+      loads    liczba obrazków wczytanych z dysku
+    """
+    def __init__(self):
+        self.images  = {}
+        self.atlases = {}
+        self.loads   = 0
+
+    def image(self, name):
+        """Zwróć obrazek o podanej nazwie pliku, wczytując go tylko za
+        pierwszym razem.
+        """
+        image = self.images.get(name)
+        if image is None:
+            image = self.images[name] = load_image(name)
+            self.loads += 1
+        return image
+
+    def atlas(self, name, keys_and_files):
+        """Zwróć atlas o podanej nazwie, tworząc go przy pierwszym wywołaniu
+        z listy par (klucz, nazwa pliku).
+        """
+        atlas = self.atlases.get(name)
+        if atlas is None:
+            atlas = self.atlases[name] = Atlas.pack([ (key, self.image(filename))
+                                                      for key, filename in keys_and_files ])
+        return atlas
+
+    def ground_tiles(self):
+        """Zwróć słownik kafelek podłoża według znaków mapki poziomu.
+        """
+        return self.atlas('ground', sorted(GROUND_IMAGES.items())).images
+
+    def fish_images(self):
+        """Zwróć listę obrazków rybek według ich typów.
+        """
+        images = self.atlas('fish', enumerate(FISH_IMAGES)).images
+        return [ images[type] for type in range(len(FISH_IMAGES)) ]
+
+    def penguin_frames(self, number, color):
+        """Zwróć słownik list klatek animacji pingwina według kierunków,
+        z numerem gracza naniesionym na tle w podanym kolorze.
+        """
+        atlas = self.atlases.get(('penguin', color, number))
+        if atlas is None:
+            atlas = self.atlas('penguin',
+                               [ ((direction, frame), penguin_image(name, frame))
+                                 for direction, name in PENGUIN_DIRECTIONS
+                                 for frame in range(PENGUIN_FRAMES) ]).copy()
+            for image in atlas.images.values():
+                add_name_to_penguin(str(number), image, color)
+            self.atlases[('penguin', color, number)] = atlas
+
+        return dict([ (direction, [ atlas.images[(direction, frame)]
+                                    for frame in range(PENGUIN_FRAMES) ])
+                      for direction, name in PENGUIN_DIRECTIONS ])
+
+assets = AssetManager()
@@ -0,0 +1,240 @@
+# -*- coding: utf-8 -*-
+"""Jednoczesne prowadzenie wielu niezależnych rozgrywek na tablicach NumPy
+(np. do uczenia botów i strojenia parametrów gry).
+
+Reguły są te same co na planszy (patrz board.Board i simulation.Simulation):
+ruch o długość z tablicy ruchów poziomu, zjedzenie rybki, utrata 5 rybek
+po wpadnięciu do wody i przeniesienie pingwina na losowe niezajęte pole,
+a także dokładanie rybek na losowe niezajęte pola. Każdy pingwin może
+wykonać w kroku jeden ruch; blokad ruchu ani czasu gry nie ma.
+
+Krok wykonywany jest na wszystkich rozgrywkach naraz, a pingwiny
+przesuwane są po kolei, w kolejności numerów, więc wynik jest taki sam
+jak przy wykonaniu tych samych ruchów na zwykłej planszy (patrz
+step_board()):
+
+>>> batch = BatchBoard('default', 40, 3, 5, seed=1)
+>>> moves = numpy.random.RandomState(2)
+>>> boards = [ batch.board(match) for match in range(batch.matches) ]
+>>> for step in range(200):
+...     directions = moves.randint(-1, 4, size=(batch.matches, batch.players))
+...     batch.step(directions)
+...     if step % 10 == 0:
+...         batch.spawn_fishes()
+...     for match, board in enumerate(boards):
+...         step_board(board, directions[match], batch.positions(match))
+...         if step % 10 == 0:
+...             for fish in batch.board(match).fishes:
+...                 if not board.occupied_by_fish(fish.x, fish.y):
+...                     board.add_fish(fish)
+...     assert [ state(board) for board in boards ] == \\
+...         [ state(batch.board(match)) for match in range(batch.matches) ]
+>>> int(batch.scores.sum()) > 0
+True
+
+Funkcja state() zwraca położenia i wyniki pingwinów oraz położenia rybek:
+
+>>> state(BatchBoard('default', 1, 2, 1, seed=3).board(0))
+([(7, 6, 0), (14, 1, 0)], [(4, 4)])
+
+Moduł wymaga biblioteki NumPy (patrz setup.py, extras_require).
+"""
+
+import numpy
+
+from board import BoardFull, ServerBoard
+from fish import Fish
+from level import load_level, MOVES, WATER
+from penguin import Penguin
+
+# Nazwy kierunków według numerów kolumn tablicy ruchów (patrz level.MOVES).
+DIRECTION_NAMES = sorted(MOVES, key=lambda direction: MOVES[direction][0])
+
+
+class BatchBoard(object):
+    """Plansze wielu rozgrywek na tym samym poziomie.
+
+    Atrybuty obiektu:
+      level            Poziom, na którym toczą się rozgrywki.
+      matches          Liczba rozgrywek.
+      players          Liczba pingwinów w każdej rozgrywce.
+      number_of_fishes Maksymalna liczba rybek na każdej planszy.
+      tiles            Tablica (rozgrywka, pingwin) z indeksami pól, na
+                       których stoją pingwiny (patrz Board.tile_index()).
+      scores           Tablica (rozgrywka, pingwin) z liczbami rybek.
+      fish             Tablica (rozgrywka, pole) z wartością True dla pól,
+                       na których leży rybka.
+      fish_counts      Liczba rybek na każdej z plansz.
+      penguin_counts   Tablica (rozgrywka, pole) z liczbą pingwinów
+                       stojących na każdym z pól.
+
+    Kierunki ruchu kodowane są numerami kolumn tablicy ruchów (patrz
+    level.MOVES), a -1 oznacza brak ruchu. Tablice zajętości mają po
+    jednym elemencie na każde pole każdej rozgrywki, więc nadają się dla
+    niewielkich poziomów.
+    """
+    def __init__(self, level_name, matches, players, number_of_fishes, seed=None):
+        self.level            = load_level(level_name)
+        self.matches          = matches
+        self.players          = players
+        self.number_of_fishes = number_of_fishes
+
+        self.random = numpy.random.RandomState(seed)
+
+        x_count = self.level.x_count
+        length  = x_count * self.level.y_count
+        terrain = numpy.frombuffer(self.level.data, numpy.uint8, length,
+                                   self.level.tiles_offset + length)
+        self.water  = terrain == WATER
+        self.closed = terrain != 0
+        self.moves  = numpy.frombuffer(self.level.moves, numpy.uint8).reshape(length, 4)
+        # Zmiana indeksu pola przy ruchu o jedno pole w każdym z kierunków.
+        self.steps  = numpy.array([ MOVES[direction][2] * x_count + MOVES[direction][1]
+                                    for direction in DIRECTION_NAMES ])
+
+        self.scores         = numpy.zeros((matches, players), numpy.int32)
+        self.fish           = numpy.zeros((matches, length), numpy.bool_)
+        self.fish_counts    = numpy.zeros(matches, numpy.int32)
+        self.penguin_counts = numpy.zeros((matches, length), numpy.int16)
+
+        # Rozstaw pingwiny i rybki na różnych, losowych niezajętych polach.
+        if players + number_of_fishes > length - self.closed.sum():
+            raise BoardFull("%d unoccupied tiles requested, only %d available" % \
+                                (players + number_of_fishes, length - self.closed.sum()))
+        keys = self.random.random_sample((matches, length))
+        keys[:, self.closed] = -1
+        chosen = numpy.argsort(-keys, axis=1)[:, :players + number_of_fishes]
+
+        self.tiles = chosen[:, :players].astype(numpy.int32)
+        rows = numpy.arange(matches)[:, numpy.newaxis]
+        self.penguin_counts[rows, self.tiles] = 1
+        self.fish[rows, chosen[:, players:]] = True
+        self.fish_counts[:] = number_of_fishes
+
+    def step(self, directions):
+        """Przesuń pingwiny wszystkich rozgrywek w podanych kierunkach
+        (tablica (rozgrywka, pingwin), patrz wyżej).
+        """
+        directions = numpy.asarray(directions)
+        for player in range(self.players):
+            direction = directions[:, player]
+            tiles = self.tiles[:, player]
+
+            distance = self.moves[tiles, direction & 3]
+            rows = numpy.flatnonzero((direction >= 0) & (distance > 0))
+            if not len(rows):
+                continue
+
+            old = tiles[rows]
+            new = old + distance[rows] * self.steps[direction[rows]]
+            self.penguin_counts[rows, old] -= 1
+            self.penguin_counts[rows, new] += 1
+            self.tiles[rows, player] = new
+
+            # Rybki nie leżą na wodzie, więc zjedzenie rybki i wpadnięcie
+            # do wody wzajemnie się wykluczają.
+            ate = self.fish[rows, new]
+            eaters = rows[ate]
+            self.fish[eaters, new[ate]] = False
+            self.fish_counts[eaters] -= 1
+            self.scores[eaters, player] += 1
+
+            dropped = self.water[new]
+            if dropped.any():
+                self._drop_into_water(rows[dropped], player)
+
+    def spawn_fishes(self):
+        """Połóż nową rybkę na losowym niezajętym polu każdej planszy,
+        na której jest mniej niż number_of_fishes rybek.
+        """
+        rows = numpy.flatnonzero(self.fish_counts < self.number_of_fishes)
+        tiles = self._random_unoccupied_tiles(rows)
+        placed = tiles >= 0
+        self.fish[rows[placed], tiles[placed]] = True
+        self.fish_counts[rows[placed]] += 1
+
+    def positions(self, match):
+        """Zwróć listę współrzędnych pingwinów podanej rozgrywki.
+        """
+        return [ (tile % self.level.x_count, tile // self.level.x_count)
+                 for tile in self.tiles[match].tolist() ]
+
+    def board(self, match):
+        """Zwróć planszę (ServerBoard) w stanie podanej rozgrywki.
+
+        Pingwiny planszy mają identyfikatory równe swoim numerom.
+        """
+        board = ServerBoard(self.level.name)
+        penguins = [ Penguin(player, x, y)
+                     for player, (x, y) in enumerate(self.positions(match)) ]
+        board.set_penguins(penguins)
+        for penguin, score in zip(penguins, self.scores[match].tolist()):
+            penguin.set_fish_count(score)
+        board.set_fishes([ Fish(0, tile % self.level.x_count, tile // self.level.x_count)
+                           for tile in numpy.flatnonzero(self.fish[match]).tolist() ])
+        return board
+
+    def _drop_into_water(self, rows, player):
+        """Odejmij pingwinom, które wpadły do wody, 5 rybek i przenieś je
+        na losowe niezajęte pola. Na zapełnionej planszy pingwin zostaje
+        na miejscu.
+        """
+        self.scores[rows, player] = numpy.maximum(self.scores[rows, player] - 5, 0)
+
+        tiles = self._random_unoccupied_tiles(rows)
+        placed = tiles >= 0
+        rows, tiles = rows[placed], tiles[placed]
+        self.penguin_counts[rows, self.tiles[rows, player]] -= 1
+        self.penguin_counts[rows, tiles] += 1
+        self.tiles[rows, player] = tiles
+
+    def _random_unoccupied_tiles(self, rows):
+        """Zwróć tablicę z losowym niezajętym polem planszy każdej z podanych
+        rozgrywek lub -1, jeżeli wszystkie jej pola są zajęte.
+        """
+        occupied = self.closed | self.fish[rows] | (self.penguin_counts[rows] > 0)
+        keys = self.random.random_sample(occupied.shape)
+        keys[occupied] = -1
+        tiles = keys.argmax(axis=1)
+        tiles[keys[numpy.arange(len(rows)), tiles] < 0] = -1
+        return tiles
+
+def step_board(board, directions, respawns=None):
+    """Wykonaj jeden krok na zwykłej planszy: przesuń pingwiny o numerach
+    0, 1, ... w podanych kierunkach (kodowanych jak w BatchBoard).
+
+    Pingwin, który wpadł do wody, trafia na pole z listy `respawns`
+    (indeksowanej numerem pingwina) lub, domyślnie, na losowe niezajęte
+    pole planszy.
+    """
+    for player, direction in enumerate(directions):
+        if direction < 0:
+            continue
+        if not board.move_penguin(player, DIRECTION_NAMES[direction], unconditionally=True):
+            continue
+
+        penguin = board.penguins[player]
+        if board.penguin_ate_fish(player):
+            penguin.eat_fish()
+        elif board.penguin_dropped_into_water(player):
+            penguin.drop_into_water()
+            if respawns is None:
+                try:
+                    position = board.random_unoccupied_tile()
+                except BoardFull:
+                    continue
+            else:
+                position = respawns[player]
+                if position == (penguin.x, penguin.y):
+                    continue
+                if not board.is_unoccupied_tile(*position):
+                    raise ValueError("Respawn tile (%d, %d) is occupied." % position)
+            board.update_penguin_position(player, *position)
+
+def state(board):
+    """Zwróć posortowane listy (x, y, wynik) pingwinów i (x, y) rybek
+    planszy.
+    """
+    return (sorted([ (penguin.x, penguin.y, penguin.fish_count)
+                     for penguin in board.penguins.values() ]),
+            sorted([ (fish.x, fish.y) for fish in board.fishes ]))
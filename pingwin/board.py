@@ -1,9 +1,11 @@
 # -*- coding: utf-8 -*-
-from __future__ import with_statement
 
 import random
 
-from helpers import make_id_dict, level_path
+from helpers import make_id_dict
+from leaderboard import Leaderboard
+from level import load_level, MOVES, WALL, WATER, WALL_TILES, WATER_TILES
+from penguin import PENGUINS
 
 
 def same_positions(obj1, obj2):
@@ -16,21 +18,43 @@ def same_positions(obj1, obj2):
 def is_wall(tile):
     """Zwróc True jeżeli kafelka reprezentuje ścianę.
     """
-    return tile in r'?|.[=]#'
+    return tile in WALL_TILES
 
 def is_water(tile):
     """Zwróc True jeżeli kafelka reprezentuje wodę.
     """
-    return tile in r'~'
+    return tile in WATER_TILES
 
 class Board(object):
     """Plansza, na której rozgrywa się potyczka.
 
     Atrybuty obiektu:
-      level_string   Ciąg znaków reprezentujący układ kafelek na planszy.
-                     Patrz niżej po szczegóły dotyczące dozwolonych kafelek.
-      blocked_tiles  Lista kafelek, na które nie można wejść.
-      water_tiles    Lista kafelek zawierających wodę.
+      level           Poziom, na którym toczy się gra (patrz level.Level),
+                      współdzielony z innymi planszami na tej samej mapie.
+                      Patrz niżej po szczegóły dotyczące dozwolonych kafelek.
+      x_count         Szerokość planszy w polach.
+      y_count         Wysokość planszy w polach.
+      terrain         Siatka znaczników terenu (WALL, WATER), po jednym
+                      bajcie na pole (patrz level.Grid).
+      penguin_counts  Słownik z liczbą pingwinów stojących na polach,
+                      indeksowany numerem pola (patrz tile_index()); pola
+                      bez pingwinów nie mają w nim wpisu.
+      fish_tiles      Słownik rybek leżących na planszy, indeksowany numerem
+                      pola (patrz tile_index()).
+      fishes          Zbiór rybek leżących na planszy.
+      leaderboard     Ranking pingwinów według wyników (patrz
+                      leaderboard.Leaderboard).
+
+    Najczęściej wykonywane metody (move_penguin(), _relocate_penguin())
+    odczytują i zapisują położenie pingwina wprost w kolumnach jego
+    atrybutów (patrz penguin.PENGUINS), bez pośrednictwa obiektu.
+
+    Wszystkie siatki są jednowymiarowe, pole (x, y) ma w nich indeks
+    y * x_count + x. Słowniki zajętości (penguin_counts i fish_tiles)
+    uaktualniane są przy każdym ruchu pingwina oraz dodaniu i zjedzeniu
+    rybki, dzięki czemu zapytania o stan pola nie zależą od rozmiaru
+    planszy ani liczby obiektów, a pamięć planszy - od rozmiaru poziomu,
+    który współdzielą wszystkie plansze na tej samej mapie.
 
     Dozwolone typy kafelek:
       #  ściana (samotna)
@@ -48,35 +72,39 @@ class Board(object):
       ,  śliski lód (dolny kraniec)
       ~  woda
     """
-    # Plansza składa się z szachownicy 16x10 pól.
-    x_count = 16
-    y_count = 10
-
     def __init__(self, level_name):
-        self.level_string  = self._read_level(level_name)
-
-        self.fishes   = []
-        self.penguins = {}
-
-        self.blocked_tiles = []
-        self.water_tiles   = []
-
-        tiles = list(self.level_string)
-        for y in range(self.y_count):
-            for x in range(self.x_count):
-                tile = tiles.pop(0)
-                # Jeżeli kafelka jest ścianą, dodaj jej współrzędne do listy
-                # niedostępnych miejsc.
-                if is_wall(tile):
-                    self.blocked_tiles.append((x, y))
-                elif is_water(tile):
-                    self.water_tiles.append((x, y))
+        # Wymiary planszy określa plik poziomu.
+        self.level   = load_level(level_name)
+        self.x_count = self.level.x_count
+        self.y_count = self.level.y_count
+        self.terrain = self.level.terrain
+        self.moves   = self.level.moves
+
+        self.fishes      = set()
+        self.penguins    = {}
+        self.leaderboard = Leaderboard()
+
+        self.fish_tiles     = {}
+        self.penguin_counts = {}
+
+        self.penguin_x      = PENGUINS.columns['x']
+        self.penguin_y      = PENGUINS.columns['y']
+        self.penguin_moving = PENGUINS.columns['moving']
+
+    def tile_index(self, x, y):
+        """Zwróć indeks pola o podanych współrzędnych w siatkach planszy
+        lub None, jeżeli pole leży poza planszą.
+        """
+        if 0 <= x < self.x_count and 0 <= y < self.y_count:
+            return y * self.x_count + x
+        return None
 
     def is_free_tile(self, x, y):
         """Zwróc wartość prawda, jeżeli pole o podanych współrzędnych
-        jest wolne.
+        jest wolne. Pola poza planszą nie są wolne.
         """
-        return (x, y) not in self.blocked_tiles
+        index = self.tile_index(x, y)
+        return index is not None and self.terrain[index] != WALL
 
     def is_unoccupied_tile(self, x, y):
         """Zwróc wartość prawda, jeżeli pole o podanych współrzędnych
@@ -85,97 +113,122 @@ class Board(object):
           * nie jest kafelką z wodą (patrz is_water_tile()),
           * nie stoi w tym miejscu - ani pingwin ani rybka.
         """
-        if self.is_free_tile(x, y) \
-                and not self.is_water_tile(x, y) \
-                and not self.occupied_by_fish(x, y) \
-                and not self.occupied_by_penguin(x, y):
-            return True
-        return False
+        index = self.tile_index(x, y)
+        return index is not None \
+            and not self.terrain[index] \
+            and index not in self.penguin_counts \
+            and index not in self.fish_tiles
 
     def is_water_tile(self, x, y):
         """Zwróć wartość prawda, jeżeli pole o podanych współrzędnych
         zawiera kafelkę z wodą.
         """
-        return (x, y) in self.water_tiles
+        index = self.tile_index(x, y)
+        return index is not None and self.terrain[index] == WATER
 
     def occupied_by_fish(self, x, y):
         """Zwróć wartość prawda, jeżeli w polu o podanych współrzędnych
         leży rybka.
         """
-        for fish in self.fishes:
-            if fish.x == x and fish.y == y:
-                return True
-        return False
+        return self.tile_index(x, y) in self.fish_tiles
 
     def occupied_by_penguin(self, x, y):
         """Zwróć wartość prawda, jeżeli w polu o podanych współrzędnych
         stoi pingwin.
         """
-        for penguin in self.penguins.values():
-            if penguin.x == x and penguin.y == y:
-                return True
-        return False
+        index = self.tile_index(x, y)
+        return index in self.penguin_counts
 
     def set_fishes(self, fishes):
-        self.fishes = fishes
+        for index in self.fish_tiles.keys():
+            self._remove_fish(index)
+        for fish in fishes:
+            self.add_fish(fish)
 
     def set_penguins(self, penguins):
+        for penguin in self.penguins.values():
+            self._lift_penguin(penguin)
+            self.leaderboard.remove(penguin)
+
         self.penguins = make_id_dict(penguins)
+        for penguin in penguins:
+            self._place_penguin(penguin)
+            self.leaderboard.add(penguin)
 
     def add_fish(self, fish):
         """Połóż rybkę na planszy.
+
+        Rybka leżąca wcześniej na tym samym polu jest z planszy zdejmowana.
         """
-        self.fishes.append(fish)
+        index = self.tile_index(fish.x, fish.y)
+        if index in self.fish_tiles:
+            self._remove_fish(index)
+
+        self.fish_tiles[index] = fish
+        self.fishes.add(fish)
+        self._tile_changed(index)
 
     def move_penguin(self, penguin_id, direction, unconditionally=False):
         """Przesuń pingwina o podanym id w zadanym kierunku.
 
         Zwraca True jeżeli ruch był możliwy, False w przeciwnym wypadku.
         """
-        assert direction in ["Up", "Down", "Right", "Left"]
+        return self.step_penguin(penguin_id, direction, unconditionally) >= 0
 
-        penguin = self.penguins[penguin_id]
+    def step_penguin(self, penguin_id, direction, unconditionally=False):
+        """Przesuń pingwina tak jak move_penguin(), ale zwróć indeks pola,
+        na którym stanął, lub -1, jeżeli ruch był niemożliwy.
+        """
+        handle = self.penguins[penguin_id].handle
 
         # Jeżeli pingwin właśnie się porusza, żądanie jest ignorowane.
-        if penguin.moving and not unconditionally:
-            return False
-
-        next_location_x = penguin.x
-        next_location_y = penguin.y
-
-        if direction == "Up":
-            next_location_y -= 1
-        elif direction == "Down":
-            next_location_y += 1
-        elif direction == "Right":
-            next_location_x += 1
-        elif direction == "Left":
-            next_location_x -= 1
-
-        # Jeżeli krok skierowany jest w stronę wolnego pola i nie wykracza
-        # ono poza planszę, to krok jest wykonywany.
-        if self.is_free_tile(next_location_x, next_location_y) \
-                and 0 <= next_location_x < self.x_count \
-                and 0 <= next_location_y < self.y_count:
-            penguin.x = next_location_x
-            penguin.y = next_location_y
-            penguin.moving = True
-            return True
-
-        return False
+        if self.penguin_moving[handle] and not unconditionally:
+            return -1
+
+        # Długość ruchu odczytujemy z tablicy ruchów poziomu; ruch wykracza
+        # poza planszę lub w ścianę, gdy wynosi ona 0 (patrz level.MOVES).
+        column, step_x, step_y = MOVES[direction]
+        x, y = self.penguin_x[handle], self.penguin_y[handle]
+        old_index = y * self.x_count + x
+        distance = ord(self.moves[4 * old_index + column])
+        if not distance:
+            return -1
+
+        x += distance * step_x
+        y += distance * step_y
+        index = y * self.x_count + x
+        self.penguin_x[handle] = x
+        self.penguin_y[handle] = y
+        self.penguin_moving[handle] = True
+
+        # Jak w _count_penguins(), dla obu pól naraz.
+        counts = self.penguin_counts
+        count = counts[old_index] - 1
+        if count:
+            counts[old_index] = count
+        else:
+            del counts[old_index]
+        counts[index] = counts.get(index, 0) + 1
+        self._tile_changed(old_index)
+        self._tile_changed(index)
+        return index
 
     def penguin_ate_fish(self, penguin_id):
         """Funkcja zwraca False jeżeli pingwin o podanym id nie stoi na
         żadnej rybce, jeżeli stoi to zwraca obiekt tej rybki i usuwa ją
-        z listy self.fishes.
+        z planszy.
         """
         penguin = self.penguins[penguin_id]
 
-        for index, fish in enumerate(self.fishes):
-            if same_positions(penguin, fish):
-                return self.fishes.pop(index)
+        return self.take_fish(self.tile_index(penguin.x, penguin.y)) or False
 
-        return False
+    def take_fish(self, index):
+        """Zdejmij z planszy rybkę leżącą na polu o podanym indeksie i zwróć
+        ją. Zwróć None, jeżeli na tym polu nie ma rybki.
+        """
+        if index not in self.fish_tiles:
+            return None
+        return self._remove_fish(index)
 
     def penguin_dropped_into_water(self, penguin_id):
         """Funkcja zwraca True jeżeli pingwin stoi na kafelce z wodą.
@@ -186,59 +239,248 @@ class Board(object):
     def best_fish_count(self):
         """Zwróć ilość rybek, jaką ma najlepszy z graczy.
         """
-        best_score = -1
-
-        for penguin in self.penguins.values():
-            if penguin.fish_count > best_score:
-                best_score = penguin.fish_count
-
-        return best_score
+        return self.leaderboard.best_score()
 
     def update_penguin_position(self, penguin_id, x, y):
         """Przestaw pingwina w zadaną pozycję.
         """
-        penguin = self.penguins[penguin_id]
-        penguin.x = x
-        penguin.y = y
+        self._relocate_penguin(self.penguins[penguin_id], x, y)
+
+    def _place_penguin(self, penguin):
+        """Odnotuj w siatce zajętości pingwina stojącego na swojej pozycji.
+        """
+        index = self.tile_index(penguin.x, penguin.y)
+        if index is not None:
+            self._count_penguins(index, 1)
+
+    def _lift_penguin(self, penguin):
+        """Usuń z siatki zajętości pingwina, który zaraz zmieni pozycję.
+        """
+        index = self.tile_index(penguin.x, penguin.y)
+        if index is not None:
+            self._count_penguins(index, -1)
+
+    def _relocate_penguin(self, penguin, x, y):
+        """Przestaw pingwina na podane pole, uaktualniając siatkę zajętości.
+        """
+        handle = penguin.handle
+        old_index = self.tile_index(self.penguin_x[handle], self.penguin_y[handle])
+        new_index = self.tile_index(x, y)
+
+        self.penguin_x[handle] = x
+        self.penguin_y[handle] = y
+
+        if old_index is not None:
+            self._count_penguins(old_index, -1)
+        if new_index is not None:
+            self._count_penguins(new_index, 1)
+
+    def _count_penguins(self, index, change):
+        """Zmień o `change` liczbę pingwinów stojących na polu o podanym
+        indeksie.
+        """
+        count = self.penguin_counts.get(index, 0) + change
+        if count:
+            self.penguin_counts[index] = count
+        else:
+            del self.penguin_counts[index]
+        self._tile_changed(index)
+
+    def _remove_fish(self, index):
+        """Zdejmij z planszy rybkę leżącą na polu o podanym indeksie
+        i zwróć ją.
+        """
+        fish = self.fish_tiles.pop(index)
+        self.fishes.discard(fish)
+        self._tile_changed(index)
+        return fish
+
+    def _tile_changed(self, index):
+        """Wywoływana po każdej zmianie zajętości pola o podanym indeksie.
 
-    def _read_level(self, name):
-        """Odczytaj dane poziomu o podanej nazwie.
+        Klasy pochodne mogą ją nadpisać, by utrzymywać własne indeksy pól.
         """
-        with open(level_path(name)) as fd:
-            # Zwróc zawartość pliku pomijając znaki nowej linii.
-            return fd.read().replace("\n", "")
+        pass
+
+class BoardFull(Exception):
+    """Na planszy nie ma już wystarczającej liczby niezajętych pól.
+    """
+    pass
+
+class FreeTiles(object):
+    """Ciąg indeksów niezajętych pól planszy, w dowolnej kolejności,
+    pozwalający w czasie stałym dodawać i usuwać pola oraz losować je.
+
+    Początkowo ciąg zawiera wszystkie pola bez ściany i wody w kolejności
+    tablic skompilowanego poziomu (patrz level.Level.open_tile()), które
+    są współdzielone przez wszystkie plansze na tej samej mapie. Obiekt
+    pamięta jedynie różnice względem tych tablic, więc zajmuje pamięć
+    proporcjonalną do liczby zmienionych pól, a nie do rozmiaru planszy.
+
+    Pole dodawane jest dopisywane na koniec ciągu, a pole usuwane
+    zamieniane z ostatnim elementem i zdejmowane z końca.
+
+    >>> free = FreeTiles(load_level('default'))
+    >>> count, first = len(free), free[0]
+    >>> free.remove(first)
+    >>> len(free) == count - 1, free.position(first), free[0] == first
+    (True, -1, False)
+    >>> free.add(first)
+    >>> free[len(free) - 1] == first
+    True
+    """
+    def __init__(self, level):
+        self.level = level
+        self.count = level.open_count
+
+        # Pozycje ciągu, pod którymi leży inne pole niż w tablicach poziomu,
+        # i pola, których pozycja jest inna niż w tablicach poziomu.
+        self.tiles     = {}
+        self.positions = {}
+
+    def __len__(self):
+        return self.count
+
+    def __getitem__(self, position):
+        if not 0 <= position < self.count:
+            raise IndexError(position)
+        index = self.tiles.get(position)
+        if index is None:
+            index = self.level.open_tile(position)
+        return index
+
+    def position(self, index):
+        """Zwróć pozycję pola o podanym indeksie w ciągu lub -1, jeżeli pola
+        w nim nie ma.
+        """
+        position = self.positions.get(index)
+        if position is None:
+            position = self.level.open_position(index)
+        return position
+
+    def add(self, index):
+        """Dodaj pole o podanym indeksie, jeżeli jeszcze go nie ma.
+        """
+        if self.position(index) < 0:
+            self._set_tile(self.count, index)
+            self._set_position(index, self.count)
+            self.count += 1
+
+    def remove(self, index):
+        """Usuń pole o podanym indeksie, jeżeli jest w ciągu.
+        """
+        position = self.position(index)
+        if position < 0:
+            return
+
+        last = self[self.count - 1]
+        self.count -= 1
+        self.tiles.pop(self.count, None)
+        if last != index:
+            self._set_tile(position, last)
+            self._set_position(last, position)
+        self._set_position(index, -1)
+
+    def _set_tile(self, position, index):
+        if position < self.level.open_count and self.level.open_tile(position) == index:
+            self.tiles.pop(position, None)
+        else:
+            self.tiles[position] = index
+
+    def _set_position(self, index, position):
+        if self.level.open_position(index) == position:
+            self.positions.pop(index, None)
+        else:
+            self.positions[index] = position
 
 class ServerBoard(Board):
     """Plansza z metodami przydatnymi dla serwera.
+
+    Oprócz siatek planszy serwer utrzymuje indeks niezajętych pól
+    (patrz Board.is_unoccupied_tile()), pozwalający losować je w czasie
+    stałym:
+      free_tiles     Ciąg indeksów niezajętych pól (patrz FreeTiles).
+      changed_tiles  Zbiór pól, których zajętość zmieniła się od ostatniej
+                     aktualizacji free_tiles.
+
+    Pingwin zmienia zajętość dwóch pól przy każdym kroku, a pola losowane
+    są rzadko (przy dodaniu rybki i wpadnięciu do wody), więc free_tiles
+    uaktualniany jest dopiero przed losowaniem, raz dla każdego
+    zmienionego pola.
+
+    Pola losowane są podanym generatorem liczb losowych (domyślnie modułem
+    random).
     """
+    def __init__(self, level_name, random=random):
+        self.random        = random
+        self.free_tiles    = None
+        self.changed_tiles = set()
+
+        super(ServerBoard, self).__init__(level_name)
+
+        # Na pustej planszy niezajęte są wszystkie pola bez ściany i wody,
+        # których tablice zawiera skompilowany poziom.
+        self.free_tiles = FreeTiles(self.level)
+
     def random_unoccupied_tiles(self, number):
-        """Zwróć podaną liczbę niezajętych pól.
+        """Zwróć podaną liczbę różnych niezajętych pól.
+
+        Rzuca wyjątek BoardFull, jeżeli tylu niezajętych pól nie ma.
         """
-        tiles = []
-        while len(tiles) != number:
-            tile = self.random_unoccupied_tile()
-            if tile not in tiles:
-                tiles.append(tile)
-        return tiles
+        self._update_free_tiles()
+        if number > len(self.free_tiles):
+            raise BoardFull("%d unoccupied tiles requested, only %d left" % \
+                                (number, len(self.free_tiles)))
+
+        return [ self._tile_position(self.free_tiles[position])
+                 for position in self.random.sample(xrange(len(self.free_tiles)), number) ]
 
     def random_unoccupied_tile(self):
         """Zwróć współrzędne losowego niezajętego pola.
+
+        Rzuca wyjątek BoardFull, jeżeli wszystkie pola są zajęte.
+        """
+        self._update_free_tiles()
+        if not self.free_tiles:
+            raise BoardFull("no unoccupied tiles left")
+
+        return self._tile_position(self.random.choice(self.free_tiles))
+
+    def unoccupied_tiles_count(self):
+        """Zwróć liczbę niezajętych pól planszy.
+        """
+        self._update_free_tiles()
+        return len(self.free_tiles)
+
+    def _tile_position(self, index):
+        """Zwróć współrzędne pola o podanym indeksie.
         """
-        while True:
-            x = random.randrange(0, self.x_count)
-            y = random.randrange(0, self.y_count)
-            if self.is_unoccupied_tile(x, y):
-                return (x, y)
+        return (index % self.x_count, index // self.x_count)
+
+    def _tile_changed(self, index):
+        """Zapamiętaj pole do aktualizacji indeksu niezajętych pól.
+        """
+        self.changed_tiles.add(index)
+
+    def _update_free_tiles(self):
+        """Uaktualnij indeks niezajętych pól o pola zmienione od ostatniej
+        aktualizacji.
+        """
+        if not self.changed_tiles:
+            return
+
+        terrain, penguin_counts, fish_tiles = self.terrain, self.penguin_counts, self.fish_tiles
+        # Kolejność wyznacza pozycje pól w free_tiles, a więc wyniki
+        # losowania - sortujemy, by nie zależała od budowy zbioru.
+        for index in sorted(self.changed_tiles):
+            if not terrain[index] and index not in penguin_counts and index not in fish_tiles:
+                self.free_tiles.add(index)
+            else:
+                self.free_tiles.remove(index)
+        self.changed_tiles.clear()
 
     def no_winner(self):
         """Zwróć True jeżeli nie można wyłonić zwycięzcy (np. w przypadku,
         gdy dwoje lub więcej graczy jest równocześnie na pierwszym miejscu).
         """
-        best_score = self.best_fish_count()
-        players_with_best_score = 0
-
-        for penguin in self.penguins.values():
-            if penguin.fish_count == best_score:
-                players_with_best_score += 1
-
-        return players_with_best_score > 1
+        return self.leaderboard.is_tie()
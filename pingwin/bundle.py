@@ -0,0 +1,173 @@
+# -*- coding: utf-8 -*-
+"""Paczka obrazków gry: jeden plik z gotowymi pikselami wszystkich obrazków.
+
+Obrazki z katalogu data (klatki pingwina, rybki, kafelki podłoża, nagłówek)
+można jednorazowo spakować (patrz build_bundle()) do pliku data/images.bundle:
+
+  python pingwin/bundle.py
+
+Paczka zawiera nagłówek, spis obrazków i ich piksele w formacie RGBA, więc
+klient odwzorowuje ją w pamięci przez mmap i tworzy powierzchnie prosto
+z jej bufora, bez otwierania i dekodowania kilkudziesięciu plików GIF.
+Obrazków, których nie ma w paczce albo których plik źródłowy zmienił się
+od jej zbudowania, helpers.load_image() szuka jak dotąd w pojedynczych
+plikach - brak paczki nie przeszkadza więc w pracy nad obrazkami.
+"""
+
+from __future__ import with_statement
+
+import mmap
+import os
+import struct
+
+from helpers import DATA_DIR, bundle_path
+
+
+# Katalogi i rozszerzenia plików pakowanych obrazków.
+BUNDLE_DIRECTORIES = ['', 'fish', 'ground', 'penguin']
+BUNDLE_EXTENSIONS  = ['.gif', '.jpg', '.png']
+
+# Nagłówek paczki: znacznik formatu i liczba obrazków. Po nim następuje
+# spis obrazków: nazwa pliku, szerokość, wysokość, położenie pikseli
+# w paczce oraz czas modyfikacji i rozmiar pliku źródłowego.
+BUNDLE_MAGIC  = 'PWI1'
+BUNDLE_HEADER = '!4sI'
+BUNDLE_ENTRY  = '!64sIIQdQ'
+
+# Ustaw na False, żeby zawsze wczytywać obrazki z pojedynczych plików.
+enabled = True
+
+
+class Bundle(object):
+    """Paczka obrazków odwzorowana w pamięci.
+
+    Atrybuty obiektu:
+      data     zawartość paczki (mmap albo napis)
+      entries  słownik (szerokość, wysokość, położenie pikseli, źródło)
+               według nazw plików obrazków
+    """
+    def __init__(self, data):
+        magic, count = struct.unpack_from(BUNDLE_HEADER, data)
+        if magic != BUNDLE_MAGIC:
+            raise ValueError("Not an image bundle.")
+
+        self.data    = data
+        self.entries = {}
+
+        offset = struct.calcsize(BUNDLE_HEADER)
+        entry_size = struct.calcsize(BUNDLE_ENTRY)
+        for index in range(count):
+            name, width, height, position, mtime, size = \
+                struct.unpack_from(BUNDLE_ENTRY, data, offset)
+            if position + 4 * width * height > len(data):
+                raise ValueError("Image bundle is truncated.")
+            self.entries[name.rstrip('\0')] = (width, height, position, (mtime, size))
+            offset += entry_size
+
+    def image(self, name):
+        """Zwróć powierzchnię obrazka o podanej nazwie pliku albo None,
+        jeżeli nie ma go w paczce lub jego plik źródłowy zmienił się od
+        zbudowania paczki.
+
+        Powierzchnia korzysta bezpośrednio z pamięci paczki, więc nie można
+        na niej rysować - należy ją najpierw skonwertować (patrz
+        helpers.load_image()).
+        """
+        import pygame
+
+        entry = self.entries.get(name)
+        if entry is None:
+            return None
+        width, height, position, source = entry
+
+        # Plik źródłowy może nie istnieć, jeżeli rozpowszechniamy samą paczkę.
+        try:
+            source_stat = os.stat(os.path.join(DATA_DIR, name))
+        except OSError:
+            pass
+        else:
+            if source != (source_stat.st_mtime, source_stat.st_size):
+                return None
+
+        pixels = buffer(self.data, position, 4 * width * height)
+        return pygame.image.frombuffer(pixels, (width, height), 'RGBA')
+
+# Otwarta paczka obrazków procesu albo False, jeżeli jej nie ma (patrz
+# open_bundle()).
+_bundle = None
+
+def open_bundle(path=None):
+    """Zwróć paczkę obrazków, odwzorowując ją w pamięci przy pierwszym
+    wywołaniu. Zwróć None, jeżeli paczki nie ma, zbudowano ją w innym
+    formacie albo jej używanie jest wyłączone (patrz `enabled`).
+
+    Paczka czytana jest z pliku `path` (domyślnie helpers.bundle_path());
+    ścieżka ma znaczenie tylko przy pierwszym wywołaniu w procesie.
+    """
+    global _bundle
+
+    if not enabled:
+        return None
+
+    if _bundle is None:
+        _bundle = False
+        try:
+            with open(path or bundle_path(), 'rb') as fd:
+                _bundle = Bundle(mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ))
+        except (EnvironmentError, ValueError, struct.error):
+            pass
+
+    return _bundle or None
+
+def bundled_images():
+    """Zwróć posortowaną listę nazw plików obrazków gry.
+    """
+    names = []
+    for directory in BUNDLE_DIRECTORIES:
+        for filename in os.listdir(os.path.join(DATA_DIR, directory)):
+            if os.path.splitext(filename)[1] in BUNDLE_EXTENSIONS:
+                names.append(os.path.join(directory, filename))
+    return sorted(names)
+
+def build_bundle(names=None, path=None):
+    """Spakuj obrazki o podanych nazwach plików (domyślnie wszystkie obrazki
+    gry, patrz bundled_images()) i zapisz paczkę do pliku `path` (domyślnie
+    helpers.bundle_path()). Zwróć liczbę spakowanych obrazków.
+
+    Plik zapisywany jest pod tymczasową nazwą i przemianowywany, by
+    uruchomione właśnie klienty nigdy nie odwzorowały pliku zapisanego
+    do połowy.
+    """
+    import pygame
+
+    if names is None:
+        names = bundled_images()
+
+    header_size = struct.calcsize(BUNDLE_HEADER) + \
+        len(names) * struct.calcsize(BUNDLE_ENTRY)
+
+    index  = [ struct.pack(BUNDLE_HEADER, BUNDLE_MAGIC, len(names)) ]
+    pixels = []
+    position = header_size
+    for name in names:
+        fullname = os.path.join(DATA_DIR, name)
+        source_stat = os.stat(fullname)
+        image = pygame.image.load(fullname)
+        width, height = image.get_size()
+
+        index.append(struct.pack(BUNDLE_ENTRY, name, width, height, position,
+                                 source_stat.st_mtime, source_stat.st_size))
+        pixels.append(pygame.image.tostring(image, 'RGBA'))
+        position += len(pixels[-1])
+
+    path = path or bundle_path()
+    temporary_path = '%s.%d' % (path, os.getpid())
+    with open(temporary_path, 'wb') as fd:
+        fd.write(''.join(index))
+        fd.write(''.join(pixels))
+    os.rename(temporary_path, path)
+
+    return len(names)
+
+if __name__ == '__main__':
+    print "Packed %d images into %s." % (build_bundle(), bundle_path())
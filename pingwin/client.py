@@ -4,6 +4,8 @@ import os
 import sys
 import time
 
+from optparse import OptionParser
+
 from twisted.internet.protocol import ClientFactory
 from twisted.internet.protocol import Protocol
 from twisted.internet import reactor
@@ -22,10 +24,12 @@ from messages import *
 client_lock = create_lock()
 
 # Zmienne globalne
-board        = None
-display      = None
-player_id    = None
-playing      = False
+board         = None
+display       = None
+player_id     = None
+session_token = None
+playing       = False
+low_power     = False
 
 
 def get_text_input():
@@ -66,10 +70,32 @@ def wait_many_times(on, then):
     d = threads.deferToThread(on)
     d.addCallback(do_and_wait_again)
 
+def move_penguin(penguin_id, direction, unconditionally=False):
+    """Przesuń pingwina na planszy i zanimuj ruch na ekranie, zdejmując
+    zjedzoną przez niego rybkę.
+
+    Zwraca True jeżeli ruch był możliwy, False w przeciwnym wypadku.
+    """
+    if not board.move_penguin(penguin_id, direction, unconditionally):
+        return False
+
+    fish = board.penguin_ate_fish(penguin_id)
+    if fish:
+        display.remove_fish(fish)
+    display.move_penguin(penguin_id, direction)
+    return True
+
+def update_frame_rate():
+    """Odświeżaj ekran rzadziej, gdy gra się nie toczy albo gdy użytkownik
+    wybrał tryb oszczędzania energii.
+    """
+    display.render_loop.set_low_power(low_power or not playing)
+
 def end_game(reason):
     """Zakończ grę wyświetlając na ekranie powód.
     """
     print reason
+    print "Frame stats: %s" % display.render_loop.stats.dump()
     display.display_text(reason)
     run_after(2, lambda: os._exit(1))
 
@@ -80,8 +106,16 @@ class PenguinClientProtocol(Protocol):
     @locked(client_lock)
     def connectionMade(self):
         """Funkcja wywoływana w momencie nawiązania połączenia z serwerem.
+        """
+        # Dekoder składający komunikaty z napływających fragmentów danych.
+        self.decoder = MessageDecoder()
+        # Flaga określająca, czy lobby skierowało nas do innego procesu serwera.
+        self.redirected = False
+
+        display.display_text("Polaczono z serwerem, wczytuje plansze...")
 
-        Tutaj inicjowana jest pętla wait_many_times() działająca na funkcji
+    def _start_input_loop(self):
+        """Zainicjuj pętlę wait_many_times() działającą na funkcji
         get_text_input() pozwalając użytkownikowi na interakcję z klawiatury.
         """
         @locked(client_lock)
@@ -102,22 +136,24 @@ class PenguinClientProtocol(Protocol):
                 display.turn_penguin(player_id, key)
 
                 # Spróbuj przesunąć pingwina w wybranym kierunku.
-                if board.move_penguin(player_id, key):
-                    display.move_penguin(player_id, key)
+                if move_penguin(player_id, key):
                     send(self.transport, MoveMeToMessage(key))
                 # Jeżeli nie można przesunąć, zobacz czy można chociaż
                 # przekręcić.
                 elif turning_makes_sense:
                     send(self.transport, TurnMeToMessage(key))
 
-        display.display_text("Polaczono z serwerem, wczytuje plansze...")
-
         # Zainicuj wątek, który czeka na wejście z klawiatury.
         wait_many_times(on=get_text_input, then=take_action_and_send)
 
     @locked(client_lock)
     def connectionLost(self, reason):
         global playing
+
+        # Połączenie z lobby kończy się po przekierowaniu.
+        if self.redirected:
+            return
+
         playing = False
         end_game("Rozlaczono z serwerem")
 
@@ -125,14 +161,14 @@ class PenguinClientProtocol(Protocol):
     def dataReceived(self, data):
         """Funkcja wywoływana zawsze, gdy otrzymamy dane od serwera.
         """
-        messages = receive(data)
-        for message in messages:
+        for message in self.decoder.feed(data):
             self._processMessage(message)
 
     def _processMessage(self, message):
         global board
         global display
         global player_id
+        global session_token
         global playing
 
         # Pobierz nazwę planszy od serwera, wczytaj ją i pokaż na ekranie.
@@ -141,14 +177,26 @@ class PenguinClientProtocol(Protocol):
 
             board = Board(message.level_name)
             player_id = message.player_id
+            session_token = message.token
 
-            display.set_board(board)
+            display.set_board(board, player_id)
             display.display_text("Czekam na pozostalych graczy...")
 
+            self._start_input_loop()
+
+        # Lobby skierowało nas do jednego z procesów serwera.
+        elif isinstance(message, RedirectMessage):
+            print "Redirected to port %d." % message.port
+            self.redirected = True
+
+            reactor.connectTCP(self.transport.getPeer().host, message.port,
+                               self.factory)
+
         # Wyświetl pigwiny w pozycjach podanych przez serwer i rozpocznij grę.
         elif isinstance(message, StartGameMessage):
             print "Game started by the server."
             playing = True
+            update_frame_rate()
 
             board.set_fishes(message.fishes)
             display.set_fishes(message.fishes)
@@ -162,6 +210,7 @@ class PenguinClientProtocol(Protocol):
         elif isinstance(message, EndGameMessage):
             print "Game stopped by the server."
             playing = False
+            update_frame_rate()
 
             display.stop_timer()
             display.show_results()
@@ -171,16 +220,14 @@ class PenguinClientProtocol(Protocol):
             print "Got moveOtherTo(%s, %s) message." % (message.penguin_id, message.direction)
 
             display.turn_penguin(message.penguin_id, message.direction)
-            display.move_penguin(message.penguin_id, message.direction)
-            board.move_penguin(message.penguin_id, message.direction,
-                               unconditionally=True)
+            move_penguin(message.penguin_id, message.direction, unconditionally=True)
 
         elif isinstance(message, TurnOtherToMessage):
             print "Got turnOtherTo(%s, %s) message." % (message.penguin_id, message.direction)
             display.turn_penguin(message.penguin_id, message.direction)
 
         elif isinstance(message, ScoreUpdateMessage):
-            display.update_score(message.penguin_id, message.fish_count)
+            board.penguins[message.penguin_id].set_fish_count(message.fish_count)
 
         # Jeżeli pingwin wpadł do wody to zamigotaj nim przez chwilę.
         elif isinstance(message, PositionUpdateMessage):
@@ -188,6 +235,7 @@ class PenguinClientProtocol(Protocol):
             display.blink_penguin(message.penguin_id)
 
         elif isinstance(message, NewFishMessage):
+            board.add_fish(message.fish)
             display.add_fish(message.fish)
 
         elif isinstance(message, RiseGameDurationMessage):
@@ -206,10 +254,13 @@ class ClientConnection(object):
         reactor.connectTCP(server_address, 8888, factory)
 
 
-def run(server_address):
+def run(server_address, fps=30, low_power_mode=False):
     global display
+    global low_power
 
-    display = ClientDisplay()
+    display = ClientDisplay(fps=fps)
+    low_power = low_power_mode
+    update_frame_rate()
     display.display_text("Laczenie z serwerem...")
     connection = ClientConnection(server_address)
 
@@ -217,9 +268,17 @@ def run(server_address):
     reactor.run()
 
 if __name__ == '__main__':
+    parser = OptionParser(usage="%prog [options] server_address")
+    parser.add_option("--fps", type="int", default=30, metavar="N",
+                      help="refresh the screen N times per second [default: %default]")
+    parser.add_option("--low-power", action="store_true", default=False,
+                      help="refresh the screen less often to save power")
+    options, arguments = parser.parse_args()
+
     try:
-        server_address = sys.argv[1]
+        server_address = arguments[0]
     except:
-        print "usage: %s server_address" % sys.argv[0]
+        parser.print_usage()
+        sys.exit()
 
-    run(server_address)
+    run(server_address, fps=options.fps, low_power_mode=options.low_power)
@@ -2,12 +2,14 @@
 
 import time
 
+from collections import deque
+
 import pygame
 from pygame.color import Color
 
-from concurrency import locked, create_lock
-from helpers import make_id_dict, load_image, make_text, run_after, run_each,\
-    add_name_to_penguin
+from assets import assets
+from helpers import make_id_dict, make_text, render_text, run_after, monotonic
+from renderloop import RenderLoop
 
 # Wysokość i szerokość podstawowej kafelki podłoża.
 TILE_WIDTH = 40
@@ -16,8 +18,9 @@ TILE_HEIGHT = 40
 # Odległość planszy od górnej granicy ekranu w pikselach.
 STATUS_BAR_HEIGHT = 130
 
-# Blokada dla wszystkich funkcji wyświetlających.
-display_lock = create_lock()
+# Liczba pól planszy mieszczących się na ekranie.
+VIEWPORT_X_COUNT = 16
+VIEWPORT_Y_COUNT = 10
 
 
 class FishSprite(pygame.sprite.Sprite):
@@ -36,10 +39,18 @@ class FishSprite(pygame.sprite.Sprite):
     def _gety(self): return self.fish.y
     y = property(_gety)
 
-    def paint_on(self, screen):
-        """Narysuj siebie na podanym ekranie.
+    def paint_on(self, screen, offset=(0, 0)):
+        """Narysuj siebie na podanym ekranie, przesuniętym względem planszy
+        o podaną liczbę pikseli (patrz BoardSurface.pixel_offset()).
+        """
+        screen.blit(self.image, self.screen_position(offset))
+
+    def screen_position(self, offset=(0, 0)):
+        """Zwróć położenie obrazka na ekranie przesuniętym względem planszy
+        o podaną liczbę pikseli.
         """
-        screen.blit(self.image, self._centered_coordinates())
+        x, y = self._centered_coordinates()
+        return (x - offset[0], y - offset[1])
 
     def _centered_coordinates(self):
         """Zwróć współrzędne, dla których obrazek rybki będzie wyśrodkowany
@@ -49,22 +60,35 @@ class FishSprite(pygame.sprite.Sprite):
                 self.y * TILE_HEIGHT + STATUS_BAR_HEIGHT)
 
     def _load_images(self):
-        """Ustaw FishSprite.images, wczytując obrazki z dysku jeżeli to
-        konieczne.
+        """Ustaw FishSprite.images (patrz assets.AssetManager).
         """
         if hasattr(FishSprite, 'images'):
             return
 
-        FishSprite.images = [
-            load_image('fish/fish-1.gif'),
-            load_image('fish/fish-2.gif'),
-            load_image('fish/fish-3.gif'),
-            load_image('fish/fish-4.gif')]
+        FishSprite.images = assets.fish_images()
 
 class PenguinSprite(pygame.sprite.Sprite):
+    """Sylwetka pingwina.
+
+    Animacje zależą wyłącznie od upływu czasu (patrz update()), a nie od
+    liczby narysowanych klatek, więc ruch i migotanie trwają tyle samo przy
+    każdej częstotliwości odświeżania ekranu. Czasy podawane są w sekundach
+    wg zegara ekranu (patrz ClientDisplay).
+    """
     # Liczba klatek z jakiej składa się animacja pingwina.
     number_of_frames = 6
 
+    # Czas trwania animacji przejścia na sąsiednie pole (tyle trwała przy
+    # dawnym przełączaniu klatek co odświeżenie, 30 razy na sekundę).
+    move_duration = 0.15
+
+    # Okres migotania; przez pierwsze dwie trzecie okresu pingwina nie widać.
+    blink_period = 0.1
+
+    # Pusta klatka pokazywana podczas migotania, wspólna dla wszystkich
+    # pingwinów.
+    empty_image = pygame.Surface((0, 0))
+
     def __init__(self, penguin):
         pygame.sprite.Sprite.__init__(self)
 
@@ -73,20 +97,37 @@ class PenguinSprite(pygame.sprite.Sprite):
         self._load_images()
 
         # Na początku pingwin stoi w miejscu patrząc w dół.
-        self.blinking      = False
         self.current_frame = 0
         self.direction     = "Down"
         self._set_image()
+        self.rect = self.image.get_rect()
+
+        # Początek trwającej animacji ruchu i przesunięcie sylwetki względem
+        # pola docelowego w pikselach.
+        self.move_started = None
+        self.offset       = 0
+
+        # Początek i koniec migotania; None, jeżeli pingwin nie migocze.
+        self.blink_started = None
+        self.blink_ends    = None
 
     # Informację o tym, czy pingwin właśnie się przesuwa pobieraj z obiektu
     # penguin.
     def _getmoving(self): return self.penguin.moving
     moving = property(_getmoving)
 
-    def paint_on(self, screen):
-        """Narysuj siebie na podanym ekranie.
+    def paint_on(self, screen, offset=(0, 0)):
+        """Narysuj siebie na podanym ekranie, przesuniętym względem planszy
+        o podaną liczbę pikseli (patrz BoardSurface.pixel_offset()).
+        """
+        screen.blit(self.image, self.screen_position(offset))
+
+    def screen_position(self, offset=(0, 0)):
+        """Zwróć położenie obrazka na ekranie przesuniętym względem planszy
+        o podaną liczbę pikseli.
         """
-        screen.blit(self.image, self._centered_coordinates())
+        x, y = self._centered_coordinates()
+        return (x - offset[0], y - offset[1])
 
     def turn(self, direction):
         """Przekręć pingiwna w wybranym kierunku.
@@ -94,171 +135,193 @@ class PenguinSprite(pygame.sprite.Sprite):
         self.direction = direction
         self._set_image()
 
-    def animate_move(self, direction):
-        """Zanimuj przejście pingwina w wybranym kierunku.
+    def animate_move(self, direction, now):
+        """Zacznij animację przejścia pingwina w wybranym kierunku, od chwili
+        `now`.
         """
+        self.direction    = direction
+        self.move_started = now
         self._set_image()
 
-    def animate_blink(self, duration):
-        """Zamigotaj sylwetką pingwina przez podaną liczbę sekund.
+    def animate_blink(self, now, duration):
+        """Migocz sylwetką pingwina przez `duration` sekund od chwili `now`.
         """
-        self.blinking = 1
-        run_after(duration, locked(display_lock)(lambda: self._stop_blinking()))
+        self.blink_started = now
+        self.blink_ends    = now + duration
 
-    def flip(self):
-        """Zamień obrazek na następną klatkę animacji.
+    def update(self, now):
+        """Ustaw klatkę animacji i przesunięcie sylwetki na chwilę `now`.
         """
+        self.offset = 0
         if self.moving:
-            self.current_frame += 1
-
-            self._set_image()
-
-            # Jeżeli pokazaliśmy wszystkie klatki to zakończ animację.
-            if self._is_last_frame():
+            if self.move_started is None:
+                self.move_started = now
+            progress = (now - self.move_started) / self.move_duration
+
+            if progress < 1:
+                # Klatka 0 to pingwin stojący, w ruchu pokazujemy pozostałe.
+                self.current_frame = 1 + int(progress * (self.number_of_frames - 1))
+                self.offset = int(TILE_WIDTH * (1 - progress))
+                self._set_image()
+            else:
+                # Pingwin zostaje w ostatniej klatce ruchu, aż do przekręcenia.
+                self.current_frame = self.number_of_frames - 1
+                self._set_image()
                 self.current_frame = 0
+                self.move_started = None
                 self.penguin.stop()
 
-        # Podczas migotania pomijaj co trzecią klatkę.
-        if self.blinking:
-            if self.blinking % 3:
-                self._set_empty_image()
+        if self.blink_ends is not None:
+            if now >= self.blink_ends:
+                self.blink_started = self.blink_ends = None
+                self._set_image()
+            elif (now - self.blink_started) % self.blink_period < \
+                    self.blink_period * 2 / 3:
+                self.image = self.empty_image
             else:
                 self._set_image()
-            self.blinking += 1
-
-    def _is_last_frame(self):
-        """Zwróć wartość prawda jeżeli wyświetlamy ostatnią klatkę animacji.
-        """
-        return self.current_frame == self.number_of_frames - 1
-
-    def _remaining_frames(self):
-        """Zwróć liczbę klatek, jakie jeszcze będziemy musieli wyświetlić.
-        """
-        return self.number_of_frames - self.current_frame
 
     def _centered_coordinates(self):
         """Zwróć współrzędne, dla których sylwetka pingwina będzie
         wyśrodkowana w jego aktualnym położeniu.
         """
-        # Liczba pikseli przesunięcia dla jednej klatki.
-        frame_step = TILE_WIDTH / self.number_of_frames
-
         centered_x = self.penguin.x * TILE_WIDTH + 7
         centered_y = self.penguin.y * TILE_HEIGHT + STATUS_BAR_HEIGHT - 26
 
         # Jeżeli się poruszamy to self.penguin.x i self.penguin.y wskazują
         # na klatkę docelową.
-        if self.moving:
+        if self.offset:
             if self.direction == "Right":
-                centered_x -= frame_step * self._remaining_frames()
+                centered_x -= self.offset
             elif self.direction == "Left":
-                centered_x += frame_step * self._remaining_frames()
+                centered_x += self.offset
             elif self.direction == "Up":
-                centered_y += frame_step * self._remaining_frames()
+                centered_y += self.offset
             elif self.direction == "Down":
-                centered_y -= frame_step * self._remaining_frames()
+                centered_y -= self.offset
 
         return centered_x, centered_y
 
     def _load_images(self):
-        """Ustaw PenguinSprite.images, wczytując obrazki z dysku jeżeli to
-        konieczne.
+        """Ustaw self.images - klatki animacji z naniesionym numerem gracza
+        (patrz assets.AssetManager).
         """
-        id = 1 # XXX na razie tylko jeden typ/kolor pingwina
-
-        def frames_in_direction(direction):
-            frames = []
-
-            for frame in range(1, self.number_of_frames+1):
-                # Wczytaj klatkę z dysku.
-                frame = load_image('penguin/penguin-%d-%s-%d.gif' % (id, direction, frame))
-                # Nanieś na klatkę identyfikator gracza.
-                add_name_to_penguin(str(self.penguin.number), frame, self.penguin.color)
-                # Dodaj klatkę do listy.
-                frames.append(frame)
-
-            return frames
-
-        self.images = {
-            'Up':    frames_in_direction("back"),
-            'Down':  frames_in_direction("front"),
-            'Right': frames_in_direction("right"),
-            'Left':  frames_in_direction("left")}
+        self.images = assets.penguin_frames(self.penguin.number, self.penguin.color)
 
     def _set_image(self):
         """Ustaw obrazek pingwina zależnie od obecnego kierunku i klatki
         animacji.
         """
         self.image = self.images[self.direction][self.current_frame]
-        self.rect = self.image.get_rect()
 
-    def _set_empty_image(self):
-        """Ustaw pustą przezroczystą klatkę.
+class BoardSurface(pygame.Surface):
+    """Widoczny fragment planszy.
+
+    Powierzchnia ma rozmiar co najwyżej VIEWPORT_X_COUNT x VIEWPORT_Y_COUNT
+    pól, niezależnie od rozmiaru planszy. Atrybut `origin` zawiera
+    współrzędne lewego górnego widocznego pola; po przesunięciu widoku
+    rysowane są tylko kafelki widocznych pól.
+    """
+    def __init__(self, board, x_count=VIEWPORT_X_COUNT, y_count=VIEWPORT_Y_COUNT):
+        self.board   = board
+        self.x_count = min(x_count, board.x_count)
+        self.y_count = min(y_count, board.y_count)
+
+        pygame.Surface.__init__(self, (TILE_WIDTH * self.x_count,
+                                       TILE_HEIGHT * self.y_count))
+        self._init_grounds()
+
+        self.origin = None
+        self.scroll_to(0, 0)
+
+    def follow(self, x, y):
+        """Przesuń widok tak, by pole o podanych współrzędnych znalazło się
+        możliwie blisko jego środka.
         """
-        self.image = pygame.Surface((0,0))
-        self.rect = self.image.get_rect()
+        self.scroll_to(min(max(x - self.x_count // 2, 0), self.board.x_count - self.x_count),
+                       min(max(y - self.y_count // 2, 0), self.board.y_count - self.y_count))
 
-    def _stop_blinking(self):
-        """Przestań migotać.
+    def scroll_to(self, origin_x, origin_y):
+        """Przesuń widok tak, by pole o podanych współrzędnych było jego
+        lewym górnym polem.
         """
-        self.blinking = 0
-        self._set_image()
+        if self.origin == (origin_x, origin_y):
+            return
+        self.origin = (origin_x, origin_y)
 
-class BoardSurface(pygame.Surface):
-    def __init__(self, board):
-        pygame.Surface.__init__(self, (TILE_WIDTH * board.x_count,
-                                       TILE_HEIGHT * board.y_count))
         self.fill(Color("white"))
-        self._init_grounds()
 
-        # Wypełniamy planszę według znaków z mapki poziomu.
-        tiles = list(board.level_string)
-        for y in range(0, self.get_height(), 40):
-            for x in range(0, self.get_width(), 40):
-                # Pobierz następną kafelkę.
-                tile = tiles.pop(0)
+        # Wypełniamy widok według znaków z mapki poziomu.
+        for row in range(self.y_count):
+            tiles = self.board.level.row(origin_y + row, origin_x, origin_x + self.x_count)
+            for column, tile in enumerate(tiles):
                 # Jeżeli w opisie poziomu użyto nieznanej kafelki,
                 #   użyj zamiast jej śniegu.
                 if tile not in self.ground:
                     tile = ' '
                 # Wyświetl kafelkę na planszy.
-                self.blit(self.ground[tile], (x, y))
+                self.blit(self.ground[tile], (column * TILE_WIDTH, row * TILE_HEIGHT))
+
+    def is_visible(self, x, y):
+        """Zwróć wartość prawda, jeżeli pole o podanych współrzędnych
+        mieści się w widoku.
+        """
+        return 0 <= x - self.origin[0] < self.x_count \
+            and 0 <= y - self.origin[1] < self.y_count
+
+    def pixel_offset(self):
+        """Zwróć przesunięcie widoku względem początku planszy w pikselach.
+        """
+        return (self.origin[0] * TILE_WIDTH, self.origin[1] * TILE_HEIGHT)
 
     def _init_grounds(self):
         """Wczytaj obrazki podłoża, zbierając je w słowniku
         self.ground, gdzie klucz odpowiada znakowi użytemu
         na mapce poziomu.
         """
-        self.ground = {
-            ' ': load_image('ground/snow.gif'),
-            '~': load_image('ground/water.gif'),
-            '#': load_image('ground/wall.gif'),
-
-            '[': load_image('ground/wall-horizontal-left.gif'),
-            '=': load_image('ground/wall-horizontal-middle.gif'),
-            ']': load_image('ground/wall-horizontal-right.gif'),
-
-            '?': load_image('ground/wall-vertical-top.gif'),
-            '|': load_image('ground/wall-vertical-middle.gif'),
-            '.': load_image('ground/wall-vertical-bottom.gif'),
-
-            '<': load_image('ground/ice-horizontal-left.gif'),
-            '-': load_image('ground/ice-horizontal-middle.gif'),
-            '>': load_image('ground/ice-horizontal-right.gif'),
-
-            '^': load_image('ground/ice-vertical-top.gif'),
-            '/': load_image('ground/ice-vertical-middle.gif'),
-            ',': load_image('ground/ice-vertical-bottom.gif')}
+        self.ground = assets.ground_tiles()
 
 class ClientDisplay(object):
-    "Klasa służąca do manipulowania ekranem."
+    """Klasa służąca do manipulowania ekranem.
+
+    Ekran składa się z elementów (patrz _scene()) rysowanych kolejno na
+    sobie: paska stanu z wynikami, widoku planszy, rybek, pingwinów, zegara
+    i tekstu informacyjnego. Jeżeli `dirty_rects` jest prawdą, w każdej
+    klatce przerysowywane i wysyłane na ekran (pygame.display.update())
+    są tylko prostokąty zajmowane przez elementy, które od poprzedniej
+    klatki zmieniły obrazek lub położenie. W przeciwnym wypadku każda
+    klatka rysowana jest od nowa w całości (pygame.display.flip()).
+
+    Metody zmieniające zawartość ekranu (set_board(), move_penguin(),
+    add_fish() itd.) nie rysują niczego, tylko dodają niezmienne polecenie
+    do kolejki `commands` (collections.deque, której dopisywanie
+    i zdejmowanie elementów nie wymaga blokad). Polecenia wykonywane są
+    w kolejności wydania na początku każdej klatki (patrz refresh()),
+    a sama klatka rysowana jest z listy elementów ekranu zbudowanej po
+    ich wykonaniu (patrz _scene()) i porównywana z listą z poprzedniej
+    klatki - obsługa sieci i klawiatury nigdy nie czeka więc na rysowanie.
+    Stan pingwinów i rybek (położenia, wyniki) należy zmieniać na planszy
+    przed wydaniem polecenia.
+
+    Ekran odświeżany jest `fps` razy na sekundę, a w trybie oszczędzania
+    energii `low_power_fps` razy na sekundę (patrz renderloop.RenderLoop,
+    dostępny jako atrybut render_loop). Animacje pingwinów liczone są wg
+    czasu podawanego przez funkcję `clock` (patrz PenguinSprite).
+
+    Statystyki odświeżania: frames (liczba klatek), pixels_pushed (liczba
+    pikseli wysłanych na ekran) i frame_time (łączny czas rysowania klatek
+    w sekundach). Statystyki czasu ostatnich klatek zbiera render_loop.stats.
+    """
 
     # Gra działa w rozdzielczości 640x530.
     width = 640
     height = 530
 
-    def __init__(self, title="Penguin"):
-        self.title = title
+    def __init__(self, title="Penguin", dirty_rects=True, fps=30, low_power_fps=10,
+                 clock=monotonic):
+        self.title       = title
+        self.dirty_rects = dirty_rects
+        self.clock       = clock
 
         # Inicjalizacja, ustawienie rozdzielczości i tytułu.
         pygame.init()
@@ -269,228 +332,352 @@ class ClientDisplay(object):
         pygame.key.set_repeat(200, 30)
 
         # Wczytaj obrazek na górną belkę.
-        self.status_bar_image = load_image('header.jpg')
+        self.status_bar_image = assets.image('header.jpg')
+        self.status_bar = pygame.Surface((self.width, STATUS_BAR_HEIGHT))
+        self.status_bar.blit(self.status_bar_image, (0,0))
+
+        # Położenia i sygnatury elementów ekranu z poprzedniej klatki
+        # (patrz _dirty_rects()).
+        self.painted = {}
+
+        # Polecenia czekające na wykonanie w następnej klatce.
+        self.commands = deque()
+
+        self.penguins_sprites = {}
+
+        self.frames        = 0
+        self.pixels_pushed = 0
+        self.frame_time    = 0.0
 
         self.text = None
+        # Zaplanowane usunięcie tekstu informacyjnego.
+        self.text_timer = None
 
-        # Zacznij odświeżać ekran z domyślną częstotliwością.
-        refresh_it(self)
+        # Zacznij odświeżać ekran.
+        self.render_loop = RenderLoop(self, fps, low_power_fps)
+        self.render_loop.start()
 
-    @locked(display_lock)
-    def set_board(self, board):
+    def set_board(self, board, player_id=None):
         """Wyświetl na ekranie pustą planszę.
-        """
-        self.board = board
 
-        # Utworzenie planszy (będzie niezmienna przez całą grę).
-        self.board_surface = BoardSurface(self.board)
+        Jeżeli plansza nie mieści się na ekranie, widok podąża za pingwinem
+        gracza o podanym identyfikatorze.
+        """
+        self.commands.append(('set_board', board, player_id))
 
-    @locked(display_lock)
     def set_fishes(self, fishes):
         """Wyświetl rybki na ekranie.
         """
-        self.fishes_sprites = [ FishSprite(fish) for fish in fishes ]
+        self.commands.append(('set_fishes', tuple(fishes)))
 
-    @locked(display_lock)
     def set_penguins(self, penguins):
         """Wyświetl wszystkie pingwiny na ekranie.
         """
-        self.penguins_sprites = make_id_dict(penguins, function=PenguinSprite)
+        self.commands.append(('set_penguins', tuple(penguins)))
 
-    @locked(display_lock)
     def set_timer(self, game_duration):
         """Włącz zegar odliczający sekundy do końca gry.
         """
-        self.game_start_time = time.time()
-        self.game_duration   = game_duration
+        self.commands.append(('set_timer', time.time(), game_duration))
 
-    @locked(display_lock)
     def display_text(self, text, duration=None):
         """Pokaż tekst informacyjny na środku ekranu.
 
         Jeżeli podano parametr `duration` napis zniknie po zadanej liczbie
         sekund.
         """
-        self.text = text
+        self.commands.append(('display_text', text, duration))
 
-        if duration:
-            run_after(duration, lambda: self.clear_text())
-
-    @locked(display_lock)
     def clear_text(self):
         """Wyczyść tekst informacyjny.
         """
-        self.text = None
+        self.commands.append(('clear_text', None))
 
-    @locked(display_lock)
     def turn_penguin(self, penguin_id, direction):
-        """Przekręć pingwina w wybranym kierunku.
-
-        Zwraca True, gdy przekręcenie się miało sens (tzn. wcześniej
-        pingwin był skierowany w innym kierunku i nie był w trakcie ruchu).
+        """Przekręć pingwina w wybranym kierunku, jeżeli nie jest on
+        w trakcie ruchu.
         """
-        penguin = self.penguins_sprites[penguin_id]
-
-        if not penguin.moving:
-            penguin.turn(direction)
+        self.commands.append(('turn_penguin', penguin_id, direction))
 
-    @locked(display_lock)
     def turning_makes_sense(self, penguin_id, direction):
         """Zwróć True, gdy przekręcenie danego pingwina w zadanym kierunku
         ma sens, tzn.:
           * wcześniej pingwin był skierowany w innym kierunku
           * nie był w trakcie ruchu
+
+        Odpowiedź dotyczy stanu ekranu z ostatniej narysowanej klatki.
         """
-        penguin = self.penguins_sprites[penguin_id]
+        penguin = self.penguins_sprites.get(penguin_id)
 
-        if not penguin.moving and penguin.direction != direction:
+        if penguin and not penguin.moving and penguin.direction != direction:
             return True
 
         return False
 
-    @locked(display_lock)
     def move_penguin(self, penguin_id, direction):
-        """Przesuń pingwina o podanym id w zadanym kierunku.
+        """Zanimuj ruch pingwina o podanym id w zadanym kierunku. Położenie
+        pingwina należy wcześniej zmienić na planszy (patrz
+        board.Board.move_penguin()).
         """
-        self.penguins_sprites[penguin_id].animate_move(direction)
+        self.commands.append(('move_penguin', penguin_id, direction, self.clock()))
 
-        # Jeżeli pingwin stanął na polu z rybką, rybka powinna zniknąć.
-        fish = self.board.penguin_ate_fish(penguin_id)
-        if fish:
-            self._remove_fish_sprite(fish)
-
-    @locked(display_lock)
     def blink_penguin(self, penguin_id):
         """Zamigotaj sylwetką pingwina przez dwie sekundy.
         """
-        self.penguins_sprites[penguin_id].animate_blink(duration=2)
+        self.commands.append(('blink_penguin', penguin_id, self.clock()))
 
-    @locked(display_lock)
-    def update_score(self, penguin_id, fish_count):
-        """Uaktualnij wynik gracza i wyświetl go na ekranie.
+    def add_fish(self, fish):
+        """Wyświetl nową rybkę, położoną już na planszy.
         """
-        self.board.penguins[penguin_id].fish_count = fish_count
+        self.commands.append(('add_fish', fish))
 
-    @locked(display_lock)
-    def add_fish(self, fish):
-        """Dodaj nową rybę na planszę.
+    def remove_fish(self, fish):
+        """Usuń z ekranu rybkę, zdjętą już z planszy.
         """
-        self.board.add_fish(fish)
-        self.fishes_sprites.append(FishSprite(fish))
+        self.commands.append(('remove_fish', fish))
 
-    @locked(display_lock)
     def rise_game_duration(self, duration):
         """Przedłuż czas trwania gry o podaną liczbę sekund.
         """
-        self.game_duration += duration
+        self.commands.append(('rise_game_duration', duration))
 
-    @locked(display_lock)
     def stop_timer(self):
         """Zatrzymaj zegar.
         """
-        del self.game_duration
-
-    @locked(display_lock)
-    def refresh(self):
-        """Przerysuj cały ekran.
-        """
-        self._paint_status_bar()
-        if hasattr(self, 'board_surface'):
-            self._paint_board()
-        if hasattr(self, 'fishes_sprites'):
-            self._paint_fishes()
-        if hasattr(self, 'penguins_sprites'):
-            self._flip_penguins_animations()
-            self._paint_penguins()
-        if hasattr(self, 'game_duration'):
-            self._paint_timer()
-        if self.text:
-            self._paint_text()
-
-        pygame.display.flip()
+        self.commands.append(('stop_timer',))
 
-    # Tej funkcji nie blokujemy, bo ona tylko owija metodę display_lock(),
-    # która sama zakłada blokadę.
     def show_results(self):
         """Wyświetl na ekranie kto zwycieżył tę potyczkę.
         """
-        self.display_text("Wygral gracz %d!" % self._winner_id())
+        self.commands.append(('show_results',))
 
-    def _winner_id(self):
-        """Znajdź identyfikator zwycięskiego gracza.
-        """
-        winner_id = -1
-        max_score = -1
+    def refresh(self):
+        """Wykonaj oczekujące polecenia i narysuj następną klatkę.
+        """
+        started = time.time()
+
+        self._apply_commands()
+        self._update_penguins_animations(self.clock())
+        scene = self._scene()
+
+        if self.dirty_rects:
+            rects = self._dirty_rects(scene)
+            for rect in rects:
+                self.screen.set_clip(rect)
+                for key, surface, position, signature in scene:
+                    if rect.colliderect((position, surface.get_size())):
+                        self.screen.blit(surface, position)
+            self.screen.set_clip(None)
+            pygame.display.update(rects)
+            pixels = sum([ rect.width * rect.height for rect in rects ])
+        else:
+            for key, surface, position, signature in scene:
+                self.screen.blit(surface, position)
+            pygame.display.flip()
+            pixels = self.width * self.height
+
+        self.frames        += 1
+        self.pixels_pushed += pixels
+        self.frame_time    += time.time() - started
+
+    def pixels_per_frame(self):
+        """Zwróć średnią liczbę pikseli wysyłanych na ekran w jednej klatce.
+        """
+        if not self.frames:
+            return 0.0
+        return float(self.pixels_pushed) / self.frames
+
+    def mean_frame_time(self):
+        """Zwróć średni czas rysowania klatki w sekundach.
+        """
+        if not self.frames:
+            return 0.0
+        return self.frame_time / self.frames
+
+    def _apply_commands(self):
+        """Wykonaj polecenia oczekujące w kolejce, w kolejności ich wydania.
+        """
+        commands = self.commands
+        while commands:
+            command = commands.popleft()
+            getattr(self, '_do_' + command[0])(*command[1:])
+
+    def _do_set_board(self, board, player_id):
+        self.board = board
+        self.player_id = player_id
+
+        # Utworzenie planszy (będzie niezmienna przez całą grę).
+        self.board_surface = BoardSurface(self.board)
+        self.painted = {}
+
+    def _do_set_fishes(self, fishes):
+        self.fishes_sprites = [ FishSprite(fish) for fish in fishes ]
+
+    def _do_set_penguins(self, penguins):
+        self.penguins_sprites = make_id_dict(penguins, function=PenguinSprite)
+
+    def _do_set_timer(self, game_start_time, game_duration):
+        self.game_start_time = game_start_time
+        self.game_duration   = game_duration
+
+    def _do_display_text(self, text, duration):
+        self.text = text
 
-        for index, penguin in enumerate(self.board.penguins.values()):
-            if penguin.fish_count > max_score:
-                winner_id = index
-                max_score = penguin.fish_count
+        # Nowy tekst nie powinien zniknąć razem z poprzednim.
+        if self.text_timer:
+            self.text_timer.cancel()
+            self.text_timer = None
 
-        # Identyfikatory graczy zaczynają się od 1, nie od 0.
-        return winner_id + 1
+        if duration:
+            self.text_timer = run_after(duration, self._expire_text)
 
-    def _remove_fish_sprite(self, fish):
-        """Usuń z planszy sprite reprezentujący daną rybkę.
+    def _expire_text(self):
+        """Zleć usunięcie tekstu, którego czas wyświetlania właśnie minął.
         """
+        self.commands.append(('clear_text', self.text_timer))
+
+    def _do_clear_text(self, timer):
+        # Tekst mógł zostać zastąpiony zanim wykonaliśmy to polecenie.
+        if timer is None or timer is self.text_timer:
+            self.text = None
+            self.text_timer = None
+
+    def _do_turn_penguin(self, penguin_id, direction):
+        penguin = self.penguins_sprites[penguin_id]
+
+        if not penguin.moving:
+            penguin.turn(direction)
+
+    def _do_move_penguin(self, penguin_id, direction, started):
+        # Na planszy pingwin już się porusza, więc poprzedzające polecenie
+        # przekręcenia mogło zostać pominięte - kierunek ustawia animacja.
+        self.penguins_sprites[penguin_id].animate_move(direction, started)
+
+    def _do_blink_penguin(self, penguin_id, started):
+        self.penguins_sprites[penguin_id].animate_blink(started, duration=2)
+
+    def _do_add_fish(self, fish):
+        self.fishes_sprites.append(FishSprite(fish))
+
+    def _do_remove_fish(self, fish):
         for index, fish_sprite in enumerate(self.fishes_sprites):
             if fish_sprite.fish == fish:
                 self.fishes_sprites.pop(index)
                 return
 
-    def _paint_status_bar(self):
-        """Przerysuj pasek stanu, nanosząc aktualne wyniki graczy.
-        """
-        status_bar = pygame.Surface((self.width, STATUS_BAR_HEIGHT))
-        status_bar.blit(self.status_bar_image, (0,0))
-        self.screen.blit(status_bar, (0,0))
+    def _do_rise_game_duration(self, duration):
+        self.game_duration += duration
+
+    def _do_stop_timer(self):
+        del self.game_duration
 
-        if hasattr(self, 'penguins_sprites'):
-            # XXX Położenia linii wyników dla maksymalnie 6 graczy.
-            scores_positions = [(15,10), (15,45), (15,80), (222,10), (222,45), (222,80)]
+    def _do_show_results(self):
+        self._do_display_text("Wygral gracz %d!" % self._winner_id(), None)
 
-            for penguin, (x,y) in zip(self.board.penguins.values(),
-                                      scores_positions):
-                text = "%s  (%d)" % (penguin.name, penguin.fish_count)
-                self._blit_text(text, x, y, color=penguin.color)
+    def _winner_id(self):
+        """Znajdź numer zwycięskiego gracza.
+        """
+        return self.board.leaderboard.winner().number
 
-    def _paint_text(self):
-        """Wyświetl tekst zawarty w atrybucie self.text na środku ekranu.
+    def _scene(self):
+        """Zwróć listę elementów ekranu w kolejności rysowania: czwórek
+        (klucz, powierzchnia, położenie, sygnatura). Element trzeba
+        przerysować, gdy zmieni się jego położenie lub sygnatura.
         """
-        font = pygame.font.Font(None, 36)
-        text = font.render(self.text, 1, Color("yellow"), Color("black"))
+        scene = [(('status bar',), self.status_bar, (0, 0), None)]
+        if self.penguins_sprites:
+            self._scene_scores(scene)
+        if hasattr(self, 'board_surface'):
+            self._scene_board(scene)
+        if hasattr(self, 'fishes_sprites'):
+            self._scene_fishes(scene)
+        if self.penguins_sprites:
+            self._scene_penguins(scene)
+        if hasattr(self, 'game_duration'):
+            self._scene_timer(scene)
+        if self.text:
+            self._scene_text(scene)
+        return scene
+
+    def _dirty_rects(self, scene):
+        """Zwróć listę prostokątów ekranu do przerysowania: poprzednie
+        i obecne położenia elementów, które zmieniły się od poprzedniej
+        klatki, oraz położenia elementów, które zniknęły.
+        """
+        painted = {}
+        rects = []
+        for key, surface, position, signature in scene:
+            painted[key] = (pygame.Rect(position, surface.get_size()), signature)
+            previous = self.painted.pop(key, None)
+            if previous != painted[key]:
+                if previous is not None:
+                    rects.append(previous[0])
+                rects.append(painted[key][0])
+        rects.extend([ rect for rect, signature in self.painted.values() ])
+        self.painted = painted
+
+        return merge_rects([ rect.clip(self.screen.get_rect()) for rect in rects ])
+
+    def _scene_scores(self, scene):
+        """Dodaj do ekranu wyniki 6 najlepszych graczy.
+        """
+        # Położenia linii wyników dla 6 najlepszych graczy.
+        scores_positions = [(15,10), (15,45), (15,80), (222,10), (222,45), (222,80)]
+
+        for index, (penguin, (x,y)) in \
+                enumerate(zip(self.board.leaderboard.top(len(scores_positions)),
+                              scores_positions)):
+            text = "%s  (%d)" % (penguin.name, penguin.fish_count)
+            surface, position = make_text(text, x, y, color=penguin.color)
+            scene.append((('score', index), surface, position, (text, penguin.color)))
+
+    def _scene_text(self, scene):
+        """Dodaj do ekranu tekst zawarty w atrybucie self.text, na środku
+        ekranu.
+        """
+        text = render_text(self.text, 36, "yellow", "black")
 
         x = (self.width - text.get_width()) / 2
         y = (self.height - text.get_height()) / 2
 
-        self.screen.blit(text, (x, y))
+        scene.append((('text',), text, (x, y), self.text))
 
-    def _paint_board(self):
-        """Wyświetl podłoże planszy.
+    def _scene_board(self, scene):
+        """Dodaj do ekranu podłoże planszy.
         """
-        self.screen.blit(self.board_surface, (0, STATUS_BAR_HEIGHT))
+        penguin = self.board.penguins.get(self.player_id)
+        if penguin is not None:
+            self.board_surface.follow(penguin.x, penguin.y)
+
+        scene.append((('board',), self.board_surface, (0, STATUS_BAR_HEIGHT),
+                      self.board_surface.origin))
 
-    def _paint_fishes(self):
-        """Wyświetl wszystkie rybki.
+    def _scene_fishes(self, scene):
+        """Dodaj do ekranu wszystkie rybki mieszczące się w widoku.
         """
+        offset = self.board_surface.pixel_offset()
         for fish in self.fishes_sprites:
-            fish.paint_on(self.screen)
+            if self.board_surface.is_visible(fish.x, fish.y):
+                scene.append((('fish', id(fish)), fish.image,
+                              fish.screen_position(offset), fish.image))
 
-    def _flip_penguins_animations(self):
-        """Przestaw klatki w animacji wszystkich poruszających się
-        i migających pingwinów.
+    def _update_penguins_animations(self, now):
+        """Ustaw klatki animacji wszystkich pingwinów na chwilę `now`.
         """
-        for penguin in self.penguins_sprites.values():
-            penguin.flip()
+        for penguin in self.penguins_sprites.itervalues():
+            penguin.update(now)
 
-    def _paint_penguins(self):
-        """Wyświetl wszystkie pingwiny.
+    def _scene_penguins(self, scene):
+        """Dodaj do ekranu wszystkie pingwiny mieszczące się w widoku.
         """
+        offset = self.board_surface.pixel_offset()
         for penguin in self.penguins_sprites.values():
-            penguin.paint_on(self.screen)
+            if self.board_surface.is_visible(penguin.penguin.x, penguin.penguin.y):
+                scene.append((('penguin', id(penguin)), penguin.image,
+                              penguin.screen_position(offset), penguin.image))
 
-    def _paint_timer(self):
-        """Wyświetl zegar.
+    def _scene_timer(self, scene):
+        """Dodaj do ekranu zegar.
         """
         elapsed_time      = int(time.time() - self.game_start_time + 0.5)
         remaining_time    = self.game_duration - elapsed_time
@@ -505,16 +692,21 @@ class ClientDisplay(object):
         if remaining_time < 10:
             color = "red"
 
-        self._blit_text(current_time, 540, 470, size=36, color=color)
-
-    def _blit_text(self, *args, **kwds):
-        self.screen.blit(*make_text(*args, **kwds))
+        surface, position = make_text(current_time, 540, 470, size=36, color=color)
+        scene.append((('timer',), surface, position, (current_time, color)))
 
-def refresh_it(display, fps=30):
-    """Rozpocznij odświeżanie podanego ekranu z podaną częstotliwością
-    (domyślnie 30 klatek/sekundę). Jedyna metoda jaką musi obsługiwać
-    obiekt `display` to refresh().
+def merge_rects(rects):
+    """Zwróć listę prostokątów pokrywającą podane, w której nachodzące
+    na siebie prostokąty połączono w jeden. Puste prostokąty są pomijane.
     """
-    run_each(1.0/fps,
-             lambda: display.refresh(),
-             lambda: False)
+    merged = []
+    for rect in rects:
+        if not rect.width or not rect.height:
+            continue
+        # Połączony prostokąt może nachodzić na wcześniej dodane.
+        index = rect.collidelist(merged)
+        while index >= 0:
+            rect = rect.union(merged.pop(index))
+            index = rect.collidelist(merged)
+        merged.append(rect)
+    return merged
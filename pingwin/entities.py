@@ -0,0 +1,131 @@
+# -*- coding: utf-8 -*-
+"""Zwarte przechowywanie obiektów gry (pingwinów i rybek).
+
+Liczbowe atrybuty wszystkich obiektów danego rodzaju trzymane są
+w kolumnach - tablicach array, po jednym elemencie na obiekt - a sam
+obiekt jest tylko widokiem z numerem swojego wiersza (uchwytem):
+
+>>> store = EntityStore(x='i', y='i')
+>>> class Point(Entity):
+...     __slots__ = ()
+...     store = store
+...     x = column(store, 'x')
+...     y = column(store, 'y')
+>>> first, second = Point(), Point()
+>>> second.x = 7
+>>> first.handle, second.handle, second.x, store.columns['x']
+(0, 1, 7, array('i', [0, 7]))
+>>> del first
+>>> third = Point()
+>>> third.handle, len(store)
+(0, 2)
+
+Kopia obiektu (także przez pickle) dostaje własny wiersz:
+
+>>> import copy
+>>> duplicate = copy.copy(second)
+>>> duplicate.handle, duplicate.x
+(2, 7)
+
+Wiersz usuniętego obiektu jest wykorzystywany przez kolejny utworzony
+obiekt, więc kolumny zajmują tyle miejsca, ile było naraz żywych obiektów.
+"""
+
+from array import array
+
+
+class EntityStore(object):
+    """Kolumny atrybutów obiektów jednego rodzaju.
+
+    Argumentami konstruktora są nazwy kolumn i kody typów ich elementów
+    (patrz moduł array).
+
+    Atrybuty obiektu:
+      columns  słownik kolumn według nazw
+      free     lista zwolnionych uchwytów
+    """
+    def __init__(self, **typecodes):
+        self.columns = dict([ (name, array(typecode))
+                              for name, typecode in typecodes.items() ])
+        self.free = []
+
+    def __len__(self):
+        """Zwróć liczbę żywych obiektów.
+        """
+        return self.capacity() - len(self.free)
+
+    def capacity(self):
+        """Zwróć liczbę wierszy kolumn.
+        """
+        for column in self.columns.values():
+            return len(column)
+        return 0
+
+    def allocate(self):
+        """Zwróć uchwyt nowego wiersza, z kolumnami wyzerowanymi.
+        """
+        if self.free:
+            handle = self.free.pop()
+            for column in self.columns.values():
+                column[handle] = 0
+            return handle
+
+        handle = self.capacity()
+        for column in self.columns.values():
+            column.append(0)
+        return handle
+
+    def release(self, handle):
+        """Zwolnij wiersz o podanym uchwycie.
+        """
+        self.free.append(handle)
+
+    def nbytes(self):
+        """Zwróć rozmiar kolumn w bajtach.
+        """
+        return sum([ column.itemsize * len(column) for column in self.columns.values() ])
+
+def column(store, name):
+    """Zwróć atrybut (property) przechowywany w kolumnie magazynu.
+    """
+    values = store.columns[name]
+
+    def get(entity):
+        return values[entity.handle]
+    def set(entity, value):
+        values[entity.handle] = value
+    return property(get, set)
+
+class Entity(object):
+    """Obiekt, którego atrybuty przechowywane są w magazynie `store`
+    klasy, w wierszu o numerze `handle`.
+    """
+    __slots__ = ('handle',)
+    store = None
+
+    def __init__(self):
+        self.handle = self.store.allocate()
+
+    def __getstate__(self):
+        """Zwróć słownik wartości kolumn i publicznych slotów obiektu, do
+        kopiowania i serializacji przez pickle. Kolumny muszą mieć nazwy
+        atrybutów, w których są udostępniane.
+        """
+        state = dict([ (name, values[self.handle])
+                       for name, values in self.store.columns.items() ])
+        for cls in type(self).__mro__:
+            for name in getattr(cls, '__slots__', ()):
+                if name != 'handle' and not name.startswith('_'):
+                    state[name] = getattr(self, name)
+        return state
+
+    def __setstate__(self, state):
+        self.handle = self.store.allocate()
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def __del__(self):
+        # Konstruktor mógł nie dojść do przydzielenia wiersza.
+        handle = getattr(self, 'handle', None)
+        if handle is not None:
+            self.store.release(handle)
@@ -1,7 +1,20 @@
 import random
 
-class Fish(object):
+from entities import column, Entity, EntityStore
+
+# Atrybuty wszystkich rybek procesu (patrz entities.EntityStore).
+FISHES = EntityStore(type='B', x='i', y='i')
+
+class Fish(Entity):
+    __slots__ = ()
+    store = FISHES
+
+    type = column(FISHES, 'type')
+    x    = column(FISHES, 'x')
+    y    = column(FISHES, 'y')
+
     def __init__(self, type, x, y):
+        Entity.__init__(self)
         self.type = type
         self.x = x
         self.y = y
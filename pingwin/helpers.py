@@ -2,12 +2,14 @@
 
 import md5
 import os
+import sys
 import time
 
-from twisted.internet import threads
+from collections import OrderedDict
 
-import pygame
-from pygame.color import Color
+# Moduły pygame i scheduler (a wraz z nim Twisted) importujemy dopiero
+# w korzystających z nich funkcjach, żeby pozostałe funkcje, a więc
+# i plansza oraz silnik rozgrywki, działały bez nich.
 
 DATA_DIR = 'data'
 
@@ -23,34 +25,121 @@ def make_id_dict(iterable, key='id', function=lambda x:x):
         result[getattr(element, key)] = function(element)
     return result
 
+class LRUCache(object):
+    """Słownik o ograniczonej liczbie elementów: po przekroczeniu rozmiaru
+    `size` usuwany jest element najdawniej użyty. Atrybuty `hits`
+    i `misses` zliczają udane i nieudane wyszukiwania.
+
+    >>> cache = LRUCache(2)
+    >>> cache.put('a', 1); cache.put('b', 2)
+    >>> cache.get('a'), cache.get('c')
+    (1, None)
+    >>> cache.put('c', 3)
+    >>> cache.get('b'), cache.get('a'), len(cache)
+    (None, 1, 2)
+    >>> cache.hits, cache.misses
+    (2, 2)
+    """
+    def __init__(self, size):
+        self.size     = size
+        self.elements = OrderedDict()
+
+        self.hits   = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self.elements)
+
+    def get(self, key):
+        """Zwróć element o podanym kluczu lub None, jeżeli go nie ma.
+        """
+        value = self.elements.pop(key, None)
+        if value is None:
+            self.misses += 1
+            return None
+
+        self.hits += 1
+        self.elements[key] = value
+        return value
+
+    def put(self, key, value):
+        """Zapamiętaj element, usuwając najdawniej użyty, jeżeli brakuje
+        miejsca.
+        """
+        self.elements.pop(key, None)
+        self.elements[key] = value
+        if len(self.elements) > self.size:
+            self.elements.popitem(last=False)
+
+def _monotonic_clock():
+    """Zwróć funkcję podającą czas w sekundach wg zegara monotonicznego
+    systemu (clock_gettime(CLOCK_MONOTONIC)), który w przeciwieństwie do
+    time.time() nie cofa się ani nie skacze przy zmianie czasu systemowego.
+    Jeżeli zegar jest niedostępny, zwróć time.time.
+    """
+    if not sys.platform.startswith('linux'):
+        return time.time
+
+    import ctypes
+    import ctypes.util
+
+    class timespec(ctypes.Structure):
+        _fields_ = [('tv_sec', ctypes.c_long), ('tv_nsec', ctypes.c_long)]
+
+    CLOCK_MONOTONIC = 1
+
+    try:
+        library = ctypes.CDLL(ctypes.util.find_library('rt') or 'libc.so.6')
+        clock_gettime = library.clock_gettime
+    except (OSError, AttributeError):
+        return time.time
+
+    now = timespec()
+    def monotonic():
+        if clock_gettime(CLOCK_MONOTONIC, ctypes.byref(now)):
+            return time.time()
+        return now.tv_sec + now.tv_nsec * 1e-9
+    return monotonic
+
+monotonic = _monotonic_clock()
+
 def run_after(duration, function):
     """Uruchom podaną funkcję po upłynięciu zadanego czasu w sekundach.
 
+    Zwraca obiekt z metodą cancel(), pozwalającą anulować wywołanie.
+
     Uwaga: funkcja *NIE JEST* otaczana blokadą, należy ją założyć
     samodzielnie w wywoływanej funkcji.
     """
-    defered = threads.deferToThread(lambda: time.sleep(duration))
-    defered.addCallback(lambda x: function())
+    from scheduler import scheduler
+    return scheduler.call_later(duration, function)
 
 def run_each(duration, function, stop_condition):
     """Uruchamiaj podaną funkcję co podany przedział czasu.
 
-    Gdy funkcja stop_condition() zwróci True pętla jest przerywana.
+    Gdy funkcja stop_condition() zwróci True pętla jest przerywana. Pętlę
+    można też przerwać wywołując metodę cancel() zwróconego obiektu.
     """
-    def call_function_and_defer():
-        function()
-        if not stop_condition():
-            run_each(duration, function, stop_condition)
-
-    run_after(duration, call_function_and_defer)
+    from scheduler import scheduler
+    return scheduler.call_every(duration, function, stop_condition)
 
 #####
 # Funkcje graficzne.
 #
 def load_image(name):
-    fullname = os.path.join(DATA_DIR, name)
-
-    image = pygame.image.load(fullname)
+    """Wczytaj obrazek o podanej nazwie pliku - z paczki obrazków, jeżeli
+    jest (patrz bundle.py), albo z pojedynczego pliku.
+    """
+    import pygame
+    from pygame.color import Color
+    from bundle import open_bundle
+
+    image = None
+    bundle = open_bundle()
+    if bundle is not None:
+        image = bundle.image(name)
+    if image is None:
+        image = pygame.image.load(os.path.join(DATA_DIR, name))
     image = image.convert_alpha()
 
     image.set_colorkey(Color("white"))
@@ -60,15 +149,45 @@ def load_image(name):
 def level_path(name):
     return os.path.join(DATA_DIR, 'level', name)
 
+def compiled_level_path(name):
+    return os.path.join(DATA_DIR, 'level', 'compiled', name)
+
+def bundle_path():
+    return os.path.join(DATA_DIR, 'images.bundle')
+
+# Czcionki według rozmiaru i wyrenderowane napisy według tekstu, rozmiaru
+# i kolorów (patrz render_text()).
+fonts      = {}
+text_cache = LRUCache(256)
+
+def get_font(size):
+    """Zwróć domyślną czcionkę w podanym rozmiarze.
+    """
+    font = fonts.get(size)
+    if font is None:
+        import pygame
+        font = fonts[size] = pygame.font.Font(None, size)
+    return font
+
+def render_text(text, size=30, color="white", background=None):
+    """Zwróć powierzchnię z napisem. Napisy zapamiętywane są w text_cache,
+    więc zwróconej powierzchni nie wolno zmieniać.
+    """
+    key = (text, size, color, background)
+    text_object = text_cache.get(key)
+    if text_object is None:
+        from pygame.color import Color
+
+        font = get_font(size)
+        if background:
+            text_object = font.render(text, 1, Color(color), Color(background))
+        else:
+            text_object = font.render(text, 1, Color(color))
+        text_cache.put(key, text_object)
+    return text_object
+
 def make_text(text, x, y, size=30, color="white", background=None):
-    font = pygame.font.Font(None, size)
-    if background:
-        text_object = font.render(text, 1, Color(color), Color(background))
-    else:
-        text_object = font.render(text, 1, Color(color))
-    text_position = (x, y)
-
-    return text_object, text_position
+    return render_text(text, size, color, background), (x, y)
 
 def add_name_to_penguin(name, surface, color):
     """Dodaj identyfikator gracza w lewy dolny róg obrazka.
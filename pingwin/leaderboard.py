@@ -0,0 +1,101 @@
+# -*- coding: utf-8 -*-
+
+from bisect import bisect_left, insort
+from collections import OrderedDict
+from itertools import islice
+
+
+class Leaderboard(object):
+    """Ranking graczy według liczby zebranych rybek.
+
+    Pingwiny zgrupowane są w kubełkach według wyniku, a posortowana lista
+    `scores` zawiera wszystkie różne wyniki. Pingwin zawiadamia ranking
+    o każdej zmianie swojego wyniku (patrz Penguin.set_fish_count()), więc
+    najlepszy wynik, remis i zwycięzca znane są w czasie stałym, a pierwsze
+    k miejsc w czasie O(k).
+
+    Przy równych wynikach wyżej jest gracz, który osiągnął wynik wcześniej.
+
+    >>> from penguin import Penguin
+    >>> leaderboard = Leaderboard()
+    >>> first, second, third = [ Penguin(id, 0, 0) for id in 'abc' ]
+    >>> for penguin in [first, second, third]:
+    ...     leaderboard.add(penguin)
+    >>> leaderboard.best_score(), leaderboard.is_tie()
+    (0, True)
+    >>> second.eat_fish(), third.eat_fish(), second.eat_fish()
+    (1, 1, 2)
+    >>> leaderboard.winner().id, leaderboard.is_tie()
+    ('b', False)
+    >>> [ penguin.id for penguin in leaderboard.top(2) ]
+    ['b', 'c']
+    >>> second.drop_into_water()
+    0
+    >>> [ penguin.id for penguin in leaderboard.top(3) ]
+    ['c', 'a', 'b']
+    """
+    def __init__(self):
+        self.buckets = {}
+        self.scores  = []
+
+    def add(self, penguin):
+        """Dodaj pingwina do rankingu i zawiadamiaj go o zmianach wyniku.
+        """
+        penguin.leaderboard = self
+        self._insert(penguin, penguin.fish_count)
+
+    def remove(self, penguin):
+        """Usuń pingwina z rankingu.
+        """
+        self._delete(penguin, penguin.fish_count)
+        penguin.leaderboard = None
+
+    def update(self, penguin, old_score):
+        """Przenieś pingwina, którego wynik zmienił się z `old_score`.
+        """
+        if penguin.fish_count != old_score:
+            self._delete(penguin, old_score)
+            self._insert(penguin, penguin.fish_count)
+
+    def best_score(self):
+        """Zwróć najlepszy wynik lub -1, jeżeli ranking jest pusty.
+        """
+        if not self.scores:
+            return -1
+        return self.scores[-1]
+
+    def is_tie(self):
+        """Zwróć True, jeżeli najlepszy wynik ma więcej niż jeden gracz.
+        """
+        return bool(self.scores) and len(self.buckets[self.scores[-1]]) > 1
+
+    def winner(self):
+        """Zwróć pingwina z najlepszym wynikiem lub None dla pustego rankingu.
+        """
+        if not self.scores:
+            return None
+        return next(self.buckets[self.scores[-1]].itervalues())
+
+    def top(self, number):
+        """Zwróć listę co najwyżej `number` pingwinów z najlepszymi wynikami.
+        """
+        return list(islice(self._ranked(), number))
+
+    def _ranked(self):
+        for score in reversed(self.scores):
+            for penguin in self.buckets[score].itervalues():
+                yield penguin
+
+    def _insert(self, penguin, score):
+        bucket = self.buckets.get(score)
+        if bucket is None:
+            bucket = self.buckets[score] = OrderedDict()
+            insort(self.scores, score)
+        bucket[penguin.id] = penguin
+
+    def _delete(self, penguin, score):
+        bucket = self.buckets[score]
+        del bucket[penguin.id]
+        if not bucket:
+            del self.buckets[score]
+            del self.scores[bisect_left(self.scores, score)]
@@ -0,0 +1,313 @@
+# -*- coding: utf-8 -*-
+"""Wczytywanie poziomów z plików w katalogu data/level.
+
+Plik poziomu to prostokąt znaków: każdy wiersz pliku opisuje jeden rząd
+pól planszy i wszystkie wiersze mają tę samą długość. Wymiary planszy
+wynikają z pliku - szerokość to długość wiersza, wysokość to liczba
+wierszy. Opis dozwolonych znaków znajduje się w board.Board.
+
+Plik tekstowy poziomu jest jednorazowo kompilowany (patrz compile_level())
+do postaci binarnej, zapisywanej w katalogu data/level/compiled. Postać
+skompilowana zawiera gotowe siatki, po jednym bajcie na pole:
+  * znaki pól poziomu (bez znaków nowej linii),
+  * znaczniki terenu (WALL, WATER lub 0),
+tablica długości ruchów z każdego pola w każdym kierunku (patrz MOVES)
+oraz tablice indeksów pól bez ściany i wody, na których ServerBoard opiera
+swój indeks niezajętych pól (patrz board.FreeTiles).
+
+Skompilowany plik odwzorowywany jest w pamięci przez mmap, a wczytane
+poziomy trzymane w pamięci podręcznej procesu (patrz load_level()), więc
+wszystkie rozgrywki na tej samej mapie współdzielą jedną jej kopię.
+"""
+
+from __future__ import with_statement
+
+import mmap
+import os
+import struct
+import sys
+
+from array import array
+from itertools import compress, imap
+from operator import not_
+
+from helpers import level_path, compiled_level_path
+
+
+# Znaki oznaczające ściany i wodę.
+WALL_TILES  = r'?|.[=]#'
+WATER_TILES = r'~'
+
+# Znaczniki terenu przechowywane w siatce Level.terrain.
+WALL  = 1
+WATER = 2
+
+# Dla każdego kierunku ruchu: numer kolumny w tablicy Level.moves (w kolejności
+# messages.DIRECTIONS) oraz przesunięcie o jedno pole w poziomie i w pionie.
+MOVES = {'Up':    (0,  0, -1),
+         'Down':  (1,  0,  1),
+         'Right': (2,  1,  0),
+         'Left':  (3, -1,  0)}
+
+# Liczba rzędów planszy wczytywanych za jednym razem.
+CHUNK_ROWS = 64
+
+# Nagłówek skompilowanego poziomu: znacznik formatu, kolejność bajtów
+# tablic indeksów, szerokość i wysokość planszy oraz czas modyfikacji
+# i rozmiar pliku źródłowego.
+COMPILED_MAGIC  = 'PWL3'
+COMPILED_HEADER = '!4s1sIIdQ'
+
+# Element tablic indeksów pól, w kolejności bajtów maszyny.
+INDEX = struct.Struct('i')
+
+def _translation(function):
+    """Zwróć tablicę dla str.translate() zamieniającą każdy znak poziomu
+    na bajt o wartości function(znak).
+    """
+    return ''.join([ chr(function(chr(code))) for code in range(256) ])
+
+TERRAIN_TABLE = _translation(lambda tile: tile in WALL_TILES and WALL or
+                                          tile in WATER_TILES and WATER or 0)
+
+
+class Level(object):
+    """Skompilowany poziom.
+
+    Obiekty tej klasy są niezmienne i współdzielone przez wszystkie plansze
+    procesu - należy je tworzyć przez load_level().
+
+    Atrybuty obiektu:
+      name        nazwa poziomu
+      x_count     szerokość planszy w polach
+      y_count     wysokość planszy w polach
+      terrain     siatka znaczników terenu (patrz Grid)
+      moves       tablica długości ruchów - bufor tylko do odczytu, którego
+                  bajt pod indeksem 4 * numer pola + kolumna kierunku
+                  (patrz MOVES) to liczba pól, o jaką przesuwa się pingwin,
+                  lub 0 jeżeli ruch jest niemożliwy
+      open_count  liczba pól bez ściany i wody (patrz open_tile())
+      source      czas modyfikacji i rozmiar pliku źródłowego, z którego
+                  poziom skompilowano
+    """
+    def __init__(self, name, data):
+        (magic, byteorder, self.x_count, self.y_count, mtime, size) = \
+            struct.unpack_from(COMPILED_HEADER, data)
+        if magic != COMPILED_MAGIC or byteorder != sys.byteorder[0]:
+            raise ValueError("%s is not a compiled level for this machine." % name)
+
+        self.name   = name
+        self.data   = data
+        self.source = (mtime, size)
+
+        length = self.x_count * self.y_count
+        chunk_size = self.x_count * CHUNK_ROWS
+        index_size = length * INDEX.size
+
+        self.tiles_offset     = struct.calcsize(COMPILED_HEADER)
+        self.terrain          = Grid(data, self.tiles_offset + length, length, chunk_size)
+        self.moves            = buffer(data, self.tiles_offset + 2 * length, 4 * length)
+        self.positions_offset = self.tiles_offset + 6 * length
+        self.open_offset      = self.positions_offset + index_size
+
+        if len(data) < self.open_offset:
+            raise ValueError("Compiled level %s is truncated." % name)
+        self.open_count = (len(data) - self.open_offset) // INDEX.size
+
+    def is_current(self, source_stat):
+        """Zwróć wartość prawda, jeżeli poziom skompilowano z pliku
+        źródłowego w jego obecnej postaci (patrz os.stat()).
+        """
+        return self.source == (source_stat.st_mtime, source_stat.st_size)
+
+    def row(self, y, start=0, end=None):
+        """Zwróć znaki pól rzędu `y`, od kolumny `start` do `end`.
+        """
+        if end is None:
+            end = self.x_count
+        offset = self.tiles_offset + y * self.x_count
+        return self.data[offset + start:offset + end]
+
+    def tile(self, x, y):
+        """Zwróć znak pola o podanych współrzędnych.
+        """
+        return self.data[self.tiles_offset + y * self.x_count + x]
+
+    def open_tile(self, position):
+        """Zwróć indeks pola zapisanego pod podaną pozycją tablicy pól bez
+        ściany i wody (0 <= position < open_count).
+        """
+        return INDEX.unpack_from(self.data, self.open_offset + INDEX.size * position)[0]
+
+    def open_position(self, index):
+        """Zwróć pozycję pola o podanym indeksie w tablicy pól bez ściany
+        i wody (patrz open_tile()) lub -1 dla pola ze ścianą lub wodą.
+        """
+        return INDEX.unpack_from(self.data, self.positions_offset + INDEX.size * index)[0]
+
+class Grid(object):
+    """Siatka poziomu, po jednym bajcie na pole, indeksowana numerem pola
+    y * x_count + x.
+
+    Siatka dzielona jest na fragmenty po CHUNK_ROWS rzędów, wczytywane
+    do pamięci przy pierwszym odwołaniu do któregoś z ich pól.
+    """
+    def __init__(self, data, offset, length, chunk_size):
+        self.data       = data
+        self.offset     = offset
+        self.length     = length
+        self.chunk_size = chunk_size
+
+        self.chunks = [None] * ((length + chunk_size - 1) // chunk_size)
+
+    def __len__(self):
+        return self.length
+
+    def __getitem__(self, index):
+        number, offset = divmod(index, self.chunk_size)
+        chunk = self.chunks[number]
+        if chunk is None:
+            chunk = self.chunk(number)
+        return chunk[offset]
+
+    def chunk(self, number):
+        """Zwróć fragment siatki o podanym numerze jako bytearray,
+        wczytując go jeżeli to konieczne.
+        """
+        chunk = self.chunks[number]
+        if chunk is None:
+            start = self.offset + number * self.chunk_size
+            end   = self.offset + min((number + 1) * self.chunk_size, self.length)
+            chunk = bytearray(self.data[start:end])
+            self.chunks[number] = chunk
+        return chunk
+
+    def loaded_chunks(self):
+        """Zwróć liczbę wczytanych dotąd fragmentów siatki.
+        """
+        return len(self.chunks) - self.chunks.count(None)
+
+#####
+# Kompilacja poziomów.
+#
+def compile_level(name):
+    """Skompiluj poziom o podanej nazwie i zwróć jego postać binarną.
+    """
+    path = level_path(name)
+    source_stat = os.stat(path)
+    with open(path, 'rb') as fd:
+        text = fd.read()
+
+    rows = text.split('\n')
+    # Ostatni wiersz pliku może nie kończyć się znakiem nowej linii.
+    if rows[-1] == '':
+        rows.pop()
+    width  = rows and len(rows[0])
+    height = len(rows)
+    if not width or [ row for row in rows if len(row) != width ]:
+        raise ValueError("Level %s is not a rectangle of tiles." % name)
+
+    tiles   = ''.join(rows)
+    terrain = tiles.translate(TERRAIN_TABLE)
+
+    open_tiles = array('i', compress(xrange(len(terrain)),
+                                     imap(not_, bytearray(terrain))))
+    open_positions = array('i', [-1]) * len(terrain)
+    for position, index in enumerate(open_tiles):
+        open_positions[index] = position
+
+    steps = _possible_steps(terrain, width, height)
+
+    header = struct.pack(COMPILED_HEADER, COMPILED_MAGIC, sys.byteorder[0],
+                         width, height, source_stat.st_mtime, source_stat.st_size)
+    return ''.join([header, tiles, terrain, _move_distances(steps),
+                    open_positions.tostring(), open_tiles.tostring()])
+
+def _possible_steps(terrain, width, height):
+    """Zwróć słownik, który każdemu kierunkowi przypisuje siatkę z bajtem 1
+    dla pól, z których można zrobić w tym kierunku krok, i 0 dla pozostałych.
+
+    Krok jest możliwy, jeżeli pole docelowe leży na planszy i nie jest
+    ścianą. Dla każdego kierunku przesuwamy siatkę pól dostępnych o jedno
+    pole, zerując pola spoza planszy.
+    """
+    passable = terrain.translate(_translation(lambda flag: ord(flag) != WALL))
+    rows = [ passable[y * width:(y + 1) * width] for y in xrange(height) ]
+
+    return {
+        'Up':    '\0' * width + passable[:-width],
+        'Down':  passable[width:] + '\0' * width,
+        'Left':  ''.join([ '\0' + row[:-1] for row in rows ]),
+        'Right': ''.join([ row[1:] + '\0' for row in rows ])}
+
+def _move_distances(steps):
+    """Zwróć tablicę długości ruchów (patrz Level.moves) dla podanych siatek
+    możliwych kroków (patrz _possible_steps()).
+
+    Na razie każdy możliwy ruch to krok o jedno pole; ślizganie się po lodzie
+    o kilka pól wymaga jedynie innych długości w tej tablicy.
+    """
+    moves = bytearray(4 * len(steps['Up']))
+    for direction, grid in steps.items():
+        moves[MOVES[direction][0]::4] = grid
+    return str(moves)
+
+#####
+# Pamięć podręczna poziomów.
+#
+# Poziomy wczytane przez ten proces, według nazwy.
+_levels = {}
+
+def load_level(name):
+    """Zwróć poziom o podanej nazwie, kompilując go jeżeli to konieczne.
+
+    Wczytane poziomy zapamiętywane są w pamięci podręcznej procesu
+    i zwracane ponownie, dopóki plik źródłowy poziomu nie zmieni czasu
+    modyfikacji ani rozmiaru. Skompilowany poziom zapisywany jest na dysku;
+    jeżeli to niemożliwe, trzymany jest jedynie w pamięci.
+    """
+    source_stat = os.stat(level_path(name))
+
+    level = _levels.get(name)
+    if level is not None and level.is_current(source_stat):
+        return level
+
+    level = _open_compiled(name)
+    if level is None or not level.is_current(source_stat):
+        data = compile_level(name)
+        if _write_compiled(name, data):
+            level = _open_compiled(name)
+        else:
+            level = Level(name, data)
+
+    _levels[name] = level
+    return level
+
+def _open_compiled(name):
+    """Odwzoruj w pamięci skompilowany poziom zapisany na dysku. Zwróć None,
+    jeżeli go nie ma albo zapisano go w innym formacie.
+    """
+    try:
+        with open(compiled_level_path(name), 'rb') as fd:
+            return Level(name, mmap.mmap(fd.fileno(), 0, access=mmap.ACCESS_READ))
+    except (EnvironmentError, ValueError, struct.error):
+        return None
+
+def _write_compiled(name, data):
+    """Zapisz skompilowany poziom na dysku. Zwróć True, jeżeli się udało.
+
+    Plik zapisywany jest pod tymczasową nazwą i przemianowywany, by inne
+    procesy nigdy nie odwzorowały pliku zapisanego do połowy.
+    """
+    path = compiled_level_path(name)
+    temporary_path = '%s.%d' % (path, os.getpid())
+    try:
+        if not os.path.isdir(os.path.dirname(path)):
+            os.makedirs(os.path.dirname(path))
+        with open(temporary_path, 'wb') as fd:
+            fd.write(data)
+        os.rename(temporary_path, path)
+    except EnvironmentError, e:
+        print "Can't save compiled level %s: %s" % (name, e)
+        return False
+    return True
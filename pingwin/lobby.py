@@ -0,0 +1,191 @@
+# -*- coding: utf-8 -*-
+
+import errno
+import os
+import sys
+
+from twisted.internet.protocol import Factory
+from twisted.internet.protocol import Protocol
+from twisted.internet.protocol import ProcessProtocol
+from twisted.internet import reactor
+
+from helpers import run_each
+
+from messages import *
+from messages import frame
+
+# Skrypt uruchamiany jako proces roboczy.
+SERVER_SCRIPT = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server.py')
+
+# Deskryptor, przez który proces roboczy wysyła raporty do lobby.
+REPORT_FD = 3
+
+# Co ile sekund procesy robocze wysyłają raporty.
+REPORT_INTERVAL = 1.0
+
+
+class Lobby(Protocol):
+    """Połączenie lobby z nowym klientem.
+
+    Lobby nie prowadzi rozgrywek: wybiera proces roboczy (patrz WorkerPool),
+    odsyła klientowi jego port w komunikacie RedirectMessage i zamyka
+    połączenie.
+    """
+    def connectionMade(self):
+        worker = self.factory.workers.assign()
+        if worker is None:
+            print "No worker available, client rejected."
+            self.transport.loseConnection()
+            return
+
+        print "Client from %s redirected to worker on port %d." % \
+            (self.transport.getPeer().host, worker.port)
+        send(self.transport, RedirectMessage(worker.port))
+        self.transport.loseConnection()
+
+class Worker(ProcessProtocol):
+    """Proces roboczy serwera widziany od strony lobby.
+
+    Atrybuty:
+      port        port, na którym proces przyjmuje połączenia klientów
+      status      ostatni raport procesu (WorkerStatusMessage) lub None
+      redirected  liczba klientów skierowanych do procesu od ostatniego
+                  raportu
+    """
+    def __init__(self, pool, port):
+        self.pool = pool
+        self.port = port
+
+        self.status     = None
+        self.redirected = 0
+        self.decoder    = MessageDecoder()
+
+    def load(self):
+        """Zwróć obciążenie procesu jako krotkę, którą można porównywać:
+        liczba graczy, a przy równej liczbie opóźnienie pętli zdarzeń i czas
+        kroku symulacji.
+        """
+        if self.status is None:
+            return (self.redirected, 0)
+        return (self.status.players + self.redirected,
+                self.status.loop_lag + self.status.tick_time)
+
+    def waiting(self):
+        """Zwróć liczbę graczy czekających na rozpoczęcie rozgrywki.
+
+        Jeżeli od ostatniego raportu skierowaliśmy do procesu kolejnych
+        klientów, raport jest nieaktualny i zwracamy 0.
+        """
+        if self.status is None or self.redirected:
+            return 0
+        return self.status.waiting
+
+    def childDataReceived(self, fd, data):
+        if fd != REPORT_FD:
+            return
+
+        for message in self.decoder.feed(data):
+            if isinstance(message, WorkerStatusMessage):
+                self.status     = message
+                self.redirected = 0
+
+    def processEnded(self, reason):
+        print "Worker on port %d exited." % self.port
+        self.pool.remove(self)
+
+class WorkerPool(object):
+    """Zbiór procesów roboczych serwera, uruchamianych przez lobby.
+
+    Klienci kierowani są do procesów grupami po `number_of_players`, tak by
+    gracze jednej rozgrywki trafili do tego samego procesu. Każda grupa
+    trafia do procesu, w którym czeka niepełna rozgrywka, a jeżeli takiego
+    nie ma - do najmniej obciążonego procesu (patrz Worker.load()).
+    """
+    def __init__(self, number_of_players):
+        self.number_of_players = number_of_players
+        self.workers = []
+
+        # Proces przyjmujący obecną grupę klientów i liczba brakujących
+        # w niej graczy.
+        self.group_worker    = None
+        self.group_remaining = 0
+
+    def spawn(self, port, arguments):
+        """Uruchom proces roboczy nasłuchujący na podanym porcie.
+
+        `arguments` to argumenty linii poleceń serwera przekazywane
+        procesowi roboczemu.
+        """
+        worker = Worker(self, port)
+        command = [sys.executable, SERVER_SCRIPT, '--worker-port=%d' % port] + arguments
+        reactor.spawnProcess(worker, sys.executable, command, env=None,
+                             childFDs={0: 'w', 1: 1, 2: 2, REPORT_FD: 'r'})
+        self.workers.append(worker)
+
+    def remove(self, worker):
+        self.workers.remove(worker)
+        if self.group_worker is worker:
+            self.group_worker    = None
+            self.group_remaining = 0
+
+    def assign(self):
+        """Wybierz proces roboczy dla nowego klienta.
+        """
+        if not self.workers:
+            return None
+
+        if not self.group_remaining:
+            waiting = [ worker for worker in self.workers if worker.waiting() ]
+            self.group_worker    = min(waiting or self.workers, key=Worker.load)
+            self.group_remaining = self.number_of_players - self.group_worker.waiting()
+
+        self.group_remaining -= 1
+        self.group_worker.redirected += 1
+        return self.group_worker
+
+def start_reporting(matches, fd=REPORT_FD):
+    """Zacznij okresowo wysyłać raport o obciążeniu procesu roboczego
+    do lobby przez podany deskryptor. Gdy lobby przestanie odbierać raporty,
+    proces roboczy kończy działanie.
+
+    `matches` to zarządca rozgrywek procesu (patrz match.MatchManager).
+    """
+    # Opóźnienie pętli zdarzeń mierzymy jako spóźnienie wywołań raportu.
+    next_report = [reactor.seconds() + REPORT_INTERVAL]
+
+    def report():
+        now = reactor.seconds()
+        loop_lag = max(0, now - next_report[0])
+        next_report[0] = now + REPORT_INTERVAL
+
+        status = WorkerStatusMessage(len(matches.matches),
+                                     matches.players,
+                                     matches.waiting(),
+                                     int(matches.mean_tick_time() * 1000000),
+                                     int(loop_lag * 1000000))
+        try:
+            os.write(fd, frame(status))
+        except OSError, e:
+            if e.errno != errno.EPIPE:
+                raise
+            print "Lobby is gone, stopping the worker."
+            reactor.stop()
+
+    return run_each(REPORT_INTERVAL, report, lambda: False)
+
+def run(number_of_workers, base_port, worker_arguments, number_of_players):
+    """Uruchom lobby nasłuchujące na porcie `base_port` wraz z podaną
+    liczbą procesów roboczych, nasłuchujących na kolejnych portach.
+    """
+    workers = WorkerPool(number_of_players)
+    for index in range(number_of_workers):
+        workers.spawn(base_port + index + 1, worker_arguments)
+
+    factory = Factory()
+    factory.protocol = Lobby
+    factory.workers  = workers
+
+    reactor.listenTCP(base_port, factory)
+
+    print "Lobby started with %d workers. Waiting for connections..." % number_of_workers
+    reactor.run()
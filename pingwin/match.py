@@ -0,0 +1,404 @@
+# -*- coding: utf-8 -*-
+
+import time
+
+from collections import deque
+from itertools import count
+
+from concurrency import locked, create_lock
+from helpers import run_after, run_each
+from simulation import Simulation
+
+from messages import *
+
+# Blokada dla wszystkich funkcji serwera.
+server_lock = create_lock()
+
+
+class Match(object):
+    """Pojedyncza rozgrywka wraz z jej graczami i zaplanowanymi wywołaniami.
+    Stan każdej rozgrywki jest niezależny od pozostałych.
+
+    Reguły gry i stan planszy należą do silnika rozgrywki (patrz
+    simulation.Simulation); Match przekazuje mu ruchy graczy, odmierza
+    jego kroki zegarem reaktora i rozsyła zwrócone zdarzenia klientom.
+
+    Atrybuty konfiguracyjne:
+      level_name         Nazwa poziomu, na którym będzie odbywać się gra.
+      number_of_players  Liczba graczy, która musi się połączyć, by gra mogła
+                         się rozpocząć.
+      number_of_fishes   Liczba rybek jaka zostanie początkowo umieszczona
+                         na planszy. Jest to jednocześnie maksymalna liczba
+                         rybek, jaka może znaleźć się na planszy.
+      new_fish_delay     Liczba sekund jaka musi upłynąć zanim zostaną dodane
+                         nowe rybki.
+      game_duration      Limit czasu gry w sekundach. Uwaga: rozgrywka może
+                         trwać więcej niż podany tutaj czas, patrz metoda
+                         end().
+      tick_rate          Liczba kroków symulacji na sekundę lub None.
+
+    Domyślnie ruchy graczy wykonywane są natychmiast po ich otrzymaniu,
+    a czas gry odmierzany jest w `step_rate` krokach na sekundę. Kroki są
+    wtedy jedynie jednostką czasu: rozgrywka budzi się (patrz tick()) tylko
+    wtedy, gdy silnik rozgrywki ma coś do zrobienia (patrz
+    Simulation.next_event_step()), a przed wykonaniem ruchu przesuwa jego
+    czas do chwili otrzymania ruchu, więc blokada ruchu trwa od
+    `move_cooldown` sekund od ruchu do jednego kroku dłużej. Jeżeli
+    podano `tick_rate`, rozgrywka działa w trybie krokowym: ruchy
+    wszystkich graczy są kolejkowane i wykonywane razem raz na krok (patrz
+    metoda tick()) - gracz po graczu, w kolejności numerów, a ruchy
+    jednego gracza w kolejności otrzymania - a wszystkie komunikaty
+    powstałe w danym kroku wysyłane są jednym zapisem do każdego klienta.
+    W jednym kroku pingwin gracza wykonuje co najwyżej jedno przesunięcie;
+    kolejne, tak jak przesunięcia wstrzymane przez blokadę ruchu, czekają
+    w kolejce gracza na następne kroki. Kolejka mieści `max_queued_inputs`
+    komunikatów, nadmiarowe są odrzucane.
+    """
+    # Czas w sekundach, przez jaki pingwin nie może wykonać kolejnego ruchu
+    # (zapezpiecza przed botami).
+    move_cooldown = 0.1
+
+    # Największa liczba komunikatów gracza czekających w trybie krokowym.
+    max_queued_inputs = 8
+
+    # Liczba kroków na sekundę, gdy ruchy wykonywane są natychmiast.
+    step_rate = 1000
+
+    def __init__(self, number, level_name, number_of_players, number_of_fishes,
+                 new_fish_delay, game_duration, tick_rate=None):
+        self.number = number
+
+        self.level_name        = level_name
+        self.number_of_players = number_of_players
+        self.number_of_fishes  = number_of_fishes
+        self.new_fish_delay    = new_fish_delay
+        self.game_duration     = game_duration
+        self.tick_rate         = tick_rate
+
+        # Słownik klientów przydzielonych do rozgrywki, indeksowany numerami
+        # graczy, nadawanymi kolejnym klientom od 1.
+        self.connected_clients = {}
+        self.player_numbers    = count(1)
+        # Flaga określająca, czy gra zawiera już wystarczającą liczbę graczy.
+        self.game_started = False
+        # Flaga określająca, czy gra już się zakończyła.
+        self.finished = False
+        # Silnik rozgrywki i jego plansza (obiekt typu ServerBoard).
+        self.simulation = None
+        self.board      = None
+        # Zaplanowane wykonywanie kroków, a gdy ruchy wykonywane są
+        # natychmiast - zaplanowane wybudzenie, numer kroku, na który je
+        # zaplanowano, i chwila rozpoczęcia gry (wg time.time()).
+        self.tick_timer   = None
+        self.wake_up_step = None
+        self.start_time   = None
+
+        # Kolejki ruchów czekających na wykonanie w trybie krokowym,
+        # indeksowane numerem gracza.
+        self.inputs = {}
+
+        # Statystyki czasu trwania kroków.
+        self.ticks          = 0
+        self.tick_time      = 0.0
+        self.max_tick_time  = 0.0
+
+    def is_filling(self):
+        """Zwróć True, jeżeli rozgrywka wciąż czeka na graczy.
+        """
+        return not self.game_started and not self.finished \
+            and len(self.connected_clients) < self.number_of_players
+
+    def add_client(self, transport):
+        """Dołącz klienta do rozgrywki, rozpoczynając grę, gdy zbierze się
+        wymagana liczba graczy.
+        """
+        transport.player_id = self.player_numbers.next()
+        self.connected_clients[transport.player_id] = transport
+
+        # Wyślij wiadomość przywitalną z numerem gracza, identyfikatorem
+        # sesji i nazwą planszy.
+        send(transport.outbound, WelcomeMessage(transport.player_id, transport.client_id,
+                                                self.level_name))
+
+        # Rozpocznij grę jeżeli połączyła się wystarczająca liczba graczy.
+        if len(self.connected_clients) == self.number_of_players:
+            self.log("Got required number of %d players." % self.number_of_players)
+            self.start()
+
+    def remove_client(self, transport):
+        """Odłącz klienta od rozgrywki.
+        """
+        self.connected_clients.pop(transport.player_id)
+
+        # Jeżeli gra była w toku, musimy ją przerwać.
+        self.end(right_now=True)
+
+    def receive(self, player_id, message):
+        """Obsłuż komunikat otrzymany od klienta.
+
+        W trybie krokowym komunikat czeka w kolejce gracza na wykonanie
+        w jednym z kolejnych kroków (patrz tick()).
+        """
+        if not self.game_started:
+            return
+
+        if self.tick_rate:
+            queue = self.inputs.setdefault(player_id, deque())
+            if len(queue) < self.max_queued_inputs:
+                queue.append(message)
+            else:
+                self.log("Input queue of player %d is full, dropping %s." % \
+                             (player_id, type(message).__name__))
+        else:
+            self.simulation.advance_to(self._current_step())
+            if not self.simulation.finished:
+                self._process_input(player_id, message)
+            self._after_step(self.simulation.collect())
+
+    def _process_queue(self, player_id, queue):
+        """Wykonaj czekające ruchy gracza w kolejności otrzymania, aż do
+        pierwszego przesunięcia włącznie. Przesunięcie, którego pingwin nie
+        może jeszcze wykonać (patrz Simulation.can_move()), zostaje
+        w kolejce razem z ruchami otrzymanymi po nim.
+        """
+        while queue:
+            message = queue[0]
+            if isinstance(message, MoveMeToMessage):
+                if not self.simulation.can_move(player_id):
+                    return
+                self._process_input(player_id, queue.popleft())
+                return
+            self._process_input(player_id, queue.popleft())
+
+    def _process_input(self, player_id, message):
+        if not self.simulation.apply(player_id, message):
+            self.log("Illegal move of player %d." % player_id)
+
+    def send_events(self, events):
+        """Roześlij klientom zdarzenia zwrócone przez silnik rozgrywki.
+        """
+        for message, excluded_player_id in events:
+            if excluded_player_id is None:
+                self.send_to_all(message)
+            else:
+                self.send_to_other(excluded_player_id, message)
+
+    def send_to_all(self, message):
+        """Wyślij wiadomość do wszystkich klientów.
+        """
+        transports = self.connected_clients.values()
+        self.log_message(message, len(transports))
+        broadcast([ transport.outbound for transport in transports ], message)
+
+    def send_to_other(self, player_id, message):
+        """Wyślij wiadomość do wszystkich klientów poza podanym.
+        """
+        transports = [ transport for transport in self.connected_clients.values()
+                       if transport.player_id != player_id ]
+        self.log_message(message, len(transports))
+        broadcast([ transport.outbound for transport in transports ], message)
+
+    def start(self):
+        """Utwórz silnik rozgrywki i rozpocznij grę wysyłając wszystkim
+        graczom komunikat StartGameMessage.
+        """
+        move_cooldown = self.move_cooldown
+        if not self.tick_rate:
+            # Ruch otrzymany w trakcie kroku silnik liczy od początku kroku,
+            # więc wydłużamy blokadę o krok, by nie była krótsza niż
+            # move_cooldown.
+            move_cooldown += 1.0 / self.step_rate
+        self.simulation = Simulation(self.level_name,
+                                     sorted(self.connected_clients),
+                                     number_of_fishes = self.number_of_fishes,
+                                     new_fish_delay   = self.new_fish_delay,
+                                     game_duration    = self.game_duration,
+                                     move_cooldown    = move_cooldown,
+                                     step_rate        = self.tick_rate or self.step_rate)
+        self.board = self.simulation.board
+
+        self.game_started = True
+        self.start_time   = time.time()
+        self.send_events(self.simulation.start())
+        self._start_ticking()
+
+    def tick(self):
+        """Wykonaj krok rozgrywki: w trybie krokowym przesuń czas silnika
+        rozgrywki o jeden krok i wykonaj czekające ruchy graczy (patrz
+        _process_queue()), a w przeciwnym razie przesuń go do bieżącej
+        chwili. Wyślij powstałe komunikaty.
+        """
+        started = time.time()
+
+        if self.tick_rate:
+            self.simulation.advance()
+            for player_id in sorted(self.inputs):
+                self._process_queue(player_id, self.inputs[player_id])
+        else:
+            self.tick_timer = None
+            self.simulation.advance_to(max(self._current_step(), self.wake_up_step))
+
+        # Zapisz czas trwania kroku i ostrzeż, jeżeli przekroczył budżet
+        # kroku w trybie krokowym.
+        elapsed = time.time() - started
+        self.ticks     += 1
+        self.tick_time += elapsed
+        self.max_tick_time = max(self.max_tick_time, elapsed)
+        if self.tick_rate and elapsed > 1.0 / self.tick_rate:
+            self.log("Tick %d took %.1f ms, over the budget of %.1f ms." % \
+                         (self.ticks, 1000 * elapsed, 1000.0 / self.tick_rate))
+
+        self._after_step(self.simulation.collect())
+
+    def _after_step(self, events):
+        """Wyślij zdarzenia zwrócone przez silnik rozgrywki, a następnie
+        zakończ rozgrywkę, jeżeli silnik ją zakończył, lub - gdy ruchy
+        wykonywane są natychmiast - zaplanuj następne wybudzenie.
+        """
+        self.send_events(events)
+        if self.tick_rate:
+            for transport in self.connected_clients.values():
+                transport.outbound.flush()
+
+        if self.simulation.finished:
+            self._finish()
+        elif not self.tick_rate:
+            self._schedule_wake_up()
+
+    def _current_step(self):
+        """Zwróć numer kroku silnika rozgrywki odpowiadający bieżącej chwili.
+        """
+        return int((time.time() - self.start_time) * self.simulation.step_rate)
+
+    def _schedule_wake_up(self):
+        """Zaplanuj wywołanie tick() na najbliższy krok, w którym silnik
+        rozgrywki ma coś do zrobienia, chyba że zaplanowane wybudzenie
+        nastąpi wcześniej.
+        """
+        step_number = self.simulation.next_event_step()
+        if self.tick_timer is not None:
+            if self.wake_up_step <= step_number:
+                return
+            self.tick_timer.cancel()
+
+        self.wake_up_step = step_number
+        delay = self.start_time + float(step_number) / self.simulation.step_rate - time.time()
+        self.tick_timer = run_after(max(0, delay), locked(server_lock)(self.tick))
+
+    def mean_tick_time(self):
+        """Zwróć średni czas trwania kroku w sekundach.
+        """
+        if not self.ticks:
+            return 0.0
+        return self.tick_time / self.ticks
+
+    def end(self, right_now=False):
+        """Zakończ rozgrywkę.
+
+        Jeżeli `right_now` nie jest równy True gra nie zakończy się dopóki
+        gra nie ma rozstrzygnięcia (tzn. nie ma jednego zwycięskiego gracza).
+        """
+        if not self.game_started:
+            return
+
+        self._after_step(self.simulation.end(right_now))
+
+    def _finish(self):
+        """Oznacz rozgrywkę jako zakończoną i odwołaj wykonywanie kroków.
+        """
+        self.game_started = False
+        self.finished = True
+
+        # Gra mogła zostać przerwana przed czasem, więc odwołujemy
+        # zaplanowane na nią wywołania.
+        if self.tick_timer is not None:
+            self.tick_timer.cancel()
+        self.log("Mean tick time %.2f ms, max %.2f ms over %d ticks." % \
+                     (1000 * self.mean_tick_time(), 1000 * self.max_tick_time,
+                      self.ticks))
+
+    def _start_ticking(self):
+        """Funkcja inicjująca wykonywanie kroków rozgrywki: co krok w trybie
+        krokowym, a w przeciwnym razie na najbliższy krok, w którym silnik
+        rozgrywki ma coś do zrobienia.
+        """
+        if self.tick_rate:
+            self.tick_timer = run_each(1.0 / self.tick_rate,
+                                       locked(server_lock)(self.tick),
+                                       lambda: not self.game_started)
+        else:
+            self._schedule_wake_up()
+
+    def log(self, message):
+        """Wyświetl wiadomość dotyczącą rozgrywki.
+        """
+        print "[match %d] %s" % (self.number, message)
+
+    def log_message(self, message, recipients):
+        """Wyświetl wiadomość dotyczącą komunikatu wysyłanego do podanej
+        liczby klientów.
+        """
+        self.log("Sending %s to %d clients." % (type(message).__name__, recipients))
+
+class MatchManager(object):
+    """Zarządca wielu równoległych rozgrywek w jednym procesie.
+
+    Nowi klienci trafiają do rozgrywki, która wciąż czeka na graczy; gdy
+    takiej nie ma, tworzona jest nowa. Rozgrywka jest usuwana, gdy
+    odłączy się od niej ostatni klient.
+
+    Argumenty konstruktora są przekazywane do każdej tworzonej rozgrywki
+    (patrz Match).
+    """
+    def __init__(self, **settings):
+        self.settings = settings
+
+        # Słownik trwających rozgrywek indeksowany ich numerem.
+        self.matches = {}
+        # Rozgrywka, do której dołączają nowi klienci.
+        self.filling = None
+        # Liczba podłączonych klientów we wszystkich rozgrywkach.
+        self.players = 0
+
+        self.match_numbers = count(1)
+
+    def join(self, transport):
+        """Przydziel klienta do rozgrywki i zwróć ją.
+        """
+        if self.filling is None or not self.filling.is_filling():
+            self.filling = Match(self.match_numbers.next(), **self.settings)
+            self.matches[self.filling.number] = self.filling
+
+        match = self.filling
+        match.add_client(transport)
+        self.players += 1
+        return match
+
+    def leave(self, transport, match):
+        """Odłącz klienta od rozgrywki, usuwając ją, jeżeli nie ma już w niej
+        żadnych graczy.
+        """
+        match.remove_client(transport)
+        self.players -= 1
+
+        if not match.connected_clients:
+            del self.matches[match.number]
+            if self.filling is match:
+                self.filling = None
+
+    def waiting(self):
+        """Zwróć liczbę graczy czekających na rozpoczęcie rozgrywki.
+        """
+        if self.filling is None or not self.filling.is_filling():
+            return 0
+        return len(self.filling.connected_clients)
+
+    def mean_tick_time(self):
+        """Zwróć średni czas kroku trwających rozgrywek, niezależnie od
+        trybu, w jakim działają.
+        """
+        tick_times = [ match.mean_tick_time() for match in self.matches.values()
+                       if match.ticks ]
+        if not tick_times:
+            return 0.0
+        return sum(tick_times) / len(tick_times)
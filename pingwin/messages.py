@@ -1,12 +1,29 @@
 # -*- coding: utf-8 -*-
 
-import pickle
+import struct
 
-END_OF_MESSAGE = '\0'
+from binascii import hexlify, unhexlify
+
+from fish import Fish
+from penguin import Penguin
+
+# Wersja protokołu, przesyłana w nagłówku każdego komunikatu.
+PROTOCOL_VERSION = 2
+
+# Nagłówek komunikatu: wersja protokołu i numer typu komunikatu.
+MESSAGE_HEADER = struct.Struct('!BB')
+
+# Nagłówek ramki: długość zserializowanego komunikatu w bajtach.
+FRAME_HEADER = struct.Struct('!I')
+
+# Kierunki ruchu, przesyłane jako ich indeks w tej liście.
+DIRECTIONS = ["Up", "Down", "Right", "Left"]
 
 # Lista eksportowanych symboli.
 __all__ = ['send',
-           'receive',
+           'broadcast',
+           'OutboundQueue',
+           'MessageDecoder',
            'WelcomeMessage',
            'StartGameMessage',
            'EndGameMessage',
@@ -17,36 +34,360 @@ __all__ = ['send',
            'RiseGameDurationMessage',
            'PositionUpdateMessage',
            'TurnMeToMessage',
-           'TurnOtherToMessage']
+           'TurnOtherToMessage',
+           'RedirectMessage',
+           'WorkerStatusMessage']
 
 
 def send(transport, message):
     """Wyślij pojedynczą wiadomość przez podany transport.
 
-    Do wiadomości dołączany jest bajt END_OF_MESSAGE dla oznaczenia końca
-    wiadomości.
+    Wiadomość poprzedzana jest nagłówkiem ramki zawierającym jej długość.
     """
-    transport.write(serialize(message) + END_OF_MESSAGE)
+    transport.write(frame(message))
+
+def broadcast(transports, message):
+    """Wyślij tę samą wiadomość przez wszystkie podane transporty.
 
-def receive(data):
-    """Zwraca listę wiadomości zawartych w przekazanych danych.
+    Wiadomość jest serializowana tylko raz, a wynikowy ciąg znaków jest
+    zapisywany do każdego z transportów.
     """
-    return [ deserialize(msg) for msg in data.split(END_OF_MESSAGE) if msg ]
+    data = frame(message)
+    for transport in transports:
+        transport.write(data)
 
 
-def serialize(object):
-    """Zwróć reprezentację obiektu jako ciąg znaków.
+def serialize(message):
+    """Zwróć binarną reprezentację komunikatu jako ciąg znaków.
     """
-    return pickle.dumps(object)
+    parts = [MESSAGE_HEADER.pack(PROTOCOL_VERSION, message.tag)]
+    message.record.encode(message, parts)
+    return ''.join(parts)
 
-def deserialize(string):
-    """Zwróć obiekt zserializowany w podanym stringu.
+def deserialize(data):
+    """Zwróć komunikat zserializowany w podanym stringu lub buforze
+    (np. obiekcie memoryview).
     """
-    return pickle.loads(string)
+    version, tag = MESSAGE_HEADER.unpack_from(data)
+    if version != PROTOCOL_VERSION:
+        raise ValueError("Unsupported protocol version %d." % version)
+    if tag not in MESSAGE_TYPES:
+        raise ValueError("Unknown message type %d." % tag)
+
+    message, offset = MESSAGE_TYPES[tag].record.decode(data, MESSAGE_HEADER.size)
+    return message
+
+class MessageDecoder(object):
+    """Przyrostowy dekoder strumienia ramek dla pojedynczego połączenia.
+
+    Dane przekazywane do metody feed() mogą zawierać dowolny fragment
+    strumienia: kilka ramek naraz, część ramki albo jej koniec razem
+    z początkiem następnej. Niekompletne ramki są przechowywane w buforze
+    do czasu otrzymania reszty danych.
+
+    Strumień można podzielić w dowolnym miejscu:
+
+    >>> data = frame(MoveMeToMessage("Up")) + frame(RiseGameDurationMessage(10))
+    >>> def describe(messages):
+    ...     return tuple([ type(message).__name__ for message in messages ])
+    >>> results = set()
+    >>> for offset in range(len(data) + 1):
+    ...     decoder = MessageDecoder()
+    ...     messages = decoder.feed(data[:offset]) + decoder.feed(data[offset:])
+    ...     results.add((describe(messages), messages[0].direction, messages[1].duration))
+    >>> results
+    set([(('MoveMeToMessage', 'RiseGameDurationMessage'), 'Up', 10)])
+
+    Podobnie dla danych dostarczanych po jednym bajcie:
+
+    >>> decoder = MessageDecoder()
+    >>> messages = []
+    >>> for byte in data + frame(EndGameMessage()):
+    ...     messages.extend(decoder.feed(byte))
+    >>> describe(messages)
+    ('MoveMeToMessage', 'RiseGameDurationMessage', 'EndGameMessage')
+    >>> decoder.pending()
+    0
+    """
+    # Maksymalny rozmiar pojedynczej ramki. Dłuższe ramki uznajemy za błąd
+    # protokołu, żeby klient nie mógł zmusić nas do buforowania dowolnej
+    # ilości danych.
+    max_frame_size = 1024 * 1024
+
+    def __init__(self):
+        self.buffer = bytearray()
+
+    def feed(self, data):
+        """Dopisz dane do bufora i zwróć listę wszystkich komunikatów
+        z kompletnych ramek.
+        """
+        self.buffer.extend(data)
+
+        messages = []
+        offset = 0
+        # Komunikaty dekodujemy bezpośrednio z bufora, bez kopiowania ramek.
+        view = memoryview(self.buffer)
+        try:
+            while len(self.buffer) - offset >= FRAME_HEADER.size:
+                (length,) = FRAME_HEADER.unpack_from(view, offset)
+                if length > self.max_frame_size:
+                    raise ValueError("Frame of %d bytes is too long." % length)
+
+                start = offset + FRAME_HEADER.size
+                end   = start + length
+                if end > len(self.buffer):
+                    break
+
+                messages.append(deserialize(view[start:end]))
+                offset = end
+        finally:
+            # Bufora nie można zmieniać dopóki istnieje widok na niego.
+            del view
+
+        # Usuń z bufora przetworzone ramki, zostawiając niekompletną resztę.
+        del self.buffer[:offset]
+
+        return messages
+
+    def pending(self):
+        """Zwróć liczbę bajtów czekających na dokończenie ramki.
+        """
+        return len(self.buffer)
+
+class OutboundQueue(object):
+    """Kolejka ramek wychodzących dla pojedynczego połączenia.
+
+    Obiekt udaje transport: ramki zapisane metodą write() są zbierane
+    i wysyłane jednym wywołaniem transport.write() w metodzie flush(),
+    więc komunikaty wysłane podczas jednego obrotu pętli zdarzeń trafiają
+    do sieci razem. Jeżeli podano funkcję `schedule` (o sygnaturze
+    reactor.callLater), wywołanie flush() jest planowane automatycznie.
+
+    >>> class Transport(object):
+    ...     def write(self, data):
+    ...         print "write(%d bytes)" % len(data)
+    >>> outbound = OutboundQueue(Transport())
+    >>> send(outbound, MoveMeToMessage("Up"))
+    >>> send(outbound, EndGameMessage())
+    >>> outbound.flush()
+    write(13 bytes)
+    >>> outbound.messages_per_flush(), outbound.bytes_per_flush()
+    (2.0, 13.0)
+    """
+    def __init__(self, transport, schedule=None):
+        self.transport = transport
+        self.schedule  = schedule
+
+        self.frames    = []
+        self.scheduled = False
+
+        # Liczniki wysłanych zapisów, komunikatów i bajtów.
+        self.flushes       = 0
+        self.messages_sent = 0
+        self.bytes_sent    = 0
+
+    def write(self, data):
+        """Dodaj ramkę do kolejki.
+        """
+        self.frames.append(data)
+
+        if self.schedule and not self.scheduled:
+            self.scheduled = True
+            self.schedule(0, self.flush)
+
+    def flush(self):
+        """Wyślij wszystkie zebrane ramki jednym zapisem.
+        """
+        self.scheduled = False
+        if not self.frames:
+            return
+
+        data = ''.join(self.frames)
+        self.transport.write(data)
+
+        self.flushes       += 1
+        self.messages_sent += len(self.frames)
+        self.bytes_sent    += len(data)
+        self.frames = []
+
+    def messages_per_flush(self):
+        """Zwróć średnią liczbę komunikatów przypadającą na jeden zapis.
+        """
+        if not self.flushes:
+            return 0.0
+        return float(self.messages_sent) / self.flushes
+
+    def bytes_per_flush(self):
+        """Zwróć średnią liczbę bajtów przypadającą na jeden zapis.
+        """
+        if not self.flushes:
+            return 0.0
+        return float(self.bytes_sent) / self.flushes
+
+def frame(message):
+    """Zwróć komunikat zserializowany razem z nagłówkiem ramki.
+    """
+    payload = serialize(message)
+    return FRAME_HEADER.pack(len(payload)) + payload
+
+########################################################################
+# Typy pól komunikatów.
+#
+class FieldType(object):
+    """Pole o stałym rozmiarze, opisane kodem formatu modułu struct.
+
+    Opcjonalne funkcje `to_wire` i `from_wire` zamieniają wartość atrybutu
+    na postać przesyłaną przez sieć i z powrotem.
+    """
+    def __init__(self, format, to_wire=None, from_wire=None):
+        self.format    = format
+        self.to_wire   = to_wire
+        self.from_wire = from_wire
+
+class StringType(object):
+    """Napis o długości do 255 znaków, poprzedzony bajtem długości.
+    """
+    def encode(self, value, parts):
+        parts.append(chr(len(value)))
+        parts.append(value)
+
+    def decode(self, data, offset):
+        length = ord(data[offset])
+        offset += 1
+        (value,) = struct.unpack_from('%ds' % length, data, offset)
+        return value, offset + length
+
+class ListType(object):
+    """Lista rekordów, poprzedzona liczbą elementów.
+    """
+    count = struct.Struct('!H')
+
+    def __init__(self, record):
+        self.record = record
+
+    def encode(self, value, parts):
+        parts.append(self.count.pack(len(value)))
+        for element in value:
+            self.record.encode(element, parts)
+
+    def decode(self, data, offset):
+        (length,) = self.count.unpack_from(data, offset)
+        offset += self.count.size
+
+        result = []
+        for index in range(length):
+            element, offset = self.record.decode(data, offset)
+            result.append(element)
+        return result, offset
+
+UBYTE     = FieldType('B')
+USHORT    = FieldType('H')
+UINT      = FieldType('I')
+DIRECTION = FieldType('B', DIRECTIONS.index, DIRECTIONS.__getitem__)
+PLAYER_ID = FieldType('H')
+TOKEN     = FieldType('16s', unhexlify, hexlify)
+STRING    = StringType()
+
+class FixedRun(object):
+    """Ciąg sąsiadujących pól o stałym rozmiarze, kodowanych jednym
+    obiektem struct.Struct.
+    """
+    def __init__(self, fields):
+        self.struct = struct.Struct('!' + ''.join([type.format for name, type in fields]))
+        self.fields = [ (name, type.to_wire, type.from_wire) for name, type in fields ]
+
+    def encode(self, obj, parts):
+        values = []
+        for name, to_wire, from_wire in self.fields:
+            value = getattr(obj, name)
+            if to_wire:
+                value = to_wire(value)
+            values.append(value)
+        parts.append(self.struct.pack(*values))
+
+    def decode(self, data, offset, result):
+        values = self.struct.unpack_from(data, offset)
+        for (name, to_wire, from_wire), value in zip(self.fields, values):
+            if from_wire:
+                value = from_wire(value)
+            result[name] = value
+        return offset + self.struct.size
+
+class VariableField(object):
+    """Pojedyncze pole o zmiennym rozmiarze (napis, lista).
+    """
+    def __init__(self, name, type):
+        self.name = name
+        self.type = type
+
+    def encode(self, obj, parts):
+        self.type.encode(getattr(obj, self.name), parts)
+
+    def decode(self, data, offset, result):
+        result[self.name], offset = self.type.decode(data, offset)
+        return offset
+
+class Record(object):
+    """Schemat obiektu przesyłanego przez sieć.
+
+    Schemat to lista par (nazwa atrybutu, typ pola), zapisywanych kolejno
+    jedno po drugim. Obiekt jest odtwarzany przez wywołanie funkcji
+    `factory` ze słownikiem odczytanych wartości.
+    """
+    def __init__(self, factory, schema):
+        self.factory = factory
+        self.runs = []
+
+        fixed = []
+        for name, type in schema:
+            if isinstance(type, FieldType):
+                fixed.append((name, type))
+                continue
+            if fixed:
+                self.runs.append(FixedRun(fixed))
+                fixed = []
+            self.runs.append(VariableField(name, type))
+        if fixed:
+            self.runs.append(FixedRun(fixed))
+
+    def encode(self, obj, parts):
+        for run in self.runs:
+            run.encode(obj, parts)
+
+    def decode(self, data, offset):
+        values = {}
+        for run in self.runs:
+            offset = run.decode(data, offset, values)
+        return self.factory(values), offset
+
+def make_penguin(values):
+    penguin = Penguin(values['id'], values['x'], values['y'])
+    penguin.fish_count = values['fish_count']
+    penguin.number     = values['number']
+    penguin.color      = values['color']
+    return penguin
+
+def make_fish(values):
+    return Fish(values['type'], values['x'], values['y'])
+
+PENGUINS = ListType(Record(make_penguin, [('id', PLAYER_ID),
+                                          ('x', USHORT),
+                                          ('y', USHORT),
+                                          ('fish_count', USHORT),
+                                          ('number', UBYTE),
+                                          ('color', STRING)]))
+FISH     = Record(make_fish, [('type', UBYTE), ('x', USHORT), ('y', USHORT)])
+FISHES   = ListType(FISH)
 
 
 class Message(object):
-    pass
+    """Klasa bazowa komunikatów.
+
+    Każdy komunikat określa swój numer typu `tag` oraz schemat `schema`,
+    na podstawie którego jest kodowany do postaci binarnej.
+    """
+    tag    = None
+    schema = []
 
 ########################################################################
 # Serwer -> Klient
@@ -56,11 +397,18 @@ class WelcomeMessage(Message):
     połączenia.
 
     Atrybuty:
-      player_id   identyfikator przypisany graczowi przez serwer
+      player_id   numer gracza w rozgrywce, którym oznaczane są jego pingwin
+                  i dotyczące go komunikaty
+      token       identyfikator sesji przypisany klientowi przez serwer
+                  (32 znaki szesnastkowe)
       level_name  nazwa poziomu, jaki klient powinien wczytać
     """
-    def __init__(self, player_id, level_name):
+    tag    = 1
+    schema = [('player_id', PLAYER_ID), ('token', TOKEN), ('level_name', STRING)]
+
+    def __init__(self, player_id, token, level_name):
         self.player_id  = player_id
+        self.token      = token
         self.level_name = level_name
 
 class StartGameMessage(Message):
@@ -72,6 +420,9 @@ class StartGameMessage(Message):
       fishes         lista rybek początkowo leżących na planszy
       game_duration  czas trwania partii
     """
+    tag    = 2
+    schema = [('penguins', PENGUINS), ('fishes', FISHES), ('game_duration', USHORT)]
+
     def __init__(self, penguins, fishes, game_duration):
         self.penguins      = penguins
         self.fishes        = fishes
@@ -80,12 +431,15 @@ class StartGameMessage(Message):
 class EndGameMessage(Message):
     """Komunikat oznaczający koniec gry.
     """
-    pass
+    tag = 3
 
 class MoveOtherToMessage(Message):
     """Komunikat przesyłany z serwera informujący innych graczy o ruchu
     jednego z nich w podanym kierunku.
     """
+    tag    = 4
+    schema = [('penguin_id', PLAYER_ID), ('direction', DIRECTION)]
+
     def __init__(self, penguin_id, direction):
         self.penguin_id = penguin_id
         self.direction  = direction
@@ -94,6 +448,9 @@ class TurnOtherToMessage(Message):
     """Komunikat przesyłany z serwera informujący innych graczy o przekręceniu
     jednego z nich w podanym kierunku.
     """
+    tag    = 5
+    schema = [('penguin_id', PLAYER_ID), ('direction', DIRECTION)]
+
     def __init__(self, penguin_id, direction):
         self.penguin_id = penguin_id
         self.direction  = direction
@@ -102,6 +459,9 @@ class ScoreUpdateMessage(Message):
     """Komunikat przesyłany w momencie, gdy któryś z graczy zdobędzie nową
     lub straci rybkę.
     """
+    tag    = 6
+    schema = [('penguin_id', PLAYER_ID), ('fish_count', USHORT)]
+
     def __init__(self, penguin_id, fish_count):
         self.penguin_id = penguin_id
         self.fish_count = fish_count
@@ -110,12 +470,18 @@ class NewFishMessage(Message):
     """Komunikat przesyłany do klientów w momencie, gdy do planszy dodano
     nową rybkę.
     """
+    tag    = 7
+    schema = [('fish', FISH)]
+
     def __init__(self, fish):
         self.fish = fish
 
 class RiseGameDurationMessage(Message):
     """Komunikat wysyłany do klientów w momencie, gdy gra jest przedłużana.
     """
+    tag    = 8
+    schema = [('duration', USHORT)]
+
     def __init__(self, duration):
         self.duration = duration
 
@@ -123,11 +489,24 @@ class PositionUpdateMessage(Message):
     """Komunikat informujący klientów o nowym położeniu jednego z nich
     (po wpadnięciu do wody).
     """
+    tag    = 9
+    schema = [('penguin_id', PLAYER_ID), ('x', USHORT), ('y', USHORT)]
+
     def __init__(self, penguin_id, x, y):
         self.penguin_id = penguin_id
         self.x = x
         self.y = y
 
+class RedirectMessage(Message):
+    """Komunikat wysyłany przez lobby do klienta, wskazujący port procesu
+    serwera, z którym klient powinien się połączyć.
+    """
+    tag    = 12
+    schema = [('port', USHORT)]
+
+    def __init__(self, port):
+        self.port = port
+
 ########################################################################
 # Klient -> Serwer
 #
@@ -135,6 +514,9 @@ class MoveMeToMessage(Message):
     """Komunikat wysyłany przez klienta do serwera informujący o przesunięciu
     pingwina w jednym z czterech dozwolonych kierunków (Up/Down/Right/Left).
     """
+    tag    = 10
+    schema = [('direction', DIRECTION)]
+
     def __init__(self, direction):
         self.direction = direction
 
@@ -142,5 +524,55 @@ class TurnMeToMessage(Message):
     """Komunikat wysyłany przez klienta do serwera informujący o przekręceniu
     pingwina w jednym z czterech dozwolonych kierunków (Up/Down/Right/Left).
     """
+    tag    = 11
+    schema = [('direction', DIRECTION)]
+
     def __init__(self, direction):
         self.direction = direction
+
+########################################################################
+# Proces roboczy -> Lobby
+#
+class WorkerStatusMessage(Message):
+    """Komunikat wysyłany okresowo przez proces roboczy serwera do lobby,
+    opisujący jego obciążenie.
+
+    Atrybuty:
+      matches    liczba prowadzonych rozgrywek
+      players    liczba podłączonych graczy
+      waiting    liczba graczy czekających na rozpoczęcie rozgrywki
+      tick_time  średni czas kroku symulacji w mikrosekundach
+      loop_lag   opóźnienie pętli zdarzeń w mikrosekundach
+    """
+    tag    = 13
+    schema = [('matches', UINT), ('players', UINT), ('waiting', UINT),
+              ('tick_time', UINT), ('loop_lag', UINT)]
+
+    def __init__(self, matches, players, waiting, tick_time, loop_lag):
+        self.matches   = matches
+        self.players   = players
+        self.waiting   = waiting
+        self.tick_time = tick_time
+        self.loop_lag  = loop_lag
+
+########################################################################
+# Rejestr typów komunikatów.
+#
+def make_message_factory(message_class):
+    """Zwróć funkcję tworzącą komunikat danej klasy ze słownika wartości
+    jego atrybutów (z pominięciem konstruktora).
+    """
+    def factory(values):
+        message = message_class.__new__(message_class)
+        message.__dict__.update(values)
+        return message
+    return factory
+
+# Słownik klas komunikatów indeksowany ich numerem typu.
+MESSAGE_TYPES = {}
+
+for message_class in Message.__subclasses__():
+    assert message_class.tag not in MESSAGE_TYPES
+    message_class.record = Record(make_message_factory(message_class),
+                                  message_class.schema)
+    MESSAGE_TYPES[message_class.tag] = message_class
@@ -1,21 +1,51 @@
 # -*- coding: utf-8 -*-
 
-class Penguin(object):
+import weakref
+
+from entities import column, Entity, EntityStore
+
+# Liczbowe atrybuty wszystkich pingwinów procesu (patrz entities.EntityStore).
+PENGUINS = EntityStore(x='i', y='i', fish_count='H', moving='B', number='H')
+
+class Penguin(Entity):
+    __slots__ = ('id', 'color', '_leaderboard')
+    store = PENGUINS
+
+    x          = column(PENGUINS, 'x')
+    y          = column(PENGUINS, 'y')
+    fish_count = column(PENGUINS, 'fish_count')
+    moving     = column(PENGUINS, 'moving')
+    number     = column(PENGUINS, 'number')
+
     def __init__(self, id, x, y):
+        Entity.__init__(self)
         self.id = id
         self.x = x
         self.y = y
 
-        self.fish_count = 0
-        self.moving = False
         self.color = "white"
-        self.number = 0
+
+        # Ranking, który należy zawiadamiać o zmianach wyniku
+        # (patrz leaderboard.Leaderboard).
+        self.leaderboard = None
+
+    def __setstate__(self, state):
+        Entity.__setstate__(self, state)
+        self.leaderboard = None
+
+    def set_fish_count(self, fish_count):
+        """Ustaw liczbę zebranych rybek i zwróć ją.
+        """
+        old_fish_count  = self.fish_count
+        self.fish_count = fish_count
+        if self.leaderboard is not None:
+            self.leaderboard.update(self, old_fish_count)
+        return fish_count
 
     def eat_fish(self):
         """Zjedz rybkę i zwróć ich aktualną liczbę.
         """
-        self.fish_count += 1
-        return self.fish_count
+        return self.set_fish_count(self.fish_count + 1)
 
     def stop(self):
         """Zatrzymaj pingwina.
@@ -27,10 +57,21 @@ class Penguin(object):
 
         Funkcja zwraca aktualną liczbę rybek.
         """
-        self.fish_count -= 5
-        if self.fish_count < 0:
-            self.fish_count = 0
-        return self.fish_count
+        return self.set_fish_count(max(self.fish_count - 5, 0))
 
     def _getname(self): return "Gracz %d" % self.number
     name = property(_getname)
+
+    # Ranking przechowujemy jako słabą referencję: ranking trzyma swoje
+    # pingwiny, a cykl obiektów z metodą __del__ (patrz entities.Entity)
+    # nie zostałby zwolniony.
+    def _getleaderboard(self):
+        if self._leaderboard is None:
+            return None
+        return self._leaderboard()
+    def _setleaderboard(self, leaderboard):
+        if leaderboard is None:
+            self._leaderboard = None
+        else:
+            self._leaderboard = weakref.ref(leaderboard)
+    leaderboard = property(_getleaderboard, _setleaderboard)
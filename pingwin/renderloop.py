@@ -0,0 +1,189 @@
+# -*- coding: utf-8 -*-
+"""Odświeżanie ekranu ze stałą częstotliwością i statystyki czasu klatek.
+
+Pętla odświeżania działa w wątku reaktora Twisted. W przykładzie zamiast
+reaktora i zegara używamy sztucznego zegara Twisted:
+
+>>> from twisted.internet.task import Clock
+>>> class Display(object):
+...     frames = 0
+...     def refresh(self):
+...         self.frames += 1
+>>> reactor, display = Clock(), Display()
+>>> loop = RenderLoop(display, fps=16, reactor=reactor, clock=reactor.seconds)
+>>> loop.start()
+>>> reactor.pump([1.0 / 32] * 32)
+>>> display.frames, loop.stats.dropped
+(17, 0)
+
+Po dłuższym przestoju zaległe klatki są pomijane, a nie nadrabiane:
+
+>>> reactor.advance(1)
+>>> display.frames, loop.stats.dropped
+(18, 15)
+
+W trybie oszczędzania energii klatek jest mniej:
+
+>>> loop.set_low_power(True)
+>>> reactor.pump([1.0 / 32] * 32)
+>>> display.frames
+28
+"""
+
+import math
+
+from collections import deque
+
+from twisted.internet import reactor
+
+from helpers import monotonic
+
+
+class FrameStats(object):
+    """Statystyki czasu rysowania ostatnich `window` klatek.
+
+    Atrybuty obiektu:
+      times    czasy rysowania ostatnich klatek w sekundach
+      frames   liczba wszystkich narysowanych klatek
+      dropped  liczba klatek pominiętych z powodu spóźnienia (patrz
+               RenderLoop)
+    """
+    def __init__(self, window=300):
+        self.times   = deque(maxlen=window)
+        self.frames  = 0
+        self.dropped = 0
+
+    def add(self, duration):
+        """Zapamiętaj czas rysowania kolejnej klatki.
+        """
+        self.times.append(duration)
+        self.frames += 1
+
+    def mean(self):
+        """Zwróć średni czas rysowania klatki w sekundach.
+        """
+        if not self.times:
+            return 0.0
+        return sum(self.times) / len(self.times)
+
+    def percentile(self, percent):
+        """Zwróć czas rysowania, którego nie przekroczyło `percent` procent
+        klatek.
+        """
+        if not self.times:
+            return 0.0
+        times = sorted(self.times)
+        return times[max(0, int(math.ceil(percent / 100.0 * len(times))) - 1)]
+
+    def summary(self):
+        """Zwróć słownik ze statystykami (czasy w sekundach).
+        """
+        return {'frames':  self.frames,
+                'dropped': self.dropped,
+                'mean':    self.mean(),
+                'p95':     self.percentile(95),
+                'p99':     self.percentile(99)}
+
+    def dump(self):
+        """Zwróć statystyki w postaci jednego wiersza tekstu.
+        """
+        summary = self.summary()
+        return "frames %d, dropped %d, frame time: mean %.2f ms, p95 %.2f ms, " \
+            "p99 %.2f ms" % (summary['frames'], summary['dropped'],
+                             1000 * summary['mean'], 1000 * summary['p95'],
+                             1000 * summary['p99'])
+
+class RenderLoop(object):
+    """Pętla odświeżania ekranu `fps` razy na sekundę.
+
+    Terminy klatek wyznaczane są wg zegara monotonicznego (patrz
+    helpers.monotonic()) co 1/fps sekundy od poprzedniego terminu, a nie od
+    końca poprzedniej klatki, więc czas rysowania nie wydłuża odstępów.
+    Spóźnienie nie większe niż `max_catch_up` odstępów jest nadrabiane -
+    klatki rysowane są jedna po drugiej aż do zrównania się z terminami.
+    Przy większym spóźnieniu (np. po zatrzymaniu procesu) zaległe klatki są
+    pomijane i liczone w stats.dropped.
+
+    W trybie oszczędzania energii (patrz set_low_power()) ekran odświeżany
+    jest `low_power_fps` razy na sekundę.
+
+    Jedyna metoda jaką musi obsługiwać obiekt `display` to refresh().
+    """
+    def __init__(self, display, fps=30, low_power_fps=10, max_catch_up=2,
+                 reactor=reactor, clock=monotonic):
+        self.display       = display
+        self.fps           = fps
+        self.low_power_fps = low_power_fps
+        self.max_catch_up  = max_catch_up
+        self.reactor       = reactor
+        self.clock         = clock
+
+        self.low_power = False
+        self.interval  = 1.0 / fps
+        self.stats     = FrameStats()
+
+        # Termin następnej klatki i odpowiadające mu wywołanie reaktora.
+        self.deadline     = None
+        self.delayed_call = None
+
+    def start(self):
+        """Rozpocznij odświeżanie, zaczynając od razu od pierwszej klatki.
+        """
+        if self.delayed_call is None:
+            self.deadline = self.clock()
+            self._schedule()
+
+    def stop(self):
+        """Zatrzymaj odświeżanie.
+        """
+        if self.delayed_call is not None:
+            self.delayed_call.cancel()
+            self.delayed_call = None
+
+    def set_fps(self, fps):
+        """Zmień liczbę klatek na sekundę w zwykłym trybie.
+        """
+        self.fps = fps
+        self._update_interval()
+
+    def set_low_power(self, low_power):
+        """Włącz lub wyłącz tryb oszczędzania energii.
+        """
+        self.low_power = low_power
+        self._update_interval()
+
+    def _update_interval(self):
+        if self.low_power:
+            self.interval = 1.0 / self.low_power_fps
+        else:
+            self.interval = 1.0 / self.fps
+
+        # Po zwiększeniu częstotliwości nie czekaj na odległy termin.
+        if self.delayed_call is not None and \
+                self.deadline > self.clock() + self.interval:
+            self.delayed_call.cancel()
+            self.deadline = self.clock() + self.interval
+            self._schedule()
+
+    def _schedule(self):
+        delay = max(0.0, self.deadline - self.clock())
+        self.delayed_call = self.reactor.callLater(delay, self._frame)
+
+    def _frame(self):
+        """Narysuj klatkę i zaplanuj następną.
+        """
+        self.delayed_call = None
+
+        now = self.clock()
+        late = now - self.deadline
+        if late > self.max_catch_up * self.interval:
+            skipped = int(late / self.interval)
+            self.stats.dropped += skipped
+            self.deadline += skipped * self.interval
+
+        try:
+            self.display.refresh()
+            self.stats.add(self.clock() - now)
+        finally:
+            self.deadline += self.interval
+            self._schedule()
@@ -0,0 +1,197 @@
+# -*- coding: utf-8 -*-
+
+import heapq
+import math
+
+from itertools import count
+
+from twisted.internet import reactor
+from twisted.python import log
+
+
+class Timer(object):
+    """Zaplanowane wywołanie funkcji.
+
+    Atrybuty:
+      deadline        czas (wg zegara reaktora), o którym funkcja ma zostać
+                      wywołana
+      function        wywoływana funkcja
+      interval        odstęp pomiędzy kolejnymi wywołaniami dla wywołań
+                      cyklicznych, None dla wywołań jednorazowych
+      stop_condition  funkcja, która zwraca True, gdy wywołania cykliczne
+                      powinny się zakończyć
+    """
+    def __init__(self, scheduler, deadline, function, interval=None,
+                 stop_condition=None):
+        self.scheduler      = scheduler
+        self.deadline       = deadline
+        self.function       = function
+        self.interval       = interval
+        self.stop_condition = stop_condition
+
+        self.active = True
+        # Flaga określająca, czy wywołanie czeka w kopcu planisty.
+        self.queued = False
+
+    def cancel(self):
+        """Anuluj wywołanie. Anulowanie wykonanego lub już anulowanego
+        wywołania nie ma żadnego efektu.
+        """
+        if self.active:
+            self.active = False
+            if self.queued:
+                self.scheduler._cancelled()
+
+class Scheduler(object):
+    """Planista opóźnionych wywołań działający w wątku pętli zdarzeń.
+
+    Oczekujące wywołania są trzymane w kopcu uporządkowanym według terminu
+    wykonania, a w reaktorze zarejestrowane jest tylko jedno wywołanie
+    callLater() - dla najwcześniejszego z nich. Anulowane wywołania zostają
+    w kopcu i są pomijane przy zdejmowaniu; gdy stanowią większość kopca,
+    kopiec jest przebudowywany.
+
+    Terminy wybudzenia reaktora zaokrąglane są w górę do wielokrotności
+    `resolution` sekund, dzięki czemu wywołania o bliskich terminach
+    wykonywane są razem, a nie w osobnych obrotach pętli zdarzeń.
+
+    Funkcje wywoływane są w wątku reaktora, nie są otaczane żadną blokadą.
+    Wyjątek zgłoszony przez funkcję jest zapisywany w dzienniku Twisted
+    (log.err()) i nie przerywa wykonywania pozostałych wywołań; wywołanie
+    cykliczne jest mimo błędu planowane dalej.
+
+    W przykładzie zamiast reaktora używamy sztucznego zegara Twisted:
+
+    >>> from twisted.internet.task import Clock
+    >>> clock = Clock()
+    >>> planner = Scheduler(reactor=clock)
+    >>> calls = []
+    >>> def fail():
+    ...     calls.append('fail')
+    ...     raise ValueError('fail')
+    >>> failing = planner.call_every(1, fail)
+    >>> ticking = planner.call_every(1, lambda: calls.append('tick'))
+    >>> clock.pump([1, 1])
+    >>> calls
+    ['fail', 'tick', 'fail', 'tick']
+    >>> failing.active, planner.pending()
+    (True, 2)
+    """
+    def __init__(self, reactor=reactor, resolution=0.005):
+        self.reactor    = reactor
+        self.resolution = resolution
+
+        self.heap      = []
+        self.sequence  = count()
+        self.cancelled = 0
+
+        # Wywołanie reaktora odpowiadające najwcześniejszemu terminowi.
+        self.delayed_call = None
+
+    def call_later(self, delay, function):
+        """Wywołaj funkcję po upływie podanej liczby sekund.
+
+        Zwraca obiekt Timer, który pozwala anulować wywołanie.
+        """
+        timer = Timer(self, self.reactor.seconds() + delay, function)
+        self._push(timer)
+        return timer
+
+    def call_every(self, interval, function, stop_condition=None):
+        """Wywołuj funkcję co podaną liczbę sekund, aż do anulowania
+        zwróconego obiektu Timer lub do momentu, gdy `stop_condition()`
+        zwróci True.
+
+        Kolejne terminy liczone są od poprzedniego terminu, a nie od końca
+        wywołania, dzięki czemu odstępy nie rosną o czas wykonania funkcji.
+        """
+        timer = Timer(self, self.reactor.seconds() + interval, function,
+                      interval, stop_condition)
+        self._push(timer)
+        return timer
+
+    def pending(self):
+        """Zwróć liczbę oczekujących (nieanulowanych) wywołań.
+        """
+        return len(self.heap) - self.cancelled
+
+    def _push(self, timer):
+        timer.queued = True
+        heapq.heappush(self.heap, (timer.deadline, self.sequence.next(), timer))
+        self._arm()
+
+    def _cancelled(self):
+        self.cancelled += 1
+
+        # Usuń anulowane wpisy, gdy zajmują większość kopca.
+        if self.cancelled > len(self.heap) / 2:
+            self.heap = [ entry for entry in self.heap if entry[2].active ]
+            heapq.heapify(self.heap)
+            self.cancelled = 0
+            self._arm()
+
+    def _arm(self):
+        """Ustaw wywołanie reaktora na termin najwcześniejszego wpisu.
+        """
+        if not self.heap:
+            if self.delayed_call is not None:
+                self.delayed_call.cancel()
+                self.delayed_call = None
+            return
+
+        deadline = self.heap[0][0]
+        if self.delayed_call is not None:
+            if self.delayed_call.getTime() <= deadline:
+                return
+            self.delayed_call.cancel()
+
+        wake_up = math.ceil(deadline / self.resolution) * self.resolution
+        delay = max(0, wake_up - self.reactor.seconds())
+        self.delayed_call = self.reactor.callLater(delay, self._run)
+
+    def _run(self):
+        """Wykonaj wszystkie wywołania, których termin już minął.
+        """
+        self.delayed_call = None
+        now = self.reactor.seconds()
+
+        try:
+            while self.heap and self.heap[0][0] <= now:
+                deadline, sequence, timer = heapq.heappop(self.heap)
+                timer.queued = False
+                if not timer.active:
+                    self.cancelled -= 1
+                    continue
+
+                if timer.interval is None:
+                    timer.active = False
+                    self._call(timer.function)
+                    continue
+
+                self._call(timer.function)
+                if not timer.active:
+                    continue
+                if timer.stop_condition and self._call(timer.stop_condition):
+                    timer.active = False
+                    continue
+
+                # Wywołanie cykliczne: następny termin liczymy od poprzedniego,
+                # ale nie nadrabiamy zaległych wywołań.
+                timer.deadline = max(timer.deadline + timer.interval, now)
+                timer.queued = True
+                heapq.heappush(self.heap, (timer.deadline, self.sequence.next(), timer))
+        finally:
+            self._arm()
+
+    def _call(self, function):
+        """Wywołaj funkcję i zwróć jej wynik; wyjątek zapisz w dzienniku
+        i zwróć None.
+        """
+        try:
+            return function()
+        except Exception:
+            log.err(None, "Scheduled call %r failed" % (function,))
+            return None
+
+# Planista wspólny dla całego procesu.
+scheduler = Scheduler()
@@ -0,0 +1,307 @@
+# -*- coding: utf-8 -*-
+"""Silnik rozgrywki niezależny od sieci, grafiki i upływu czasu.
+
+Czas rozgrywki mierzony jest w krokach (`step_rate` kroków na sekundę
+gry), a jedynym źródłem losowości jest generator z podanym ziarnem, więc
+rozgrywka o tym samym ziarnie i tych samych ruchach przebiega zawsze
+identycznie. Skutki ruchów i upływu czasu zwracane są jako lista zdarzeń:
+par (komunikat, id gracza), gdzie komunikat należy wysłać wszystkim
+graczom poza podanym, a przy id równym None - wszystkim graczom.
+
+Z silnika korzysta serwer (patrz match.Match), ale można go też uruchamiać
+bez serwera, np. rozgrywając wiele partii botów:
+
+>>> from messages import serialize
+>>> def play(seed):
+...     simulation = Simulation('default', [1, 2], game_duration=5,
+...                             seed=seed)
+...     events = simulation.start()
+...     bot = random.Random(seed)
+...     while not simulation.finished:
+...         events += simulation.step([ (player_id, MoveMeToMessage(bot.choice(DIRECTIONS)))
+...                                     for player_id in simulation.player_ids ])
+...     return [ serialize(message) for message, excluded in events ]
+>>> play(7)[-1] == serialize(EndGameMessage())
+True
+>>> play(7) == play(7)
+True
+>>> play(7) == play(8)
+False
+
+Silnik napisany jest w czystym Pythonie i koszt kroku to głównie narzut
+interpretera na obsługę ruchów: w CPythonie 2.7 krok partii dwóch graczy
+zajmuje ok. 12 µs, a ośmiu kilka razy dłużej. Dziesięciosekundowa partia
+dwóch botów (z dogrywkami średnio ok. 300 kroków) trwa więc 3-4 ms - na jednym
+rdzeniu rozgrywa się ok. 300 takich partii na sekundę, a wraz z kosztem
+samych botów z benchmarks/simulation.py ok. 150-190. Założenie tysięcy
+partii na sekundę na jednym rdzeniu nie jest w tym silniku osiągalne;
+większą liczbę partii uzyskuje się, uruchamiając je w wielu procesach.
+"""
+
+import math
+import random
+
+from itertools import cycle
+
+from board import BoardFull, ServerBoard
+from level import WATER
+from fish import Fish
+from penguin import Penguin
+
+from messages import *
+from messages import DIRECTIONS
+
+# Kolory nadawane kolejnym pingwinom.
+PENGUIN_COLORS = ["red", "blue", "green", "yellow", "purple",
+                  "darkgray", "brown", "navyblue"]
+
+
+class Simulation(object):
+    """Stan pojedynczej rozgrywki i reguły gry.
+
+    Argumenty konstruktora:
+      level_name        Nazwa poziomu, na którym będzie odbywać się gra.
+      player_ids        Lista numerów graczy; ich kolejność wyznacza
+                        numery i kolory pingwinów.
+      number_of_fishes  Liczba rybek jaka zostanie początkowo umieszczona
+                        na planszy. Jest to jednocześnie maksymalna liczba
+                        rybek, jaka może znaleźć się na planszy.
+      new_fish_delay    Liczba sekund, co jaką dodawane są nowe rybki.
+      game_duration     Limit czasu gry w sekundach. Jeżeli po jego upływie
+                        nie ma jednego zwycięzcy, gra jest przedłużana
+                        o `overtime` sekund (patrz end()).
+      move_cooldown     Czas w sekundach, przez jaki pingwin nie może
+                        wykonać kolejnego ruchu (zabezpiecza przed botami).
+      step_rate         Liczba kroków na sekundę gry.
+      seed              Ziarno generatora liczb losowych.
+    """
+    overtime = 10
+
+    def __init__(self, level_name, player_ids, number_of_fishes=7, new_fish_delay=1.75,
+                 game_duration=60, move_cooldown=0.1, step_rate=20, seed=None):
+        self.player_ids       = list(player_ids)
+        self.number_of_fishes = number_of_fishes
+        self.game_duration    = game_duration
+        self.step_rate        = step_rate
+
+        self.random = random.Random(seed)
+        self.board  = ServerBoard(level_name, self.random)
+
+        # Czasy wyrażone w krokach.
+        self.cooldown_steps = max(1, int(math.ceil(move_cooldown * step_rate)))
+        self.fish_steps     = max(1, int(round(new_fish_delay * step_rate)))
+        self.end_step       = int(round(game_duration * step_rate))
+
+        self.step_number = 0
+        self.started     = False
+        self.finished    = False
+
+        # Gracze, których pingwinom blokada ruchu wygasa w danym kroku,
+        # według numeru kroku.
+        self.releases = {}
+        # Zdarzenia czekające na odebranie (patrz collect()).
+        self.events = []
+
+    def start(self):
+        """Rozstaw pingwiny i rybki na planszy, rozpocznij grę i zwróć
+        zdarzenia.
+        """
+        # Wylosuj położenia pingwinów i rybek.
+        number_of_players = len(self.player_ids)
+        unoccupied_tiles  = self.board.random_unoccupied_tiles(number_of_players +
+                                                               self.number_of_fishes)
+
+        penguins = []
+        for index, (player_id, position, color) in \
+                enumerate(zip(self.player_ids, unoccupied_tiles, cycle(PENGUIN_COLORS))):
+            penguin = Penguin(player_id, *position)
+            penguin.color  = color
+            penguin.number = index + 1
+            penguins.append(penguin)
+        self.board.set_penguins(penguins)
+
+        fishes = []
+        for type, position in zip(cycle(range(4)), unoccupied_tiles[number_of_players:]):
+            fishes.append(Fish(type, *position))
+        self.board.set_fishes(fishes)
+
+        self.started = True
+        self._emit(StartGameMessage(penguins, fishes, self.game_duration))
+        return self.collect()
+
+    def step(self, inputs):
+        """Wykonaj jeden krok rozgrywki: upływ czasu (patrz advance())
+        i ruchy graczy, podane jako lista par (id gracza, komunikat),
+        w kolejności ich otrzymania. Zwróć powstałe zdarzenia.
+        """
+        self.advance()
+        # Jak apply(), bez wywołania tej metody dla każdego ruchu.
+        move, turn = self.move, self.turn
+        for player_id, message in inputs:
+            if isinstance(message, MoveMeToMessage):
+                move(player_id, message.direction)
+            elif isinstance(message, TurnMeToMessage):
+                turn(player_id, message.direction)
+        return self.collect()
+
+    def advance(self):
+        """Przesuń czas rozgrywki o jeden krok: zwolnij wygasłe blokady ruchu,
+        dodaj rybkę, jeżeli nadszedł jej czas, i zakończ grę po upływie
+        jej czasu trwania.
+        """
+        if not self.started or self.finished:
+            return
+        self.step_number += 1
+
+        released = self.releases.pop(self.step_number, None)
+        if released:
+            penguins = self.board.penguins
+            for player_id in released:
+                penguins[player_id].stop()
+
+        if self.step_number % self.fish_steps == 0:
+            self._add_fish()
+
+        if self.step_number >= self.end_step:
+            self._end()
+
+    def next_event_step(self):
+        """Zwróć numer najbliższego kroku, w którym advance() ma coś do
+        zrobienia: zwolni blokadę ruchu, doda rybkę lub zakończy grę.
+
+        Krok dodania rybki jest pomijany, dopóki na planszy jest ich
+        komplet; zjedzenie rybki może więc ten numer zmniejszyć.
+        """
+        step_number = self.end_step
+        if len(self.board.fishes) < self.number_of_fishes:
+            step_number = min(step_number,
+                              (self.step_number // self.fish_steps + 1) * self.fish_steps)
+        if self.releases:
+            step_number = min(step_number, min(self.releases))
+        return max(step_number, self.step_number + 1)
+
+    def advance_to(self, step_number):
+        """Przesuń czas rozgrywki do kroku o podanym numerze. Kroki,
+        w których nic się nie dzieje (patrz next_event_step()), są
+        pomijane, więc koszt nie zależy od liczby kroków.
+        """
+        while self.started and not self.finished and self.step_number < step_number:
+            self.step_number = min(step_number, self.next_event_step()) - 1
+            self.advance()
+
+    def apply(self, player_id, message):
+        """Wykonaj ruch gracza (komunikat MoveMeToMessage lub TurnMeToMessage).
+
+        Zwraca False, jeżeli ruch był niedozwolony, True w przeciwnym wypadku.
+        """
+        if isinstance(message, MoveMeToMessage):
+            return self.move(player_id, message.direction)
+        elif isinstance(message, TurnMeToMessage):
+            self.turn(player_id, message.direction)
+        return True
+
+    def can_move(self, player_id):
+        """Zwróć True, jeżeli pingwin gracza może teraz wykonać ruch, tzn.
+        gra się toczy, a pingwin nie jest zablokowany po poprzednim ruchu.
+        """
+        return self.started and not self.finished and \
+            not self.board.penguins[player_id].moving
+
+    def move(self, player_id, direction):
+        """Przesuń pingwina danego gracza.
+
+        Zwraca True jeżeli ruch był możliwy, False w przeciwnym wypadku.
+        """
+        # Nie rób nic, jeżeli gra się nie toczy.
+        if not self.started or self.finished:
+            return False
+
+        board = self.board
+        index = board.step_penguin(player_id, direction)
+        if index < 0:
+            return False
+
+        self.events.append((MoveOtherToMessage(player_id, direction), player_id))
+
+        # Pole, na którym stanął pingwin, sprawdzamy wprost w słowniku rybek
+        # i siatce terenu planszy - to najczęściej wykonywany kod silnika.
+        # Jezeli pingwin zdobył rybkę, roześlij uaktualnienie wyniku.
+        if index in board.fish_tiles:
+            board.take_fish(index)
+            penguin = board.penguins[player_id]
+            self._emit(ScoreUpdateMessage(player_id, penguin.eat_fish()))
+
+        # Jeżeli pingwin wpadł do wody, wylosuj dla niego nowe położenie
+        # i roześlij uaktualnienia położenia i wyniku. Na zapełnionej
+        # planszy pingwin zostaje na miejscu.
+        elif board.terrain[index] == WATER:
+            penguin = board.penguins[player_id]
+            fish_count = penguin.drop_into_water()
+            try:
+                position = board.random_unoccupied_tile()
+            except BoardFull:
+                pass
+            else:
+                board.update_penguin_position(player_id, *position)
+                self._emit(PositionUpdateMessage(player_id, *position))
+            self._emit(ScoreUpdateMessage(player_id, fish_count))
+
+        # self.board.move_penguin() ustawiło flagę 'moving', zwolnij ją
+        # po upływie blokady ruchu. Poruszający się pingwin nie może
+        # wykonać ruchu, więc gracz czeka na co najwyżej jedno zwolnienie.
+        self.releases.setdefault(self.step_number + self.cooldown_steps, []).append(player_id)
+        return True
+
+    def turn(self, player_id, direction):
+        """Przekaż pozostałym graczom informację o przekręceniu pingwina.
+        """
+        if self.started and not self.finished:
+            self._emit(TurnOtherToMessage(player_id, direction), player_id)
+
+    def end(self, right_now=False):
+        """Zakończ rozgrywkę i zwróć zdarzenia.
+
+        Jeżeli `right_now` nie jest równy True gra nie zakończy się dopóki
+        nie ma rozstrzygnięcia (tzn. jednego zwycięskiego gracza), tylko
+        zostanie przedłużona o `overtime` sekund.
+        """
+        self._end(right_now)
+        return self.collect()
+
+    def collect(self):
+        """Zwróć zdarzenia powstałe od ostatniego wywołania i zapomnij je.
+        """
+        events, self.events = self.events, []
+        return events
+
+    def _end(self, right_now=False):
+        if not self.started or self.finished:
+            return
+
+        if not right_now and self.board.no_winner():
+            self.end_step = self.step_number + self.overtime * self.step_rate
+            self._emit(RiseGameDurationMessage(self.overtime))
+            return
+
+        self.finished = True
+        self._emit(EndGameMessage())
+
+    def _add_fish(self):
+        """Połóż na planszy nową rybkę, jeżeli nie ma ich wystarczająco dużo.
+        """
+        if len(self.board.fishes) >= self.number_of_fishes:
+            return
+
+        # Na zapełnionej planszy rybka nie zmieści się do czasu zwolnienia
+        # któregoś z pól.
+        try:
+            position = self.board.random_unoccupied_tile()
+        except BoardFull:
+            return
+
+        fish = Fish(self.random.randint(0, 3), *position)
+        self.board.add_fish(fish)
+        self._emit(NewFishMessage(fish))
+
+    def _emit(self, message, excluded_player_id=None):
+        self.events.append((message, excluded_player_id))
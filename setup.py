@@ -11,6 +11,8 @@ setup(name = 'pingwin',
                                             'pingwin_server = pingwin.server:run' ]},
 
       install_requires = ['pygame', 'Twisted'],
+      # numpy is needed only for batch simulation (pingwin/batch.py).
+      extras_require = { 'batch': ['numpy'] },
 
       # We use nose for testing.
       test_suite = 'nose.collector',